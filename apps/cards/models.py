@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import F, FilteredRelation, Q, Subquery
+from django.utils import timezone
+from apps.accounts.models import UserProfile
 from apps.decks.models import Deck
 
 
@@ -7,6 +10,44 @@ def card_image_path(instance, filename):
     return f"cards/{instance.deck.user.id}/{instance.deck.id}/{filename}"
 
 
+# with_user_stateで付与する属性名とCardStateのフィールド名
+USER_STATE_FIELDS = {
+    "state": "state",
+    "due": "next_review",
+    "stability": "stability",
+    "reps": "reps",
+    "lapses": "lapses",
+}
+
+
+class CardQuerySet(models.QuerySet):
+    """カードのクエリセット"""
+
+    def with_user_state(self, user):
+        """
+        指定ユーザーの学習状態を1回のクエリで付与
+
+        指定ユーザーのCardStateだけをLEFT JOINし、state / due / stability /
+        reps / lapsesとして付与する（学習状態がなければNone）。is_dueの「今日」の
+        判定用にユーザーのタイムゾーン名もuser_timezoneとして付与する。
+        is_new / is_due はこの値を使うため、カードごとのクエリは発行されない。
+        """
+        return self.annotate(
+            user_card_state=FilteredRelation(
+                "card_states",
+                condition=Q(card_states__user=user),
+            ),
+        ).annotate(
+            **{
+                name: F(f"user_card_state__{field}")
+                for name, field in USER_STATE_FIELDS.items()
+            },
+            user_timezone=Subquery(
+                UserProfile.objects.filter(user=user).values("timezone")[:1]
+            ),
+        )
+
+
 class Card(models.Model):
     """カードモデル"""
 
@@ -43,24 +84,48 @@ class Card(models.Model):
         verbose_name="更新日時"
     )
 
+    objects = CardQuerySet.as_manager()
+
     class Meta:
         verbose_name = "カード"
         verbose_name_plural = "カード"
         ordering = ["-created_at"]
+        indexes = [
+            # デッキ内の作成順の範囲検索（新規カードの探索）
+            models.Index(
+                fields=["deck", "created_at", "id"],
+                name="card_deck_created_at"
+            ),
+        ]
 
     def __str__(self):
         # 表面の最初の30文字を表示
         return self.front[:30] + "..." if len(self.front) > 30 else self.front
 
+    def _load_user_state(self):
+        """with_user_state()で取得していなければデッキ所有者の学習状態を読む"""
+        if hasattr(self, "state"):
+            return
+        values = (
+            self.card_states.filter(user_id=F("card__deck__user_id"))
+            .values(*USER_STATE_FIELDS.values(), "user__profile__timezone")
+            .first()
+        ) or {}
+        for name, field in USER_STATE_FIELDS.items():
+            setattr(self, name, values.get(field))
+        self.user_timezone = values.get("user__profile__timezone")
+
     @property
     def is_new(self):
         """新規カード（未学習）かどうか"""
-        return not hasattr(self, "card_state") or self.card_state is None
+        self._load_user_state()
+        return self.state is None
 
     @property
     def is_due(self):
-        """復習が必要かどうか"""
+        """今日（学習したユーザーのタイムゾーン）復習が必要かどうか"""
         if self.is_new:
             return False
-        from django.utils import timezone
-        return self.card_state.next_review <= timezone.now()
+        from apps.study.models import due_cutoff
+        from apps.study.quota import zone
+        return self.due < due_cutoff(tz=zone(self.user_timezone))
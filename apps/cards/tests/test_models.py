@@ -2,11 +2,17 @@
 Cardモデルのテスト
 """
 
+from datetime import timedelta
+
 import pytest
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from apps.decks.models import Deck
 from apps.cards.models import Card
+from apps.study.models import CardState
 
 
 @pytest.mark.django_db
@@ -116,3 +122,73 @@ class TestCard:
         assert cards[0] == card3  # 最後に作成されたカードが最初
         assert cards[1] == card2
         assert cards[2] == card1
+
+
+@pytest.mark.django_db
+class TestCardWithUserState:
+    """with_user_state()のテストクラス"""
+
+    @pytest.fixture
+    def user(self):
+        return User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+
+    @pytest.fixture
+    def cards(self, user):
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        now = timezone.now()
+        new, due, later = [
+            Card.objects.create(deck=deck, front=f"質問{i}", back="答え") for i in range(3)
+        ]
+        CardState.objects.create(
+            card=due, user=user, state=CardState.State.REVIEW,
+            next_review=now - timedelta(hours=1), stability=3.5, reps=4, lapses=1,
+        )
+        CardState.objects.create(
+            card=later, user=user, state=CardState.State.LEARNING,
+            next_review=now + timedelta(days=1), reps=1,
+        )
+        return new, due, later
+
+    def test_annotates_user_state(self, user, cards):
+        """学習状態の値が付与されることをテスト"""
+        new, due, _ = cards
+        annotated = {card.pk: card for card in Card.objects.with_user_state(user)}
+
+        assert annotated[new.pk].state is None
+        assert annotated[due.pk].state == CardState.State.REVIEW
+        assert annotated[due.pk].stability == 3.5
+        assert annotated[due.pk].reps == 4
+        assert annotated[due.pk].lapses == 1
+
+    def test_status_without_extra_queries(self, user, cards):
+        """is_new / is_dueの判定で追加のクエリが発行されないことをテスト"""
+        new, due, later = cards
+        with CaptureQueriesContext(connection) as queries:
+            status = {
+                card.pk: (card.is_new, card.is_due)
+                for card in Card.objects.with_user_state(user)
+            }
+
+        assert len(queries) == 1
+        assert status == {
+            new.pk: (True, False),
+            due.pk: (False, True),
+            later.pk: (False, False),
+        }
+
+    def test_other_users_state_is_ignored(self, user, cards):
+        """他ユーザーの学習状態は付与されないことをテスト"""
+        other = User.objects.create_user(username="other", password="testpass123")
+
+        assert all(card.is_new for card in Card.objects.with_user_state(other))
+
+    def test_status_without_annotation(self, user, cards):
+        """with_user_state()を使わない場合はデッキ所有者の学習状態で判定することをテスト"""
+        new, due, _ = cards
+
+        assert Card.objects.get(pk=new.pk).is_new is True
+        assert Card.objects.get(pk=due.pk).is_due is True
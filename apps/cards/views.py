@@ -4,9 +4,13 @@ from django.contrib import messages
 from django.views.generic import CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy, reverse
+from django.db import transaction
 from django.http import Http404
 
 from apps.decks.models import Deck
+from apps.study import counters
+from apps.study.models import CardState, ChangeLog
+from apps.study.sync import record_changes
 from .models import Card
 from .forms import CardForm
 
@@ -14,9 +18,18 @@ from .forms import CardForm
 class CardOwnerMixin(UserPassesTestMixin):
     """カードの所有者（デッキの所有者）のみアクセス可能にするMixin"""
 
+    def get_queryset(self):
+        return super().get_queryset().select_related("deck")
+
+    def get_object(self, queryset=None):
+        # test_funcで取得したカードを本処理でも使う（同じカードを2回読み込まない）
+        if queryset is None and hasattr(self, "_owned_object"):
+            return self._owned_object
+        return super().get_object(queryset)
+
     def test_func(self):
-        card = self.get_object()
-        return card.deck.user == self.request.user
+        self._owned_object = self.get_object()
+        return self._owned_object.deck.user_id == self.request.user.pk
 
 
 class CardCreateView(LoginRequiredMixin, CreateView):
@@ -38,8 +51,13 @@ class CardCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.deck = self.deck
+        with transaction.atomic():
+            response = super().form_valid(form)
+            # デッキ件数カウンタを更新
+            counters.record_card_added(self.object)
+            record_changes(self.request.user, ChangeLog.Kind.CARD, [self.object.pk])
         messages.success(self.request, "カードを作成しました。")
-        return super().form_valid(form)
+        return response
 
     def form_invalid(self, form):
         messages.error(self.request, "入力内容に誤りがあります。")
@@ -62,8 +80,11 @@ class CardUpdateView(LoginRequiredMixin, CardOwnerMixin, UpdateView):
         return context
 
     def form_valid(self, form):
+        with transaction.atomic():
+            response = super().form_valid(form)
+            record_changes(self.request.user, ChangeLog.Kind.CARD, [self.object.pk])
         messages.success(self.request, "カードを更新しました。")
-        return super().form_valid(form)
+        return response
 
     def form_invalid(self, form):
         messages.error(self.request, "入力内容に誤りがあります。")
@@ -87,7 +108,15 @@ class CardDeleteView(LoginRequiredMixin, CardOwnerMixin, DeleteView):
     def form_valid(self, form):
         deck_pk = self.object.deck.pk
         messages.success(self.request, "カードを削除しました。")
-        self.object.delete()
+        with transaction.atomic():
+            # 削除前の学習状態をカウンタ更新に使う
+            card_state = CardState.objects.filter(
+                card=self.object, user=self.object.deck.user
+            ).first()
+            card_pk = self.object.pk
+            self.object.delete()
+            counters.record_card_removed(self.object, card_state)
+            record_changes(self.request.user, ChangeLog.Kind.CARD, [card_pk], deleted=True)
         return redirect(reverse("decks:deck_detail", args=[deck_pk]))
 
     def get_success_url(self):
@@ -97,10 +126,10 @@ class CardDeleteView(LoginRequiredMixin, CardOwnerMixin, DeleteView):
 @login_required
 def card_detail_view(request, pk):
     """カード詳細ビュー"""
-    card = get_object_or_404(Card, pk=pk)
+    card = get_object_or_404(Card.objects.select_related("deck"), pk=pk)
 
     # 所有者チェック
-    if card.deck.user != request.user:
+    if card.deck.user_id != request.user.pk:
         raise Http404
 
     return render(request, "cards/card_detail.html", {
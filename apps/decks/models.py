@@ -1,7 +1,39 @@
 from django.db import models
+from django.db.models import Count, FilteredRelation, Q
 from django.contrib.auth.models import User
 
 
+class DeckQuerySet(models.QuerySet):
+    """デッキのクエリセット"""
+
+    def with_study_counts(self, user, now=None):
+        """
+        カード数・新規カード数・復習待ちカード数を1回のクエリで集計
+
+        指定ユーザーのCardStateだけをLEFT JOINし、デッキ単位でGROUP BYする。
+        集計結果はnum_cards / num_new_cards / num_due_cardsとして付与され、
+        card_count などのプロパティはこの値を優先して返す。復習待ちは
+        due_cutoff（ユーザーのタイムゾーンでの今日の終わり）より前に期限が
+        来るカードで、出題キューと同じ。
+        """
+        from apps.study.models import due_cutoff
+        from apps.study.quota import timezone_for
+
+        return self.annotate(
+            user_card_states=FilteredRelation(
+                "cards__card_states",
+                condition=Q(cards__card_states__user=user),
+            ),
+        ).annotate(
+            num_cards=Count("cards"),
+            num_new_cards=Count("cards") - Count("user_card_states"),
+            num_due_cards=Count(
+                "user_card_states",
+                filter=Q(user_card_states__next_review__lt=due_cutoff(now, timezone_for(user))),
+            ),
+        )
+
+
 class Deck(models.Model):
     """デッキモデル"""
 
@@ -28,6 +60,8 @@ class Deck(models.Model):
         verbose_name="更新日時"
     )
 
+    objects = DeckQuerySet.as_manager()
+
     class Meta:
         verbose_name = "デッキ"
         verbose_name_plural = "デッキ"
@@ -46,6 +80,9 @@ class Deck(models.Model):
     @property
     def card_count(self):
         """デッキ内のカード数を返す"""
+        if hasattr(self, "num_cards"):
+            # with_study_counts() / attach_deck_counters()で付与済み
+            return self.num_cards
         if hasattr(self, "cards"):
             return self.cards.count()
         return 0
@@ -53,17 +90,15 @@ class Deck(models.Model):
     @property
     def new_card_count(self):
         """新規カード数を返す（デッキ所有者のCardStateがないカード）"""
+        if hasattr(self, "num_new_cards"):
+            return self.num_new_cards
         if not hasattr(self, "cards"):
             return 0
         # CardStateモデルが存在するかチェック
         try:
-            from apps.study.models import CardState
+            from apps.study.new_cards import count_new_cards
             # デッキ所有者のCardStateがないカードをカウント
-            cards_with_state = CardState.objects.filter(
-                card__deck=self,
-                user=self.user
-            ).values_list("card_id", flat=True)
-            return self.cards.exclude(pk__in=cards_with_state).count()
+            return count_new_cards(self, self.user)
         except (ImportError, LookupError):
             # Phase 4実装前は全カードが新規
             return self.cards.count()
@@ -71,15 +106,17 @@ class Deck(models.Model):
     @property
     def due_card_count(self):
         """復習が必要なカード数を返す（デッキ所有者の視点）"""
+        if hasattr(self, "num_due_cards"):
+            return self.num_due_cards
         if not hasattr(self, "cards"):
             return 0
         # CardStateモデルが存在するかチェック
         try:
-            from apps.study.models import CardState
-            from django.utils import timezone
+            from apps.study.models import due_cutoff
+            from apps.study.quota import timezone_for
             return self.cards.filter(
                 card_states__user=self.user,
-                card_states__next_review__lte=timezone.now()
+                card_states__next_review__lt=due_cutoff(tz=timezone_for(self.user))
             ).count()
         except (ImportError, LookupError):
             # Phase 4実装前は復習待ちなし
@@ -5,8 +5,11 @@ Deckモデルのテスト
 import pytest
 from django.contrib.auth.models import User
 from django.db import IntegrityError
+from django.utils import timezone
 
 from apps.decks.models import Deck
+from apps.cards.models import Card
+from apps.study.models import CardState, due_cutoff
 
 
 @pytest.mark.django_db
@@ -114,3 +117,59 @@ class TestDeck:
         user.delete()
 
         assert not Deck.objects.filter(user_id=user_id).exists()
+
+
+@pytest.mark.django_db
+class TestDeckStudyCounts:
+    """with_study_countsのテストクラス"""
+
+    def test_with_study_counts(self):
+        """カード数・新規・復習待ちが正しく集計されることをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        other_user = User.objects.create_user(
+            username="otheruser",
+            email="other@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        now = timezone.now()
+        due_card = Card.objects.create(deck=deck, front="期限切れ", back="答え")
+        today_card = Card.objects.create(deck=deck, front="今日が期限", back="答え")
+        later_card = Card.objects.create(deck=deck, front="期限前", back="答え")
+        Card.objects.create(deck=deck, front="新規", back="答え")
+        CardState.objects.create(card=due_card, user=user, next_review=now - timezone.timedelta(hours=1))
+        CardState.objects.create(
+            card=today_card, user=user, next_review=due_cutoff(now) - timezone.timedelta(seconds=1)
+        )
+        CardState.objects.create(card=later_card, user=user, next_review=due_cutoff(now))
+        # 他ユーザーの学習状態は集計に含まれない
+        CardState.objects.create(card=later_card, user=other_user, next_review=now - timezone.timedelta(days=1))
+
+        annotated = Deck.objects.with_study_counts(user, now).get(pk=deck.pk)
+
+        assert annotated.card_count == 4
+        assert annotated.new_card_count == 1
+        assert annotated.due_card_count == 2
+        # プロパティによる個別集計と一致する
+        assert annotated.card_count == deck.card_count
+        assert annotated.new_card_count == deck.new_card_count
+        assert annotated.due_card_count == deck.due_card_count
+
+    def test_with_study_counts_empty_deck(self):
+        """カードがないデッキも0件として集計されることをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        Deck.objects.create(user=user, name="空のデッキ")
+
+        annotated = Deck.objects.with_study_counts(user).get()
+
+        assert annotated.card_count == 0
+        assert annotated.new_card_count == 0
+        assert annotated.due_card_count == 0
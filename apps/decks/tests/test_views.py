@@ -2,11 +2,18 @@
 デッキビューのテスト
 """
 
+from datetime import timedelta
+
 import pytest
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from apps.decks.models import Deck
+from apps.cards.models import Card
+from apps.study.models import CardState
 
 
 @pytest.mark.django_db
@@ -53,6 +60,31 @@ class TestDeckListView:
         assert "user1のデッキ" in response.content.decode()
         assert "user2のデッキ" not in response.content.decode()
 
+    def test_deck_list_query_count_independent_of_decks(self, client):
+        """デッキ数が増えてもクエリ数が増えないことをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        client.force_login(user)
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as captured:
+                response = client.get(reverse("decks:deck_list"))
+            assert response.status_code == 200
+            return len(captured)
+
+        deck = Deck.objects.create(user=user, name="デッキ0")
+        Card.objects.create(deck=deck, front="質問", back="答え")
+        single = count_queries()
+
+        for i in range(1, 10):
+            deck = Deck.objects.create(user=user, name=f"デッキ{i}")
+            Card.objects.create(deck=deck, front="質問", back="答え")
+
+        assert count_queries() == single
+
 
 @pytest.mark.django_db
 class TestDeckCreateView:
@@ -127,6 +159,51 @@ class TestDeckDetailView:
         assert response.status_code == 200
         assert "テストデッキ" in response.content.decode()
 
+    def test_deck_detail_uses_annotated_counts(self, client):
+        """デッキ詳細の件数は集計済みの値を使うことをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        Card.objects.create(deck=deck, front="質問", back="答え")
+        client.force_login(user)
+
+        response = client.get(reverse("decks:deck_detail", args=[deck.pk]))
+        assert response.context["deck"].num_cards == 1
+        assert response.context["deck"].num_new_cards == 1
+        assert response.context["deck"].num_due_cards == 0
+
+    def test_deck_detail_shows_card_status(self, client):
+        """デッキ詳細にカードごとの学習状況を表示し、クエリ数が枚数によらないことをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        card = Card.objects.create(deck=deck, front="質問", back="答え")
+        CardState.objects.create(
+            card=card, user=user, state=CardState.State.REVIEW,
+            next_review=timezone.now() - timedelta(hours=1), reps=3,
+        )
+        client.force_login(user)
+        # 件数カウンタの作成など、初回だけのクエリを除く
+        client.get(reverse("decks:deck_detail", args=[deck.pk]))
+
+        with CaptureQueriesContext(connection) as few:
+            response = client.get(reverse("decks:deck_detail", args=[deck.pk]))
+        assert "今日の復習" in response.content.decode()
+        assert "復習3回" in response.content.decode()
+
+        for i in range(20):
+            Card.objects.create(deck=deck, front=f"追加{i}", back="答え")
+        with CaptureQueriesContext(connection) as many:
+            response = client.get(reverse("decks:deck_detail", args=[deck.pk]))
+        assert "新規" in response.content.decode()
+        assert len(many) == len(few)
+
     def test_deck_detail_other_user(self, client):
         """他ユーザーのデッキにアクセスできないことをテスト"""
         user1 = User.objects.create_user(
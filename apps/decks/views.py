@@ -4,7 +4,11 @@ from django.contrib import messages
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy
+from django.db import transaction
 
+from apps.study.counters import attach_deck_counters
+from apps.study.models import ChangeLog
+from apps.study.sync import record_changes
 from .models import Deck
 from .forms import DeckForm
 
@@ -17,8 +21,9 @@ class DeckListView(LoginRequiredMixin, ListView):
     context_object_name = "decks"
 
     def get_queryset(self):
-        """ログインユーザーのデッキのみ取得"""
-        return Deck.objects.filter(user=self.request.user)
+        """ログインユーザーのデッキのみ取得（カード数などはカウンタから読む）"""
+        decks = Deck.objects.filter(user=self.request.user)
+        return attach_deck_counters(decks, self.request.user)
 
 
 class DeckCreateView(LoginRequiredMixin, CreateView):
@@ -36,8 +41,11 @@ class DeckCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.user = self.request.user
+        with transaction.atomic():
+            response = super().form_valid(form)
+            record_changes(self.request.user, ChangeLog.Kind.DECK, [self.object.pk])
         messages.success(self.request, "デッキを作成しました。")
-        return super().form_valid(form)
+        return response
 
     def form_invalid(self, form):
         messages.error(self.request, "入力内容に誤りがあります。")
@@ -47,9 +55,15 @@ class DeckCreateView(LoginRequiredMixin, CreateView):
 class DeckOwnerMixin(UserPassesTestMixin):
     """デッキの所有者のみアクセス可能にするMixin"""
 
+    def get_object(self, queryset=None):
+        # test_funcで取得したデッキを本処理でも使う（同じデッキを2回読み込まない）
+        if queryset is None and hasattr(self, "_owned_object"):
+            return self._owned_object
+        return super().get_object(queryset)
+
     def test_func(self):
-        deck = self.get_object()
-        return deck.user == self.request.user
+        self._owned_object = self.get_object()
+        return self._owned_object.user_id == self.request.user.pk
 
 
 class DeckUpdateView(LoginRequiredMixin, DeckOwnerMixin, UpdateView):
@@ -66,8 +80,11 @@ class DeckUpdateView(LoginRequiredMixin, DeckOwnerMixin, UpdateView):
         return kwargs
 
     def form_valid(self, form):
+        with transaction.atomic():
+            response = super().form_valid(form)
+            record_changes(self.request.user, ChangeLog.Kind.DECK, [self.object.pk])
         messages.success(self.request, "デッキを更新しました。")
-        return super().form_valid(form)
+        return response
 
     def form_invalid(self, form):
         messages.error(self.request, "入力内容に誤りがあります。")
@@ -83,14 +100,21 @@ class DeckDeleteView(LoginRequiredMixin, DeckOwnerMixin, DeleteView):
 
     def form_valid(self, form):
         messages.success(self.request, "デッキを削除しました。")
-        return super().form_valid(form)
+        deck_pk = self.object.pk
+        with transaction.atomic():
+            response = super().form_valid(form)
+            # デッキのカード・学習状態はクライアント側でデッキと一緒に削除する
+            record_changes(self.request.user, ChangeLog.Kind.DECK, [deck_pk], deleted=True)
+        return response
 
 
 @login_required
 def deck_detail_view(request, pk):
     """デッキ詳細ビュー"""
     deck = get_object_or_404(Deck, pk=pk, user=request.user)
+    attach_deck_counters([deck], request.user)
 
     return render(request, "decks/deck_detail.html", {
         "deck": deck,
+        "cards": deck.cards.with_user_state(request.user),
     })
@@ -0,0 +1,91 @@
+"""
+JSON Lines形式のトレースをツリーで表示するコマンド
+
+    python manage.py trace_summary --name study.answer_card --slowest
+
+各スパンの処理時間と、子スパンを除いた自身の処理時間（self）を表示する。
+SQLのスパン（db.query）は親ごとに件数と合計時間にまとめる。
+"""
+
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "記録したトレースを処理時間の内訳つきのツリーで表示します"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", help="トレースのファイル（既定はTRACING_FILE）")
+        parser.add_argument("--trace-id", help="表示するトレースID")
+        parser.add_argument(
+            "--name",
+            help="このスパン名を含むトレースだけを対象にする（例: study.answer_card）",
+        )
+        parser.add_argument(
+            "--slowest",
+            action="store_true",
+            help="最新ではなく最も遅いトレースを表示する",
+        )
+
+    def handle(self, *args, **options):
+        path = options["file"] or settings.TRACING_FILE
+        traces = defaultdict(list)
+        try:
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        item = json.loads(line)
+                        traces[item["trace_id"]].append(item)
+        except FileNotFoundError:
+            raise CommandError(f"トレースのファイルがありません: {path}")
+
+        candidates = [
+            spans for trace_id, spans in traces.items()
+            if (not options["trace_id"] or trace_id == options["trace_id"])
+            and (not options["name"] or any(item["name"] == options["name"] for item in spans))
+        ]
+        if not candidates:
+            raise CommandError("条件に合うトレースがありません。")
+
+        def root_of(spans):
+            return next(item for item in spans if item["parent_id"] is None)
+
+        key = (lambda spans: root_of(spans)["duration_ms"]) if options["slowest"] else (
+            lambda spans: root_of(spans)["start_ns"]
+        )
+        spans = max(candidates, key=key)
+        root = root_of(spans)
+        self.stdout.write(f"trace {root['trace_id']}")
+        self._write_tree(root, spans)
+
+    def _write_tree(self, root, spans):
+        children = defaultdict(list)
+        for item in spans:
+            if item["parent_id"]:
+                children[item["parent_id"]].append(item)
+
+        def write(item, depth):
+            kids = children[item["span_id"]]
+            self_ms = item["duration_ms"] - sum(kid["duration_ms"] for kid in kids)
+            attributes = {
+                key: value for key, value in item["attributes"].items()
+                if not key.startswith("db.")
+            }
+            suffix = f" {json.dumps(attributes, ensure_ascii=False)}" if attributes else ""
+            self.stdout.write(
+                f"{'  ' * depth}{item['name']}: {item['duration_ms']:.3f}ms "
+                f"(self {self_ms:.3f}ms){suffix}"
+            )
+
+            queries = [kid for kid in kids if kid["name"] == "db.query"]
+            if queries:
+                total = sum(kid["duration_ms"] for kid in queries)
+                self.stdout.write(f"{'  ' * (depth + 1)}db.query x{len(queries)}: {total:.3f}ms")
+            for kid in kids:
+                if kid["name"] != "db.query":
+                    write(kid, depth + 1)
+
+        write(root, 0)
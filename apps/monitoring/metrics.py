@@ -0,0 +1,311 @@
+"""
+Prometheus形式のメトリクス（外部ライブラリなし）
+
+値はスレッドごとの集計領域に書き込み（書き込み時はロックを取らない）、
+/metrics の取得時にまとめて合算する。gunicornなど複数プロセスで動かす場合は
+settings.METRICS_MULTIPROCESS_DIRを指定すると、各プロセスが集計結果を
+そのディレクトリにJSONで書き出し、取得時に全プロセス分を合算する。
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    """スレッドごとの集計領域を持つメトリクスの基底クラス"""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        """現在のスレッドの集計領域（初回だけロックを取って登録）"""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _label_values(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _empty(self) -> list:
+        raise NotImplementedError
+
+    def snapshot(self) -> Dict[Tuple[str, ...], list]:
+        """全スレッドの値を合算"""
+        with self._lock:
+            shards = list(self._shards)
+        merged = {}
+        for shard in shards:
+            for label_values, values in list(shard.items()):
+                total = merged.setdefault(label_values, self._empty())
+                for index, value in enumerate(values):
+                    total[index] += value
+        return merged
+
+    def describe(self) -> dict:
+        """書き出し・合算用のメタデータ"""
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+        }
+
+    def clear(self):
+        """すべての値を破棄（テスト用）"""
+        with self._lock:
+            for shard in self._shards:
+                shard.clear()
+
+
+class Counter(_Metric):
+    """単調増加するカウンタ"""
+
+    type = "counter"
+
+    def _empty(self) -> list:
+        return [0.0]
+
+    def inc(self, amount: float = 1, **labels):
+        shard = self._shard()
+        label_values = self._label_values(labels)
+        values = shard.get(label_values)
+        if values is None:
+            values = shard[label_values] = self._empty()
+        values[0] += amount
+
+
+class Histogram(_Metric):
+    """
+    ヒストグラム
+
+    値はバケットごとの件数（累積しない、最後は上限なし）と合計の配列で保持し、
+    出力時に累積件数に変換する。
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _empty(self) -> list:
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value: float, **labels):
+        shard = self._shard()
+        label_values = self._label_values(labels)
+        values = shard.get(label_values)
+        if values is None:
+            values = shard[label_values] = self._empty()
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """ブロックの実行時間（秒）を記録"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def describe(self) -> dict:
+        return {**super().describe(), "buckets": list(self.buckets)}
+
+
+class MetricsRegistry:
+    """メトリクスの登録・合算・Prometheus形式での出力"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """カウンタを登録（同名のものがあればそれを返す）"""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """ヒストグラムを登録（同名のものがあればそれを返す）"""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], list]):
+        """
+        取得時に値を求めるカウンタを登録
+
+        collectorは (名前, 説明, {ラベル名: 値}, 値) のリストを返す関数。
+        プロセスごとの値として扱い、複数プロセスでは合算する。
+        """
+        self._collectors.append(collector)
+
+    def snapshot(self) -> dict:
+        """このプロセスの全メトリクスの値（JSONに書き出せる形）"""
+        result = {}
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            result[metric.name] = {
+                **metric.describe(),
+                "samples": {
+                    json.dumps(list(label_values)): values
+                    for label_values, values in metric.snapshot().items()
+                },
+            }
+        for collector in self._collectors:
+            for name, documentation, labels, value in collector():
+                entry = result.setdefault(name, {
+                    "type": "counter",
+                    "help": documentation,
+                    "labelnames": list(labels),
+                    "samples": {},
+                })
+                entry["samples"][json.dumps([str(v) for v in labels.values()])] = [value]
+        return result
+
+    # 複数プロセスでの集計
+
+    def _multiprocess_dir(self) -> Optional[Path]:
+        directory = getattr(settings, "METRICS_MULTIPROCESS_DIR", None)
+        return Path(directory) if directory else None
+
+    def flush(self, force: bool = False):
+        """
+        このプロセスの値を共有ディレクトリに書き出す
+
+        METRICS_FLUSH_INTERVAL秒に1回まで（forceの場合は常に）。
+        一時ファイルに書いてから置き換えるため、読み込み中に壊れたファイルは見えない。
+        """
+        directory = self._multiprocess_dir()
+        if directory is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < getattr(settings, "METRICS_FLUSH_INTERVAL", 1.0):
+            return
+        self._last_flush = now
+
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"metrics-{os.getpid()}.json"
+        temporary = path.with_suffix(f".{threading.get_ident()}.tmp")
+        temporary.write_text(json.dumps(self.snapshot()), encoding="utf-8")
+        os.replace(temporary, path)
+
+    def collect(self) -> list:
+        """合算対象のスナップショット（複数プロセスの場合は全プロセス分）"""
+        directory = self._multiprocess_dir()
+        if directory is None:
+            return [self.snapshot()]
+        self.flush(force=True)
+        snapshots = []
+        for path in sorted(directory.glob("metrics-*.json")):
+            try:
+                snapshots.append(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):  # 書き出し途中や削除済みのファイルは飛ばす
+                continue
+        return snapshots
+
+    # 出力
+
+    def render(self) -> str:
+        """Prometheusのテキスト形式で出力"""
+        merged = {}
+        for snapshot in self.collect():
+            for name, entry in snapshot.items():
+                target = merged.setdefault(name, {**entry, "samples": {}})
+                for key, values in entry["samples"].items():
+                    total = target["samples"].setdefault(key, [0] * len(values))
+                    for index, value in enumerate(values):
+                        total[index] += value
+
+        lines = []
+        for name, entry in sorted(merged.items()):
+            lines.append(f"# HELP {name} {entry['help']}")
+            lines.append(f"# TYPE {name} {entry['type']}")
+            for key, values in sorted(entry["samples"].items()):
+                labels = list(zip(entry["labelnames"], json.loads(key)))
+                if entry["type"] == "histogram":
+                    lines.extend(_render_histogram(name, labels, entry["buckets"], values))
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(values[0])}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        """すべての値を破棄（テスト用）"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _render_histogram(name, labels, buckets, values):
+    """ヒストグラムの1系列を累積バケット・合計・件数の行に変換"""
+    lines = []
+    cumulative = 0
+    for bound, count in zip([*buckets, "+Inf"], values[:-1]):
+        cumulative += count
+        le = bound if bound == "+Inf" else _format_value(bound)
+        lines.append(f"{name}_bucket{_format_labels([*labels, ('le', le)])} {int(cumulative)}")
+    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values[-1])}")
+    lines.append(f"{name}_count{_format_labels(labels)} {int(cumulative)}")
+    return lines
+
+
+registry = MetricsRegistry()
+
+# ビューごとの応答時間（MetricsMiddlewareが記録）
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds",
+    "ビューごとの応答時間（秒）",
+    labelnames=("view", "method", "status"),
+)
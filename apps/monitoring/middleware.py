@@ -0,0 +1,198 @@
+"""
+性能監視用のミドルウェア
+"""
+
+import cProfile
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import REQUEST_SECONDS, registry
+from .profiling import ProfileWriter, hash_user_id
+from .queries import record_queries
+from .tracing import span, sql_span_wrapper, tracing_enabled
+
+logger = logging.getLogger("apps.monitoring.queries")
+
+
+def resolved_view_name(request) -> str:
+    """URLから解決したビュー名（study:card など、解決できない場合は空文字）"""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return ""
+    return match.view_name or ""
+
+
+class MetricsMiddleware:
+    """
+    ビューごとの応答時間をメトリクスに記録
+
+    settings.METRICS_ENABLEDがTrueの場合だけ有効。複数プロセスの設定では
+    応答後に集計結果を共有ディレクトリへ書き出す（一定間隔ごと）。
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            view=resolved_view_name(request) or "unresolved",
+            method=request.method,
+            status=response.status_code,
+        )
+        registry.flush()
+        return response
+
+
+class TracingMiddleware:
+    """
+    リクエスト全体をルートのスパンとして記録し、SQLの実行を子スパンにする
+
+    settings.TRACING_ENABLEDがTrueの場合だけ有効。
+    """
+
+    def __init__(self, get_response):
+        if not tracing_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with span("http.request", **{"http.method": request.method, "http.path": request.path}) as root:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(sql_span_wrapper))
+                response = self.get_response(request)
+            root.set_attribute("http.view", resolved_view_name(request))
+            root.set_attribute("http.status", response.status_code)
+        return response
+
+
+class QueryInstrumentationMiddleware:
+    """
+    リクエストごとのクエリ件数・DB時間・重複クエリを計測
+
+    settings.QUERY_INSTRUMENTATIONがTrueの場合だけ有効。結果はServer-Timing
+    ヘッダーとJSON形式のログ（apps.monitoring.queries）に出力し、同じ形の
+    クエリがQUERY_N_PLUS_ONE_THRESHOLD回を超えて実行された場合は警告する。
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, "QUERY_N_PLUS_ONE_THRESHOLD", 5)
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        repeated = recorder.repeated_shapes(self.threshold)
+        response["Server-Timing"] = ", ".join(filter(None, [
+            response.get("Server-Timing"),
+            f'db;dur={recorder.duration * 1000:.3f};desc="{recorder.count} queries"',
+            f'db-dup;desc="{recorder.duplicates} duplicates"',
+            f"app;dur={total * 1000:.3f}",
+        ]))
+
+        record = {
+            "view": resolved_view_name(request),
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": recorder.count,
+            "db_ms": round(recorder.duration * 1000, 3),
+            "duplicates": recorder.duplicates,
+            "total_ms": round(total * 1000, 3),
+            "n_plus_one": repeated,
+        }
+        level = logging.WARNING if repeated else logging.INFO
+        logger.log(level, json.dumps(record, ensure_ascii=False), extra={"query_stats": record})
+        return response
+
+
+class RequestProfilerMiddleware:
+    """
+    対象ビューのリクエストをcProfileで計測し、遅いものとサンプリングしたものを保存
+
+    settings.REQUEST_PROFILINGがTrueの場合だけ有効。対象はビュー名が
+    REQUEST_PROFILING_VIEWSのいずれかで始まるリクエスト（既定は学習画面）。
+    応答時間がREQUEST_PROFILING_THRESHOLD_MSを超えた場合と、
+    REQUEST_PROFILING_SAMPLE_RATEの確率で選ばれた場合に
+    REQUEST_PROFILING_DIRへ書き出す。遅いかどうかは終わるまで分からないため、
+    対象ビューは常にcProfileを有効にして実行する。
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_PROFILING", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, "REQUEST_PROFILING_THRESHOLD_MS", 500)
+        self.sample_rate = getattr(settings, "REQUEST_PROFILING_SAMPLE_RATE", 0.0)
+        self.view_prefixes = tuple(getattr(settings, "REQUEST_PROFILING_VIEWS", ("study:",)))
+        self.query_threshold = getattr(settings, "QUERY_N_PLUS_ONE_THRESHOLD", 5)
+        self.writer = ProfileWriter(
+            settings.REQUEST_PROFILING_DIR,
+            max_files=getattr(settings, "REQUEST_PROFILING_MAX_FILES", 100),
+        )
+
+    def __call__(self, request):
+        request._profiler = None
+        started = time.perf_counter()
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        profiler = request._profiler
+        if profiler is None:
+            return response
+        profiler.disable()
+
+        if duration_ms > self.threshold:
+            reason = "slow"
+        elif random.random() < self.sample_rate:
+            reason = "sampled"
+        else:
+            return response
+
+        user = getattr(request, "user", None)
+        user_id = user.pk if user is not None and user.is_authenticated else None
+        self.writer.write(profiler, resolved_view_name(request), {
+            "reason": reason,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 3),
+            "user": hash_user_id(user_id),
+            "queries": {
+                "count": recorder.count,
+                "db_ms": round(recorder.duration * 1000, 3),
+                "duplicates": recorder.duplicates,
+                "n_plus_one": recorder.repeated_shapes(self.query_threshold),
+            },
+        })
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """対象ビューならプロファイルを開始（ビュー名はここで確定する）"""
+        if not resolved_view_name(request).startswith(self.view_prefixes):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # 他のプロファイラが有効な場合は計測しない
+            return None
+        request._profiler = profiler
+        return None
@@ -0,0 +1,78 @@
+"""
+遅いリクエストのプロファイル（cProfile）の保存
+
+プロファイルはpstats形式（.prof）で保存し、ビュー名・ユーザーIDのハッシュ・
+クエリの集計などを同名のJSON（.json）に書き出す。保存先のファイル数が
+上限を超えたら古いものから削除する。
+
+    python -m pstats profiles/20260101T000000_study-answer_ab12cd34ef56.prof
+"""
+
+import hashlib
+import io
+import json
+import pstats
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+
+
+def hash_user_id(user_id) -> str:
+    """ユーザーIDをそのまま残さないためのハッシュ（SECRET_KEYを加える）"""
+    if user_id is None:
+        return "anonymous"
+    value = f"{settings.SECRET_KEY}:{user_id}".encode()
+    return hashlib.sha256(value).hexdigest()[:12]
+
+
+def top_functions(profiler, limit: int = 20) -> list:
+    """累積時間の長い関数の一覧"""
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+        rows.append({
+            "function": f"{filename}:{line}({function})",
+            "calls": calls,
+            "total_ms": round(total * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3),
+        })
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+
+class ProfileWriter:
+    """プロファイルを保存先に書き出し、件数の上限を超えた古いものを削除"""
+
+    def __init__(self, directory, max_files: int = 100):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def write(self, profiler, view_name: str, metadata: dict) -> Path:
+        """
+        プロファイルとメタデータを保存
+
+        Returns:
+            保存した.profファイルのパス
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        safe_view = (view_name or "unknown").replace(":", "-").replace("/", "-")
+        stem = f"{timestamp}_{safe_view}_{metadata.get('user', 'anonymous')}"
+
+        profile_path = self.directory / f"{stem}.prof"
+        profiler.dump_stats(profile_path)
+        metadata = {**metadata, "view": view_name, "top_functions": top_functions(profiler)}
+        profile_path.with_suffix(".json").write_text(
+            json.dumps(metadata, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+
+        self.rotate()
+        return profile_path
+
+    def rotate(self):
+        """上限を超えた古いプロファイル（とメタデータ）を削除"""
+        profiles = sorted(self.directory.glob("*.prof"))
+        for profile_path in profiles[: max(len(profiles) - self.max_files, 0)]:
+            profile_path.unlink(missing_ok=True)
+            profile_path.with_suffix(".json").unlink(missing_ok=True)
@@ -0,0 +1,83 @@
+"""
+リクエスト単位のSQLクエリ計測
+
+connection.execute_wrapperでクエリを横取りし、件数・DB時間・
+重複クエリ・同じ形のクエリの繰り返し（N+1）を記録する。
+"""
+
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+# SQLの形を比較するための正規化
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def sql_shape(sql: str) -> str:
+    """
+    リテラルとIN句の要素数を除いたSQLの形
+
+    パラメータはプレースホルダとして渡されるため、通常は件数の異なる
+    IN句とSQLに直接埋め込まれた値だけを正規化すれば十分。
+    """
+    shape = _STRING_LITERAL.sub("?", sql)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _IN_LIST.sub("IN (...)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class QueryRecorder:
+    """execute_wrapperとして登録し、実行されたクエリを集計"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            try:
+                self.statements[(sql, repr(params))] += 1
+            except Exception:  # reprできないパラメータは重複判定から外す
+                pass
+            self.shapes[sql_shape(sql)] += 1
+
+    @property
+    def duplicates(self) -> int:
+        """同じSQL・同じパラメータで2回目以降に実行されたクエリ数"""
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def repeated_shapes(self, threshold: int) -> list:
+        """
+        thresholdを超えて繰り返された形のクエリ（N+1の疑い）
+
+        Returns:
+            {"sql": 形, "count": 回数} のリスト（回数の多い順）
+        """
+        return [
+            {"sql": shape, "count": count}
+            for shape, count in self.shapes.most_common()
+            if count > threshold
+        ]
+
+
+@contextmanager
+def record_queries():
+    """すべてのDB接続のクエリをQueryRecorderで記録するコンテキスト"""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
@@ -0,0 +1,140 @@
+"""
+メトリクスのテスト
+"""
+
+import json
+import threading
+
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from apps.cards.models import Card
+from apps.decks.models import Deck
+from apps.monitoring.metrics import MetricsRegistry
+from apps.monitoring.metrics import registry as shared_registry
+
+
+class TestMetricsRegistry:
+    """MetricsRegistryのテストクラス"""
+
+    def test_histogram_renders_cumulative_buckets(self, settings):
+        """ヒストグラムが累積バケット・合計・件数で出力されることをテスト"""
+        settings.METRICS_MULTIPROCESS_DIR = None
+        registry = MetricsRegistry()
+        histogram = registry.histogram("latency_seconds", "応答時間", labelnames=("view",), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, view="study:card")
+
+        text = registry.render()
+
+        assert "# TYPE latency_seconds histogram" in text
+        assert 'latency_seconds_bucket{view="study:card",le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{view="study:card",le="1"} 2' in text
+        assert 'latency_seconds_bucket{view="study:card",le="+Inf"} 3' in text
+        assert 'latency_seconds_sum{view="study:card"} 5.55' in text
+        assert 'latency_seconds_count{view="study:card"} 3' in text
+
+    def test_thread_shards_are_merged(self, settings):
+        """スレッドごとの値が取得時に合算されることをテスト"""
+        settings.METRICS_MULTIPROCESS_DIR = None
+        registry = MetricsRegistry()
+        counter = registry.counter("reviews_total", "復習数")
+
+        def work():
+            for _ in range(1000):
+                counter.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert "reviews_total 4000" in registry.render()
+
+    def test_multiprocess_directory_is_merged(self, settings, tmp_path):
+        """共有ディレクトリに書き出された他プロセスの値が合算されることをテスト"""
+        settings.METRICS_MULTIPROCESS_DIR = str(tmp_path)
+        registry = MetricsRegistry()
+        registry.counter("reviews_total", "復習数").inc(3)
+        # 別プロセスが書き出した値
+        (tmp_path / "metrics-999999.json").write_text(json.dumps({
+            "reviews_total": {
+                "type": "counter",
+                "help": "復習数",
+                "labelnames": [],
+                "samples": {"[]": [4]},
+            },
+        }), encoding="utf-8")
+
+        assert "reviews_total 7" in registry.render()
+
+    def test_collector_values_are_exported(self, settings):
+        """取得時に値を求めるカウンタが出力されることをテスト"""
+        settings.METRICS_MULTIPROCESS_DIR = None
+        registry = MetricsRegistry()
+        registry.register_collector(lambda: [("cache_hits_total", "ヒット数", {"cache": "test"}, 5)])
+
+        assert 'cache_hits_total{cache="test"} 5' in registry.render()
+
+
+@pytest.mark.django_db
+class TestMetricsView:
+    """メトリクスのエンドポイントのテストクラス"""
+
+    def test_disabled_returns_404(self, client, settings):
+        """無効にした場合は404になることをテスト"""
+        settings.METRICS_ENABLED = False
+
+        assert client.get(reverse("monitoring:metrics")).status_code == 404
+
+    def test_disabled_by_default(self, client):
+        """既定では無効であることをテスト"""
+        assert client.get(reverse("monitoring:metrics")).status_code == 404
+
+    @pytest.mark.parametrize("headers", [{}, {"HTTP_AUTHORIZATION": "Bearer wrong"}])
+    def test_anonymous_is_forbidden(self, client, settings, headers):
+        """トークンもスタッフのログインもなければ403になることをテスト"""
+        settings.METRICS_ENABLED = True
+        settings.METRICS_TOKEN = "secret-token"
+        user = User.objects.create_user(username="testuser", password="testpass123")
+
+        assert client.get(reverse("monitoring:metrics"), **headers).status_code == 403
+        client.force_login(user)
+        assert client.get(reverse("monitoring:metrics"), **headers).status_code == 403
+
+    def test_bearer_token(self, client, settings):
+        """Bearerトークンで取得できることをテスト"""
+        settings.METRICS_ENABLED = True
+        settings.METRICS_TOKEN = "secret-token"
+
+        response = client.get(
+            reverse("monitoring:metrics"), HTTP_AUTHORIZATION="Bearer secret-token"
+        )
+        assert response.status_code == 200
+
+    def test_scheduling_metrics_are_exported(self, client, settings):
+        """学習の流れで記録したメトリクスが出力されることをテスト"""
+        settings.METRICS_ENABLED = True
+        settings.METRICS_MULTIPROCESS_DIR = None
+        shared_registry.clear()
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        card = Card.objects.create(deck=deck, front="質問", back="答え")
+        client.force_login(user)
+
+        client.get(reverse("study:session", args=[deck.pk]))
+        client.get(reverse("study:card", args=[deck.pk, card.pk]))
+        client.post(reverse("study:answer", args=[deck.pk, card.pk]), {"rating": 3})
+        user.is_staff = True
+        user.save()
+        response = client.get(reverse("monitoring:metrics"))
+
+        assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+        text = response.content.decode()
+        assert "fsrs_review_card_duration_seconds_count 1" in text
+        assert "study_queue_build_duration_seconds_count" in text
+        assert "study_queue_cards_bucket" in text
+        assert 'cache_misses_total{cache="interval_preview"}' in text
+        assert 'http_request_duration_seconds_count{view="study:card",method="GET",status="200"} 1' in text
@@ -0,0 +1,114 @@
+"""
+クエリ計測ミドルウェアのテスト
+"""
+
+import json
+import logging
+
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from apps.decks.models import Deck
+from apps.monitoring.queries import record_queries, sql_shape
+
+
+class TestSqlShape:
+    """SQLの形の正規化のテストクラス"""
+
+    def test_in_list_length_is_ignored(self):
+        """IN句の要素数が違っても同じ形になることをテスト"""
+        assert sql_shape('SELECT * FROM "t" WHERE "id" IN (%s, %s)') == sql_shape(
+            'SELECT * FROM "t" WHERE "id" IN (%s, %s, %s)'
+        )
+
+    def test_literals_are_replaced(self):
+        """埋め込まれたリテラルが置き換えられることをテスト"""
+        assert sql_shape("SELECT 1 FROM t WHERE name = 'a'  LIMIT 21") == (
+            "SELECT ? FROM t WHERE name = ? LIMIT ?"
+        )
+
+
+@pytest.mark.django_db
+class TestRecordQueries:
+    """record_queriesのテストクラス"""
+
+    def test_counts_duplicates_and_repeated_shapes(self):
+        """重複クエリと繰り返された形のクエリが集計されることをテスト"""
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        decks = [Deck.objects.create(user=user, name=f"デッキ{i}") for i in range(4)]
+
+        with record_queries() as recorder:
+            for deck in decks:
+                Deck.objects.get(pk=deck.pk)
+            Deck.objects.get(pk=decks[0].pk)
+
+        assert recorder.count == 5
+        assert recorder.duplicates == 1
+        assert recorder.duration > 0
+        assert recorder.repeated_shapes(threshold=3)[0]["count"] == 5
+        assert recorder.repeated_shapes(threshold=5) == []
+
+
+@pytest.mark.django_db
+class TestQueryInstrumentationMiddleware:
+    """QueryInstrumentationMiddlewareのテストクラス"""
+
+    @pytest.fixture
+    def logged_in_client(self, client):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        for i in range(3):
+            Deck.objects.create(user=user, name=f"デッキ{i}")
+        client.login(username="testuser", password="testpass123")
+        return client
+
+    def test_disabled_by_default(self, logged_in_client, settings):
+        """設定で有効にしない場合はヘッダーを付けないことをテスト"""
+        settings.QUERY_INSTRUMENTATION = False
+
+        response = logged_in_client.get(reverse("decks:deck_list"))
+
+        assert "Server-Timing" not in response
+
+    def test_server_timing_and_log(self, logged_in_client, settings, caplog):
+        """Server-Timingヘッダーとビュー名つきのログが出力されることをテスト"""
+        settings.QUERY_INSTRUMENTATION = True
+
+        with caplog.at_level(logging.INFO, logger="apps.monitoring.queries"):
+            response = logged_in_client.get(reverse("decks:deck_list"))
+
+        assert 'desc="' in response["Server-Timing"]
+        assert response["Server-Timing"].startswith("db;dur=")
+
+        record = json.loads(caplog.records[-1].getMessage())
+        assert record["view"] == "decks:deck_list"
+        assert record["status"] == 200
+        assert record["queries"] > 0
+        assert record["n_plus_one"] == []
+
+    def test_n_plus_one_is_flagged(self, logged_in_client, settings, caplog, monkeypatch):
+        """同じ形のクエリの繰り返しが警告されることをテスト"""
+        settings.QUERY_INSTRUMENTATION = True
+        settings.QUERY_N_PLUS_ONE_THRESHOLD = 2
+
+        # デッキごとに件数を問い合わせるN+1を再現する
+        from apps.decks import views
+
+        original = views.attach_deck_counters
+
+        def per_deck_counts(decks, user):
+            decks = original(decks, user)
+            for deck in decks:
+                deck.cards.count()
+            return decks
+
+        monkeypatch.setattr(views, "attach_deck_counters", per_deck_counts)
+
+        with caplog.at_level(logging.INFO, logger="apps.monitoring.queries"):
+            logged_in_client.get(reverse("decks:deck_list"))
+
+        warning = caplog.records[-1]
+        assert warning.levelno == logging.WARNING
+        record = json.loads(warning.getMessage())
+        assert record["n_plus_one"][0]["count"] == 3
+        assert "COUNT" in record["n_plus_one"][0]["sql"]
@@ -0,0 +1,99 @@
+"""
+遅いリクエストのプロファイラのテスト
+"""
+
+import cProfile
+import json
+import pstats
+
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from apps.cards.models import Card
+from apps.decks.models import Deck
+from apps.monitoring.profiling import ProfileWriter, hash_user_id
+
+
+@pytest.fixture
+def profiling(settings, tmp_path):
+    """プロファイラを有効にして保存先を一時ディレクトリにする"""
+    settings.REQUEST_PROFILING = True
+    settings.REQUEST_PROFILING_DIR = tmp_path
+    settings.REQUEST_PROFILING_THRESHOLD_MS = 0
+    settings.REQUEST_PROFILING_SAMPLE_RATE = 0.0
+    settings.REQUEST_PROFILING_VIEWS = ["study:"]
+    return settings
+
+
+@pytest.mark.django_db
+class TestRequestProfilerMiddleware:
+    """RequestProfilerMiddlewareのテストクラス"""
+
+    @pytest.fixture
+    def study_data(self, client):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        card = Card.objects.create(deck=deck, front="質問", back="答え")
+        client.force_login(user)
+        return user, deck, card
+
+    def test_slow_request_is_saved(self, client, study_data, profiling, tmp_path):
+        """閾値を超えた学習画面のプロファイルが保存されることをテスト"""
+        user, deck, card = study_data
+
+        client.get(reverse("study:card", args=[deck.pk, card.pk]))
+
+        profiles = list(tmp_path.glob("*.prof"))
+        assert len(profiles) == 1
+        assert "study-card" in profiles[0].name
+        # pstatsで読み込める
+        assert pstats.Stats(str(profiles[0])).total_calls > 0
+
+        metadata = json.loads(profiles[0].with_suffix(".json").read_text(encoding="utf-8"))
+        assert metadata["view"] == "study:card"
+        assert metadata["reason"] == "slow"
+        assert metadata["user"] == hash_user_id(user.pk)
+        assert str(user.pk) != metadata["user"]
+        assert metadata["queries"]["count"] > 0
+        assert metadata["top_functions"]
+
+    def test_fast_request_is_not_saved(self, client, study_data, profiling, tmp_path):
+        """閾値未満でサンプリングされないリクエストは保存されないことをテスト"""
+        user, deck, card = study_data
+        profiling.REQUEST_PROFILING_THRESHOLD_MS = 60_000
+
+        client.get(reverse("study:card", args=[deck.pk, card.pk]))
+
+        assert not list(tmp_path.glob("*.prof"))
+
+    def test_sampled_request_is_saved(self, client, study_data, profiling, tmp_path):
+        """サンプリングで選ばれたリクエストが保存されることをテスト"""
+        user, deck, card = study_data
+        profiling.REQUEST_PROFILING_THRESHOLD_MS = 60_000
+        profiling.REQUEST_PROFILING_SAMPLE_RATE = 1.0
+
+        client.get(reverse("study:card", args=[deck.pk, card.pk]))
+
+        [metadata_path] = tmp_path.glob("*.json")
+        assert json.loads(metadata_path.read_text(encoding="utf-8"))["reason"] == "sampled"
+
+    def test_other_views_are_not_profiled(self, client, study_data, profiling, tmp_path):
+        """対象外のビューは計測しないことをテスト"""
+        client.get(reverse("decks:deck_list"))
+
+        assert not list(tmp_path.glob("*.prof"))
+
+
+def test_writer_rotates_old_profiles(tmp_path):
+    """上限を超えた古いプロファイルが削除されることをテスト"""
+    writer = ProfileWriter(tmp_path, max_files=2)
+    for _ in range(3):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        sum(range(100))
+        profiler.disable()
+        writer.write(profiler, "study:card", {"user": "anonymous"})
+
+    assert len(list(tmp_path.glob("*.prof"))) == 2
+    assert len(list(tmp_path.glob("*.json"))) == 2
@@ -0,0 +1,195 @@
+"""
+全URLのクエリ数の上限（クエリバジェット）のテスト
+
+各URLを小さなデータ（1デッキ・10枚）と大きなデータ（5デッキ・計10,000枚）で
+呼び出し、クエリ数がデータ量に依存せず、上限以下であることを確認する。
+URLを追加した場合はQUERY_BUDGETSにも追加すること（test_every_url_has_budget）。
+"""
+
+import random
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+from apps.cards.models import Card
+from apps.decks.models import Deck
+from apps.study import counters, new_cards
+from apps.study.models import CardState
+from apps.study.views import start_study_session
+
+# 対象外のURL名前空間（Django組み込みの管理画面）
+EXCLUDED_NAMESPACES = {"admin"}
+
+SMALL = {"decks": 1, "cards_per_deck": 10}
+LARGE = {"decks": 5, "cards_per_deck": 2000}
+
+# URL名: (メソッド, ログインするか, URL引数の種類, POSTデータ, クエリ数の上限)
+# URL引数の種類は "deck"（デッキID）/ "card"（カードID）/ "deck_card"（両方）/ None
+# POSTデータが文字列の場合は {card} をカードIDに置き換えてJSONとして送る
+SYNC_PUSH_DATA = (
+    '{{"reviews": [{{"client_review_id": "r1", "card_id": {card}, "rating": 3,'
+    ' "reviewed_at": "2100-01-01T00:00:00+00:00"}}]}}'
+)
+
+QUERY_BUDGETS = {
+    "home": ("get", True, None, None, 2),
+    "accounts:signup": ("get", False, None, None, 0),
+    "accounts:login": ("get", False, None, None, 0),
+    "accounts:logout": ("post", True, None, None, 4),
+    "accounts:profile": ("get", True, None, None, 6),
+    "accounts:profile_edit": ("get", True, None, None, 6),
+    "decks:deck_list": ("get", True, None, None, 5),
+    "decks:deck_create": ("get", True, None, None, 2),
+    "decks:deck_detail": ("get", True, "deck", None, 6),
+    "decks:deck_edit": ("get", True, "deck", None, 3),
+    "decks:deck_delete": ("get", True, "deck", None, 4),
+    "cards:card_create": ("get", True, "deck", None, 3),
+    "cards:card_detail": ("get", True, "card", None, 3),
+    "cards:card_edit": ("get", True, "card", None, 3),
+    "cards:card_delete": ("get", True, "card", None, 3),
+    "study:session": ("get", True, "deck", None, 12),
+    "study:card": ("get", True, "deck_card", None, 8),
+    "study:answer": ("post", True, "deck_card", {"rating": 3}, 22),
+    "study:complete": ("get", True, "deck", None, 5),
+    "study:session_all": ("get", True, None, None, 14),
+    "study:card_all": ("get", True, "card", None, 19),
+    "study:answer_all": ("post", True, "card", {"rating": 3}, 31),
+    "study:complete_all": ("get", True, None, None, 4),
+    "study_api:queue": ("get", True, "deck", None, 5),
+    "study_api:card": ("get", True, "deck_card", None, 5),
+    "study_api:intervals": ("get", True, "deck_card", None, 6),
+    "study_api:answer": ("post", True, "deck_card", {"rating": 3}, 22),
+    "study_api:sync_pull": ("get", True, None, None, 6),
+    "study_api:sync_push": ("post", True, None, SYNC_PUSH_DATA, 24),
+    "monitoring:metrics": ("get", False, None, None, 0),
+}
+
+# URL名: 追加のリクエストヘッダー
+METRICS_TOKEN = "test-metrics-token"
+REQUEST_HEADERS = {
+    "monitoring:metrics": {"HTTP_AUTHORIZATION": f"Bearer {METRICS_TOKEN}"},
+}
+
+
+def collect_url_names(resolver=None, namespace=None):
+    """URL設定から名前つきのURLパターンを再帰的に列挙"""
+    resolver = resolver or get_resolver()
+    names = set()
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace in EXCLUDED_NAMESPACES:
+                continue
+            child_namespace = pattern.namespace or namespace
+            names |= collect_url_names(pattern, child_namespace)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(f"{namespace}:{pattern.name}" if namespace else pattern.name)
+    return names
+
+
+def seed(username, decks, cards_per_deck):
+    """
+    ユーザーとデッキ・カードを作成（半数を学習済み、そのうち半数を復習期限切れにする）
+
+    Returns:
+        (ユーザー, 最初のデッキ, 出題キューの先頭カード)
+    """
+    rng = random.Random(0)
+    now = timezone.now()
+    user = User.objects.create(username=username)
+    deck_objects = Deck.objects.bulk_create([
+        Deck(user=user, name=f"デッキ{index}") for index in range(decks)
+    ])
+    for deck in deck_objects:
+        cards = Card.objects.bulk_create([
+            Card(deck=deck, front=f"質問{index}", back=f"答え{index}")
+            for index in range(cards_per_deck)
+        ])
+        card_states = []
+        for index, card in enumerate(cards[: cards_per_deck // 2]):
+            due = now + timedelta(days=-1 if index % 2 else 3)
+            card_states.append(CardState(
+                card=card,
+                user=user,
+                stability=rng.uniform(1, 30),
+                difficulty=rng.uniform(1, 10),
+                state=CardState.State.REVIEW,
+                due=due,
+                next_review=due,
+                last_review=due - timedelta(days=2),
+                reps=1,
+            ))
+        CardState.objects.bulk_create(card_states)
+    counters.rebuild_counters(deck_objects, user)
+
+    # デッキごとの新規カードの探索位置（初回の出題時に作成される）を作成しておく
+    new_cards.new_card_ids_by_deck([deck.pk for deck in deck_objects], user, 1)
+
+    deck = deck_objects[0]
+    session = start_study_session(deck, user)
+    return user, deck, Card.objects.get(pk=session.current_card_id)
+
+
+def count_queries(name, user, deck, card):
+    """URLを呼び出してクエリ数を返す"""
+    method, login, arg_kind, data, _ = QUERY_BUDGETS[name]
+    args = {
+        None: [],
+        "deck": [deck.pk],
+        "card": [card.pk],
+        "deck_card": [deck.pk, card.pk],
+    }[arg_kind]
+
+    client = Client()
+    if login:
+        client.force_login(user)
+    kwargs = dict(REQUEST_HEADERS.get(name, {}))
+    if isinstance(data, str):
+        data = data.format(card=card.pk)
+        kwargs["content_type"] = "application/json"
+    with CaptureQueriesContext(connection) as context:
+        response = getattr(client, method)(reverse(name, args=args), data, **kwargs)
+    assert response.status_code < 400, f"{name}: {response.status_code}"
+    return len(context.captured_queries)
+
+
+@pytest.fixture(scope="module")
+def datasets(django_db_setup, django_db_blocker):
+    """
+    小さなデータと大きなデータ（作成に時間がかかるためモジュール内で共有）
+
+    各テストはトランザクション内で実行されるため、回答などの変更は
+    テストごとにロールバックされる。
+    """
+    with django_db_blocker.unblock():
+        data = {
+            "small": seed("small", **SMALL),
+            "large": seed("large", **LARGE),
+        }
+    yield data
+    with django_db_blocker.unblock():
+        User.objects.filter(username__in=data).delete()
+
+
+def test_every_url_has_budget():
+    """すべてのURLにクエリ数の上限が設定されていることをテスト"""
+    assert collect_url_names() == set(QUERY_BUDGETS)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("name", sorted(QUERY_BUDGETS))
+def test_query_count_is_constant(name, datasets, settings):
+    """クエリ数がデータ量に依存せず、上限以下であることをテスト"""
+    settings.METRICS_ENABLED = True
+    settings.METRICS_TOKEN = METRICS_TOKEN
+    small = count_queries(name, *datasets["small"])
+    large = count_queries(name, *datasets["large"])
+    budget = QUERY_BUDGETS[name][4]
+
+    assert small == large, f"{name}: 小さなデータで{small}件、大きなデータで{large}件"
+    assert large <= budget, f"{name}: {large}件（上限{budget}件）"
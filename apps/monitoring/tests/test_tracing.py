@@ -0,0 +1,117 @@
+"""
+トレーシングのテスト
+"""
+
+import json
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+
+from apps.cards.models import Card
+from apps.decks.models import Deck
+from apps.monitoring.tracing import OTLPHttpExporter, Span, current_span, span, traced
+
+
+@pytest.fixture
+def tracing(settings, tmp_path):
+    """トレーシングを有効にして一時ファイルに出力する"""
+    settings.TRACING_ENABLED = True
+    settings.TRACING_EXPORTER = "jsonl"
+    settings.TRACING_FILE = tmp_path / "traces.jsonl"
+    return settings
+
+
+def read_spans(path):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+class TestSpan:
+    """スパンのテストクラス"""
+
+    def test_nested_spans_share_trace(self, tracing):
+        """子スパンが親と同じトレースIDと親のスパンIDを持つことをテスト"""
+        @traced("child")
+        def child():
+            return current_span()
+
+        with span("root", answer=42) as root:
+            inner = child()
+
+        spans = read_spans(tracing.TRACING_FILE)
+        assert [item["name"] for item in spans] == ["root", "child"]
+        assert spans[1]["trace_id"] == spans[0]["trace_id"] == root.trace_id
+        assert spans[1]["parent_id"] == root.span_id == spans[0]["span_id"]
+        assert spans[0]["parent_id"] is None
+        assert spans[0]["attributes"] == {"answer": 42}
+        assert inner.name == "child"
+        assert current_span() is None
+
+    def test_error_is_recorded(self, tracing):
+        """例外が発生したスパンはエラーとして記録されることをテスト"""
+        with pytest.raises(ValueError):
+            with span("root"):
+                raise ValueError("失敗")
+
+        [item] = read_spans(tracing.TRACING_FILE)
+        assert item["status"] == "error"
+        assert "失敗" in item["attributes"]["error"]
+
+    def test_disabled_records_nothing(self, settings, tmp_path):
+        """無効な場合はスパンを作成しないことをテスト"""
+        settings.TRACING_ENABLED = False
+        settings.TRACING_FILE = tmp_path / "traces.jsonl"
+
+        with span("root") as root:
+            assert root is None
+        assert not settings.TRACING_FILE.exists()
+
+    def test_otlp_payload(self):
+        """OTLP/JSONの形式に変換されることをテスト"""
+        root = Span("root", attributes={"cards": 3, "hit": True})
+        root.end_ns = root.start_ns + 1000
+
+        payload = OTLPHttpExporter("http://localhost:4318/v1/traces").payload([root])
+
+        [otlp_span] = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert otlp_span["traceId"] == root.trace_id
+        assert otlp_span["endTimeUnixNano"] == str(root.end_ns)
+        assert {"key": "cards", "value": {"intValue": "3"}} in otlp_span["attributes"]
+        assert {"key": "hit", "value": {"boolValue": True}} in otlp_span["attributes"]
+
+
+@pytest.mark.django_db
+class TestTracingMiddleware:
+    """TracingMiddlewareのテストクラス"""
+
+    def test_answer_card_breakdown(self, client, tracing):
+        """回答の処理がスケジューリング・保存・キュー構築とSQLに分かれて記録されることをテスト"""
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        card = Card.objects.create(deck=deck, front="質問", back="答え")
+        client.force_login(user)
+
+        client.post(reverse("study:answer", args=[deck.pk, card.pk]), {"rating": 3})
+
+        spans = read_spans(tracing.TRACING_FILE)
+        names = [item["name"] for item in spans]
+        for name in [
+            "http.request", "study.answer_card", "fsrs.review_card", "fsrs.schedule",
+            "card_state.save", "review_log.save", "study.next_card", "study.queue.build", "db.query",
+        ]:
+            assert name in names
+        root = spans[0]
+        assert root["name"] == "http.request"
+        assert root["attributes"]["http.view"] == "study:answer"
+        by_id = {item["span_id"]: item for item in spans}
+        save = next(item for item in spans if item["name"] == "card_state.save")
+        assert by_id[save["parent_id"]]["name"] == "fsrs.review_card"
+
+        out = StringIO()
+        call_command("trace_summary", name="study.answer_card", stdout=out)
+        summary = out.getvalue()
+        assert "fsrs.schedule" in summary
+        assert "db.query x" in summary
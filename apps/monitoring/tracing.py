@@ -0,0 +1,259 @@
+"""
+軽量なトレーシング（ビュー・サービス・SQLの処理時間を親子関係つきのスパンで記録）
+
+    with span("fsrs.schedule", card_id=card.pk):
+        ...
+
+    @traced("study.answer_card")
+    def answer_card(request, ...):
+        ...
+
+スパンはcontextvarsで親子関係を管理し、ルートのスパンが終わった時点で
+トレース全体をエクスポータに渡す。settings.TRACING_ENABLEDがFalseの場合、
+およびルートのスパンがない場合は何も記録しない。
+"""
+
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from django.conf import settings
+
+from .queries import sql_shape
+
+logger = logging.getLogger("apps.monitoring.tracing")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def _random_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    """1つの処理区間"""
+
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name", "attributes",
+        "start_ns", "end_ns", "status", "_trace_spans",
+    )
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[dict] = None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.span_id = _random_id(64)
+        self.status = "ok"
+        self.end_ns = None
+        if parent is None:
+            self.trace_id = _random_id(128)
+            self.parent_id = None
+            self._trace_spans = []
+        else:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+            self._trace_spans = parent._trace_spans
+        self.start_ns = time.time_ns()
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+def tracing_enabled() -> bool:
+    return getattr(settings, "TRACING_ENABLED", False)
+
+
+def current_span() -> Optional[Span]:
+    """実行中のスパン（ない場合はNone）"""
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    スパンを開始するコンテキスト
+
+    実行中のスパンがあればその子になる。ルートのスパンはトレーシングが
+    有効な場合だけ作成する（無効な場合はNoneを返して何もしない）。
+    """
+    parent = _current_span.get()
+    if parent is None and not tracing_enabled():
+        yield None
+        return
+
+    current = Span(name, parent, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as error:
+        current.status = "error"
+        current.set_attribute("error", f"{type(error).__name__}: {error}")
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        current._trace_spans.append(current)
+        if parent is None:
+            export(current._trace_spans)
+
+
+def traced(name: Optional[str] = None):
+    """関数の実行をスパンとして記録するデコレータ"""
+    def decorator(func):
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None and not tracing_enabled():
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def sql_span_wrapper(execute, sql, params, many, context):
+    """SQLの実行を子スパンとして記録（connection.execute_wrapper用）"""
+    if _current_span.get() is None:
+        return execute(sql, params, many, context)
+    with span("db.query", **{
+        "db.system": context["connection"].vendor,
+        "db.statement": sql_shape(sql)[:500],
+        "db.many": many,
+    }):
+        return execute(sql, params, many, context)
+
+
+# エクスポータ
+
+class JsonLinesExporter:
+    """スパンを1行1件のJSONとしてファイルに追記"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]):
+        lines = "".join(
+            json.dumps(item.to_dict(), ensure_ascii=False, default=str) + "\n"
+            for item in spans
+        )
+        with self._lock:
+            directory = os.path.dirname(os.fspath(self.path))
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(lines)
+
+
+class OTLPHttpExporter:
+    """
+    OTLP/HTTP（JSONエンコード）でコレクタに送信
+
+    OpenTelemetry Collectorなど /v1/traces を受け付けるローカルのコレクタを想定。
+    送信に失敗してもリクエストの処理は止めない。
+    """
+
+    def __init__(self, endpoint: str, service_name: str = "srs-flashcard-app", timeout: float = 1.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def payload(self, spans: List[Span]) -> dict:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "apps.monitoring.tracing"},
+                    "spans": [
+                        {
+                            "traceId": item.trace_id,
+                            "spanId": item.span_id,
+                            "parentSpanId": item.parent_id or "",
+                            "name": item.name,
+                            "kind": 2 if item.parent_id is None else 1,
+                            "startTimeUnixNano": str(item.start_ns),
+                            "endTimeUnixNano": str(item.end_ns),
+                            "attributes": [
+                                _otlp_attribute(key, value) for key, value in item.attributes.items()
+                            ],
+                            "status": {"code": 2 if item.status == "error" else 1},
+                        }
+                        for item in spans
+                    ],
+                }],
+            }],
+        }
+
+    def export(self, spans: List[Span]):
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(self.payload(spans)).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except OSError as error:
+            logger.warning("トレースを送信できませんでした: %s", error)
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+_exporters = {}
+_exporters_lock = threading.Lock()
+
+
+def get_exporter():
+    """設定に対応するエクスポータ（設定ごとに1つ作成して使い回す）"""
+    kind = getattr(settings, "TRACING_EXPORTER", "jsonl")
+    if kind == "otlp":
+        key = (kind, settings.TRACING_OTLP_ENDPOINT)
+        factory = lambda: OTLPHttpExporter(settings.TRACING_OTLP_ENDPOINT)  # noqa: E731
+    else:
+        key = (kind, os.fspath(settings.TRACING_FILE))
+        factory = lambda: JsonLinesExporter(settings.TRACING_FILE)  # noqa: E731
+    with _exporters_lock:
+        exporter = _exporters.get(key)
+        if exporter is None:
+            exporter = _exporters[key] = factory()
+    return exporter
+
+
+def export(spans: List[Span]):
+    """トレースをエクスポータに渡す（開始順に並べる）"""
+    get_exporter().export(sorted(spans, key=lambda item: item.start_ns))
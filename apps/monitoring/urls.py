@@ -0,0 +1,13 @@
+"""
+性能監視のURL設定
+"""
+
+from django.urls import path
+
+from . import views
+
+app_name = "monitoring"
+
+urlpatterns = [
+    path("", views.metrics_view, name="metrics"),
+]
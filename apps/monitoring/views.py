@@ -0,0 +1,38 @@
+"""
+性能監視のビュー
+"""
+
+import hmac
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+
+from .metrics import registry
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def has_metrics_token(request):
+    """AuthorizationヘッダーのBearerトークンがMETRICS_TOKENと一致するか"""
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if not token:
+        return False
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(
+        credentials.strip().encode(), token.encode()
+    )
+
+
+def metrics_view(request):
+    """
+    Prometheus形式のメトリクス
+
+    METRICS_ENABLEDがFalseの場合は404。METRICS_TOKENのBearerトークンか
+    スタッフのログインがなければ403。
+    """
+    if not getattr(settings, "METRICS_ENABLED", False):
+        raise Http404
+    if not (has_metrics_token(request) or request.user.is_staff):
+        raise PermissionDenied
+    return HttpResponse(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
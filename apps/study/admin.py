@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import CardState, ReviewLog
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from apps.decks.models import Deck
+from . import counters, new_cards
+from .models import CardState, DeckUserCounters, FSRSParameters, ReviewLog, StudySession
 
 
 @admin.register(CardState)
@@ -11,6 +16,19 @@ class CardStateAdmin(admin.ModelAdmin):
     search_fields = ("card__front", "card__deck__name")
     readonly_fields = ("created_at", "updated_at")
 
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, CardState.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        """削除したカードが新規カードに戻るよう探索位置とカウンタを直す"""
+        with transaction.atomic():
+            deck_users = set(queryset.values_list("card__deck_id", "user_id"))
+            queryset.delete()
+            new_cards.reset_frontiers(deck_users)
+            users = get_user_model().objects.in_bulk({user_id for _, user_id in deck_users})
+            for deck_id, user_id in deck_users:
+                counters.rebuild_counters(Deck.objects.filter(pk=deck_id), users[user_id])
+
 
 @admin.register(ReviewLog)
 class ReviewLogAdmin(admin.ModelAdmin):
@@ -20,3 +38,30 @@ class ReviewLogAdmin(admin.ModelAdmin):
     list_filter = ("rating", "state", "review_time")
     search_fields = ("card__front", "card__deck__name")
     readonly_fields = ("review_time",)
+
+
+@admin.register(StudySession)
+class StudySessionAdmin(admin.ModelAdmin):
+    """学習セッション管理"""
+
+    list_display = ("deck", "user", "cursor", "reviewed_count", "started_at", "updated_at")
+    search_fields = ("deck__name", "user__username")
+    readonly_fields = ("started_at", "updated_at")
+
+
+@admin.register(DeckUserCounters)
+class DeckUserCountersAdmin(admin.ModelAdmin):
+    """デッキ件数カウンタ管理"""
+
+    list_display = ("deck", "user", "total_count", "new_count", "learning_count", "review_count", "due_count", "due_date")
+    search_fields = ("deck__name", "user__username")
+    readonly_fields = ("updated_at",)
+
+
+@admin.register(FSRSParameters)
+class FSRSParametersAdmin(admin.ModelAdmin):
+    """FSRSパラメータ管理"""
+
+    list_display = ("user", "desired_retention", "review_count", "log_loss", "fit_seconds", "fitted_at")
+    search_fields = ("user__username",)
+    readonly_fields = ("review_count", "log_loss", "fit_seconds", "fitted_at")
@@ -0,0 +1,399 @@
+"""
+学習機能のJSON API（バージョン1）
+
+モバイルクライアント向けに、出題キューの取得・カードの取得・回答・
+復習間隔の取得と、オフライン用の差分同期（sync.py）を提供する。
+認証はセッション（ログイン済みのCookie）を使う。
+
+GETの応答にはETag（とLast-Modified）を付け、If-None-Match / If-Modified-Since
+が一致すれば304を返す。カードの内容は ?fields=id,front のように必要な
+フィールドだけを指定できる（答えを表示するまで back を取得しない、など）。
+"""
+
+import functools
+import hashlib
+import json
+
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_GET, require_POST
+
+from apps.decks.models import Deck
+from apps.cards.models import Card
+from apps.monitoring.tracing import traced
+from .models import CardState, ReviewLog
+from . import sync
+from .services import FSRSService
+from .views import advance_study_session, get_or_start_study_session
+
+API_VERSION = 1
+
+# カードの内容として返せるフィールド（既定はすべて）
+CARD_FIELDS = ("id", "deck", "front", "back", "front_image", "back_image", "updated_at", "state")
+
+QUEUE_PAGE_SIZE = 20
+QUEUE_MAX_PAGE_SIZE = 100
+
+# 1回の同期で送れる復習の件数の上限
+SYNC_PUSH_LIMIT = 500
+
+# 区切りの空白を省き、日本語をエスケープしない
+JSON_DUMPS_PARAMS = {"separators": (",", ":"), "ensure_ascii": False}
+
+
+class APIError(Exception):
+    """APIのエラー応答（ステータスコードとメッセージ）"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def api_response(data, status=200):
+    """コンパクトなJSONの応答"""
+    return JsonResponse(data, status=status, json_dumps_params=JSON_DUMPS_PARAMS)
+
+
+def api_view(func):
+    """
+    APIのビューの共通処理
+
+    未ログインは401、存在しないか他ユーザーのものは404、
+    不正なパラメータは400をJSONで返す（HTMLのページやリダイレクトは返さない）。
+    """
+    @functools.wraps(func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return api_response({"error": "認証が必要です"}, status=401)
+        try:
+            return func(request, *args, **kwargs)
+        except Http404:
+            return api_response({"error": "見つかりません"}, status=404)
+        except APIError as error:
+            return api_response({"error": error.message}, status=error.status)
+
+    return wrapper
+
+
+def parse_fields(request, allowed=CARD_FIELDS):
+    """?fields= で指定されたフィールド（指定がなければすべて）"""
+    value = request.GET.get("fields")
+    if not value:
+        return allowed
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise APIError(f"不明なフィールドです: {', '.join(unknown)}")
+    return fields
+
+
+def parse_int(request, name, default, minimum=0, maximum=None):
+    """クエリパラメータの整数（範囲外は丸める）"""
+    value = request.GET.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise APIError(f"{name}は整数で指定してください")
+    number = max(number, minimum)
+    if maximum is not None:
+        number = min(number, maximum)
+    return number
+
+
+def conditional_response(request, build, etag_parts, last_modified=None):
+    """
+    条件付きGETの処理
+
+    etag_partsから弱いETagを作り、クライアントのキャッシュが有効なら
+    304を返す（応答の本体buildは呼ばない）。
+    """
+    digest = hashlib.sha1(json.dumps(etag_parts, default=str).encode()).hexdigest()[:32]
+    etag = f'W/"{digest}"'
+    # HTTPの日時は秒単位のため、秒未満は切り捨てて比較する
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = build()
+    response["ETag"] = quote_etag(etag)
+    if timestamp is not None:
+        response["Last-Modified"] = http_date(timestamp)
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def card_state_payload(card_state):
+    """カードの学習状態（未学習の場合はNone）"""
+    if card_state is None:
+        return None
+    return {
+        "state": card_state.state,
+        "due": card_state.next_review,
+        "last_review": card_state.last_review,
+        "stability": card_state.stability,
+        "difficulty": card_state.difficulty,
+        "reps": card_state.reps,
+        "lapses": card_state.lapses,
+    }
+
+
+def card_payload(card, fields, card_state=None):
+    """カードの内容（指定したフィールドだけ）"""
+    values = {
+        "id": lambda: card.pk,
+        "deck": lambda: card.deck_id,
+        "front": lambda: card.front,
+        "back": lambda: card.back,
+        "front_image": lambda: card.front_image.url if card.front_image else None,
+        "back_image": lambda: card.back_image.url if card.back_image else None,
+        "updated_at": lambda: card.updated_at,
+        "state": lambda: card_state_payload(card_state),
+    }
+    return {name: values[name]() for name in fields}
+
+
+def deck_payload(deck):
+    """デッキの内容"""
+    return {
+        "id": deck.pk,
+        "name": deck.name,
+        "description": deck.description,
+        "updated_at": deck.updated_at,
+    }
+
+
+def _get_deck(request, deck_pk):
+    return get_object_or_404(Deck, pk=deck_pk, user=request.user)
+
+
+def _get_card(deck, card_pk):
+    return get_object_or_404(Card, pk=card_pk, deck=deck)
+
+
+@require_GET
+@api_view
+@traced("study_api.queue")
+def queue(request, deck_pk):
+    """
+    出題キューの1ページ分のカード
+
+    ?offset= はキュー内の位置（既定は次に出題するカード）、?limit= は件数。
+    カードの学習状態は含めない（?fields=state は指定できない）。
+    """
+    deck = _get_deck(request, deck_pk)
+    fields = parse_fields(request, allowed=tuple(f for f in CARD_FIELDS if f != "state"))
+    session = get_or_start_study_session(deck, request.user)
+    offset = parse_int(request, "offset", session.cursor)
+    limit = parse_int(request, "limit", QUEUE_PAGE_SIZE, minimum=1, maximum=QUEUE_MAX_PAGE_SIZE)
+    card_ids = session.card_ids[offset:offset + limit]
+
+    cards = Card.objects.filter(deck=deck).in_bulk(card_ids)
+    page = [cards[pk] for pk in card_ids if pk in cards]
+    last_modified = max([session.updated_at, *(card.updated_at for card in page)])
+
+    def build():
+        next_offset = offset + limit
+        return api_response({
+            "version": API_VERSION,
+            "deck": deck.pk,
+            "total": session.total_cards,
+            "position": session.position,
+            "offset": offset,
+            "cards": [card_payload(card, fields) for card in page],
+            "next": next_offset if next_offset < session.total_cards else None,
+        })
+
+    return conditional_response(
+        request,
+        build,
+        ["queue", session.pk, session.cursor, offset, limit, fields,
+         [(card.pk, card.updated_at) for card in page]],
+        last_modified,
+    )
+
+
+@require_GET
+@api_view
+@traced("study_api.card")
+def card_detail(request, deck_pk, card_pk):
+    """カードの内容と学習状態"""
+    deck = _get_deck(request, deck_pk)
+    card = _get_card(deck, card_pk)
+    fields = parse_fields(request)
+    card_state = None
+    if "state" in fields:
+        card_state = CardState.objects.filter(card=card, user=request.user).first()
+    updated = [card.updated_at] + ([card_state.updated_at] if card_state else [])
+
+    return conditional_response(
+        request,
+        lambda: api_response({"version": API_VERSION, "card": card_payload(card, fields, card_state)}),
+        ["card", card.pk, fields, updated],
+        max(updated),
+    )
+
+
+@require_GET
+@api_view
+@traced("study_api.intervals")
+def intervals(request, deck_pk, card_pk):
+    """
+    評価ごとの次回復習間隔
+
+    間隔は経過日数によっても変わるため、Last-Modifiedは付けず、
+    学習状態の更新日時と計算結果からETagを作る。
+    """
+    deck = _get_deck(request, deck_pk)
+    card = _get_card(deck, card_pk)
+    card_state = CardState.objects.filter(card=card, user=request.user).first()
+    now = timezone.now()
+    if card_state is None:
+        previews_state = CardState(
+            card=card, user=request.user, state=CardState.State.NEW, due=now, next_review=now
+        )
+    else:
+        previews_state = card_state
+    previews = FSRSService.for_user(request.user).preview_intervals(previews_state, now)
+    payload = {str(rating): label for rating, label in sorted(previews.items())}
+
+    return conditional_response(
+        request,
+        lambda: api_response({"version": API_VERSION, "card": card.pk, "intervals": payload}),
+        ["intervals", card.pk, card_state.updated_at if card_state else None, payload],
+    )
+
+
+@require_POST
+@api_view
+@traced("study_api.answer")
+def answer(request, deck_pk, card_pk):
+    """
+    カードへの回答
+
+    本体はJSON（{"rating": 3, "duration": 4200}）またはフォーム形式。
+    durationは表示から回答までのミリ秒（クライアントで計測する）。
+    """
+    deck = _get_deck(request, deck_pk)
+    card = _get_card(deck, card_pk)
+
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            raise APIError("JSONを解析できません")
+        if not isinstance(data, dict):
+            raise APIError("JSONはオブジェクトで指定してください")
+    else:
+        data = request.POST
+    try:
+        rating = int(data.get("rating"))
+        duration = max(int(data.get("duration") or 0), 0)
+    except (TypeError, ValueError):
+        raise APIError("ratingとdurationは整数で指定してください")
+    if rating not in ReviewLog.Rating.values:
+        raise APIError("ratingは1〜4で指定してください")
+
+    service = FSRSService.for_user(request.user)
+    card_state = service.review_card(card, request.user, rating, duration=duration)
+    session, next_card_id = advance_study_session(deck, request.user, card, card_state)
+
+    return api_response({
+        "version": API_VERSION,
+        "card": {"id": card.pk, "state": card_state_payload(card_state)},
+        "next_card": next_card_id,
+        "next_url": (
+            reverse("study_api:card", args=[deck.pk, next_card_id]) if next_card_id else None
+        ),
+        "position": session.position if next_card_id else session.total_cards,
+        "total": session.total_cards,
+        "finished": next_card_id is None,
+    })
+
+
+@require_GET
+@api_view
+@traced("study_api.sync_pull")
+def sync_pull(request):
+    """
+    同期トークン（?since=）より後の変更
+
+    トークンを指定しない場合は全件を返す（full=True）。moreがTrueの間は
+    返されたトークンで続けて取得する。削除された対象はdeletedにIDだけを返す
+    （デッキの削除はそのカード・学習状態の削除も含む）。
+    """
+    since = request.GET.get("since")
+    if since is not None:
+        since = parse_int(request, "since", 0)
+    changes = sync.pull_changes(request.user, since)
+
+    return api_response({
+        "version": API_VERSION,
+        "token": str(changes.token),
+        "more": changes.more,
+        "full": since is None,
+        "decks": [deck_payload(deck) for deck in changes.decks],
+        "cards": [
+            card_payload(card, [name for name in CARD_FIELDS if name != "state"])
+            for card in changes.cards
+        ],
+        "card_states": [
+            {"card": card_state.card_id, **card_state_payload(card_state)}
+            for card_state in changes.card_states
+        ],
+        "deleted": changes.deleted,
+    })
+
+
+def _parse_pushed_review(item):
+    """送られた復習1件の検証"""
+    if not isinstance(item, dict):
+        raise APIError("reviewsの要素はオブジェクトで指定してください")
+    client_review_id = item.get("client_review_id")
+    if not isinstance(client_review_id, str) or not 0 < len(client_review_id) <= 64:
+        raise APIError("client_review_idは64文字以内の文字列で指定してください")
+    try:
+        card_id = int(item["card_id"])
+        rating = int(item["rating"])
+        duration = max(int(item.get("duration") or 0), 0)
+    except (KeyError, TypeError, ValueError):
+        raise APIError(f"{client_review_id}: card_id・rating・durationは整数で指定してください")
+    if rating not in ReviewLog.Rating.values:
+        raise APIError(f"{client_review_id}: ratingは1〜4で指定してください")
+    reviewed_at = parse_datetime(str(item.get("reviewed_at") or ""))
+    if reviewed_at is None or timezone.is_naive(reviewed_at):
+        raise APIError(f"{client_review_id}: reviewed_atはタイムゾーンつきのISO 8601で指定してください")
+    return sync.PushedReview(client_review_id, card_id, rating, duration, reviewed_at)
+
+
+@require_POST
+@api_view
+@traced("study_api.sync_push")
+def sync_push(request):
+    """
+    オフラインで行った復習の送信
+
+    本体は {"reviews": [{"client_review_id", "card_id", "rating", "duration",
+    "reviewed_at"}, ...]}。1件でも不正な要素があれば何も記録せずに400を返す。
+    結果はclient_review_idごとに applied / duplicate / stale / not_found で返す。
+    更新された学習状態は次の差分取得で受け取る。
+    """
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        raise APIError("JSONを解析できません")
+    reviews = data.get("reviews") if isinstance(data, dict) else None
+    if not isinstance(reviews, list):
+        raise APIError("reviewsは配列で指定してください")
+    if len(reviews) > SYNC_PUSH_LIMIT:
+        raise APIError(f"reviewsは{SYNC_PUSH_LIMIT}件までです", status=413)
+
+    pushed = [_parse_pushed_review(item) for item in reviews]
+    results = sync.push_reviews(FSRSService.for_user(request.user), request.user, pushed)
+    return api_response({"version": API_VERSION, "results": results})
@@ -0,0 +1,18 @@
+"""
+学習機能のJSON API（バージョン1）のURL設定
+"""
+
+from django.urls import path
+
+from . import api
+
+app_name = "study_api"
+
+urlpatterns = [
+    path("<int:deck_pk>/queue/", api.queue, name="queue"),
+    path("<int:deck_pk>/cards/<int:card_pk>/", api.card_detail, name="card"),
+    path("<int:deck_pk>/cards/<int:card_pk>/intervals/", api.intervals, name="intervals"),
+    path("<int:deck_pk>/cards/<int:card_pk>/answer/", api.answer, name="answer"),
+    path("sync/", api.sync_pull, name="sync_pull"),
+    path("sync/reviews/", api.sync_push, name="sync_push"),
+]
@@ -0,0 +1,307 @@
+"""
+本番規模のデータでの性能計測（seed_bench / bench コマンドとマイクロベンチマークから使用）
+
+seed_benchmark_dataは乱数の種を固定して、ユーザー・デッキ・カードと
+FSRSで復習を再現したCardState・ReviewLogを一括で生成する。
+run_benchmarkはテストクライアントで学習の流れを実行し、ビューごとの
+応答時間とクエリ数を集計する。
+measureは関数単位の処理速度（ops/sec）とメモリ割り当て量を計測する。
+"""
+
+import math
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.cards.models import Card
+from apps.decks.models import Deck
+from . import counters
+from .models import CardState, ReviewLog
+from .schedulers import get_scheduler
+from .services import FSRSService
+
+BENCH_PASSWORD = "bench-password"
+
+# 想起できた場合の評価の出現比（Hard, Good, Easy）
+RECALL_RATING_WEIGHTS = (
+    (ReviewLog.Rating.HARD, 0.15),
+    (ReviewLog.Rating.GOOD, 0.7),
+    (ReviewLog.Rating.EASY, 0.15),
+)
+
+
+def bench_username(prefix: str, index: int) -> str:
+    """計測用ユーザーのユーザー名"""
+    return f"{prefix}_{index}"
+
+
+def _simulate_history(service, card_state, rng, start, now):
+    """
+    CardStateに対して期限ごとの復習を再現し、ReviewLogのリストを返す
+
+    評価は復習時点の記憶保持率で想起の成否を決め、期限からの遅れは0〜2日とする。
+    """
+    review_logs = []
+    review_time = start
+    while review_time < now:
+        fsrs_card = service._card_state_to_fsrs_card(card_state)
+        if card_state.last_review is None:
+            recall = 0.8
+        else:
+            recall = service.scheduler.get_card_retrievability(fsrs_card, review_time)
+        if rng.random() < recall:
+            ratings, weights = zip(*RECALL_RATING_WEIGHTS)
+            rating = rng.choices(ratings, weights)[0]
+        else:
+            rating = ReviewLog.Rating.AGAIN
+        review_logs.append(service._apply_review(
+            card_state, rating, rng.randint(2000, 20000), review_time
+        ))
+        review_time = card_state.due + timedelta(seconds=rng.uniform(0, 2 * 86400))
+    return review_logs
+
+
+def seed_benchmark_data(
+    users: int = 10,
+    decks_per_user: int = 5,
+    cards_per_deck: int = 1000,
+    seen_ratio: float = 0.5,
+    history_days: int = 180,
+    seed: int = 0,
+    username_prefix: str = "bench",
+    batch_size: int = 2000
+) -> Dict[str, int]:
+    """
+    計測用データを一括生成
+
+    各ユーザーのカードのうちseen_ratioの割合を、過去history_days日の間のいずれかの
+    時点から学習を始めたものとしてFSRSで復習履歴を再現する。
+    同じ引数なら同じデータになる（作成日時などの時刻を除く）。
+
+    Returns:
+        作成した件数（users / decks / cards / card_states / review_logs）
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    # 再現性のためファジングなしのSchedulerで復習を計算する
+    service = FSRSService(get_scheduler(enable_fuzzing=False))
+    password = make_password(BENCH_PASSWORD)
+    created = defaultdict(int)
+
+    for user_index in range(users):
+        with transaction.atomic():
+            user = User.objects.create(
+                username=bench_username(username_prefix, user_index),
+                password=password,
+            )
+            created["users"] += 1
+            decks = Deck.objects.bulk_create([
+                Deck(user=user, name=f"ベンチマーク{deck_index + 1}")
+                for deck_index in range(decks_per_user)
+            ])
+            created["decks"] += len(decks)
+
+            for deck in decks:
+                cards = Card.objects.bulk_create(
+                    [
+                        Card(deck=deck, front=f"質問{index + 1}", back=f"答え{index + 1}")
+                        for index in range(cards_per_deck)
+                    ],
+                    batch_size=batch_size,
+                )
+                created["cards"] += len(cards)
+
+                card_states = []
+                review_logs = []
+                for card in cards:
+                    if rng.random() >= seen_ratio:
+                        continue
+                    start = now - timedelta(seconds=rng.uniform(0, history_days * 86400))
+                    card_state = CardState(card_id=card.pk, user_id=user.pk)
+                    review_logs.extend(_simulate_history(service, card_state, rng, start, now))
+                    card_states.append(card_state)
+
+                CardState.objects.bulk_create(card_states, batch_size=batch_size)
+                ReviewLog.objects.bulk_create(review_logs, batch_size=batch_size)
+                created["card_states"] += len(card_states)
+                created["review_logs"] += len(review_logs)
+
+            counters.rebuild_counters(decks, user)
+
+    return dict(created)
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """最近傍法によるパーセンタイル（値がない場合はNone）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(math.ceil(fraction * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+class BenchmarkRecorder:
+    """ビューごとの応答時間（ミリ秒）とクエリ数を記録"""
+
+    def __init__(self, client: Client):
+        self.client = client
+        self.timings = defaultdict(list)
+        self.queries = defaultdict(list)
+
+    def request(self, name: str, method: str, url: str, data=None):
+        """リクエストを実行して計測（ステータスが2xx/3xx以外は例外）"""
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = getattr(self.client, method)(url, data)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError(f"{name}: {method.upper()} {url} -> {response.status_code}")
+        self.timings[name].append(elapsed * 1000)
+        self.queries[name].append(len(context.captured_queries))
+        return response
+
+    def report(self) -> dict:
+        """ビューごとの集計結果"""
+        return {
+            name: {
+                "count": len(timings),
+                "p50_ms": round(percentile(timings, 0.5), 3),
+                "p95_ms": round(percentile(timings, 0.95), 3),
+                "mean_ms": round(sum(timings) / len(timings), 3),
+                "queries_p50": percentile(self.queries[name], 0.5),
+                "queries_max": max(self.queries[name]),
+            }
+            for name, timings in sorted(self.timings.items())
+        }
+
+
+def run_benchmark(
+    user: User,
+    deck: Optional[Deck] = None,
+    iterations: int = 20,
+    answers: int = 10,
+    seed: int = 0,
+    host: str = "localhost"
+) -> dict:
+    """
+    学習の流れをテストクライアントで実行して計測
+
+    1回の繰り返しでデッキ一覧・デッキ詳細を表示し、学習セッションを開始して
+    answers枚のカードを表示・回答した後、学習完了画面を表示する。
+    データを変更するため、呼び出し側でトランザクションをロールバックすること。
+    """
+    rng = random.Random(seed)
+    if deck is None:
+        deck = Deck.objects.filter(user=user).order_by("pk").first()
+    client = Client(HTTP_HOST=host)
+    client.force_login(user)
+    recorder = BenchmarkRecorder(client)
+
+    for _ in range(iterations):
+        recorder.request("deck_list", "get", reverse("decks:deck_list"))
+        recorder.request("deck_detail", "get", reverse("decks:deck_detail", args=[deck.pk]))
+
+        response = recorder.request("study_session", "get", reverse("study:session", args=[deck.pk]))
+        next_url = response.get("Location")
+        for _ in range(answers):
+            if not next_url or "/card/" not in next_url:
+                break
+            recorder.request("study_card", "get", next_url)
+            rating = rng.choice(ReviewLog.Rating.values)
+            answer_url = next_url.replace("/card/", "/answer/")
+            response = recorder.request("answer_card", "post", answer_url, {"rating": rating})
+            next_url = response.get("Location")
+
+        recorder.request("study_complete", "get", reverse("study:complete", args=[deck.pk]))
+
+    return {
+        "user": user.username,
+        "deck_id": deck.pk,
+        "card_count": deck.cards.count(),
+        "card_state_count": CardState.objects.filter(user=user).count(),
+        "review_log_count": ReviewLog.objects.filter(user=user).count(),
+        "iterations": iterations,
+        "answers": answers,
+        "database": connection.vendor,
+        "views": recorder.report(),
+    }
+
+
+def measure(func: Callable[[], object], min_seconds: float = 0.5, min_rounds: int = 3) -> dict:
+    """
+    関数を繰り返し実行して処理速度とメモリ割り当て量を計測
+
+    1回の準備実行の後、min_seconds以上かつmin_rounds回以上実行した平均から
+    ops/secを求める。メモリは別に1回だけtracemalloc下で実行し、
+    実行中のピーク増分と割り当てブロック数を記録する（tracemallocは遅いため
+    速度の計測とは分ける）。
+
+    Returns:
+        ops_per_sec, rounds, peak_kib, allocations を含む辞書
+    """
+    func()
+
+    rounds = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    while rounds < min_rounds or elapsed < min_seconds:
+        func()
+        rounds += 1
+        elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        snapshot_before = tracemalloc.take_snapshot()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot_after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    allocations = sum(
+        max(stat.count_diff, 0)
+        for stat in snapshot_after.compare_to(snapshot_before, "lineno")
+    )
+
+    return {
+        "ops_per_sec": round(rounds / elapsed, 2),
+        "rounds": rounds,
+        "peak_kib": round((peak - before) / 1024, 1),
+        "allocations": allocations,
+    }
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    計測結果を基準値と比較し、劣化した項目の説明を返す
+
+    ops/secが基準値の(1 - tolerance)倍を下回るか、ピークメモリが
+    (1 + tolerance)倍を超えた場合を劣化とする。基準値のない項目は比較しない。
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result["ops_per_sec"] < expected["ops_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {result['ops_per_sec']} ops/sec（基準値 {expected['ops_per_sec']}）"
+            )
+        # 数KiB程度の差は計測誤差として扱う
+        if result["peak_kib"] > max(expected["peak_kib"] * (1 + tolerance), expected["peak_kib"] + 64):
+            regressions.append(
+                f"{name}: ピーク {result['peak_kib']} KiB（基準値 {expected['peak_kib']} KiB）"
+            )
+    return regressions
@@ -0,0 +1,298 @@
+"""
+デッキ件数カウンタ（DeckUserCounters）の更新・再集計
+
+更新系の関数はいずれも対象の変更をDBへ反映した後、同じトランザクション内で
+呼び出すこと。カウンタ行がまだ存在しない場合は差分を適用せず、その時点の
+状態から集計して作成する（変更は集計結果に含まれているため二重計上しない）。
+復習待ちの日付はカウンタのユーザーのタイムゾーン（quota.timezone_for）で数える。
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.decks.models import Deck
+from apps.cards.models import Card
+from . import quota
+from .models import CardState, DeckUserCounters
+
+# タイムゾーンのUTCからの最大のずれ（Pacific/Kiritimati）
+LATEST_UTC_OFFSET = timedelta(hours=14)
+
+
+def compute_counters(decks, user, today=None):
+    """
+    デッキごとのカウンタ値をCardStateから集計
+
+    Returns:
+        {deck_id: {フィールド名: 値}} の辞書
+    """
+    tz = quota.timezone_for(user)
+    if today is None:
+        today = timezone.localdate(timezone=tz)
+    deck_ids = [deck.pk for deck in decks]
+
+    values = {
+        deck_id: {
+            "total_count": 0,
+            "new_count": 0,
+            "learning_count": 0,
+            "review_count": 0,
+            "due_count": 0,
+            "due_date": today,
+            "due_buckets": {},
+        }
+        for deck_id in deck_ids
+    }
+
+    totals = (
+        Card.objects.filter(deck_id__in=deck_ids)
+        .values_list("deck_id")
+        .annotate(count=Count("pk"))
+        .order_by()
+    )
+    for deck_id, count in totals:
+        values[deck_id]["total_count"] = count
+
+    states = CardState.objects.filter(user=user, card__deck_id__in=deck_ids)
+    by_state = (
+        states.values_list("card__deck_id", "state")
+        .annotate(count=Count("pk"))
+        .order_by()
+    )
+    studied = defaultdict(int)
+    for deck_id, state, count in by_state:
+        field = DeckUserCounters.state_field(state)
+        if field != "new_count":
+            values[deck_id][field] += count
+            studied[deck_id] += count
+
+    by_day = (
+        states.exclude(state=CardState.State.NEW)
+        .annotate(day=TruncDate("next_review", tzinfo=tz))
+        .values_list("card__deck_id", "day")
+        .annotate(count=Count("pk"))
+        .order_by()
+    )
+    for deck_id, day, count in by_day:
+        if day <= today:
+            values[deck_id]["due_count"] += count
+        else:
+            values[deck_id]["due_buckets"][day.isoformat()] = count
+
+    for deck_id in deck_ids:
+        values[deck_id]["new_count"] = values[deck_id]["total_count"] - studied[deck_id]
+
+    return values
+
+
+def rebuild_counters(decks, user, today=None):
+    """デッキのカウンタを集計し直して保存（既存の行は上書き）"""
+    decks = list(decks)
+    if not decks:
+        return []
+    values = compute_counters(decks, user, today)
+    counters = [
+        DeckUserCounters(deck=deck, user=user, **values[deck.pk])
+        for deck in decks
+    ]
+    return DeckUserCounters.objects.bulk_create(
+        counters,
+        update_conflicts=True,
+        unique_fields=["deck", "user"],
+        update_fields=list(DeckUserCounters.COUNT_FIELDS),
+    )
+
+
+def find_counter_mismatches(decks, user, today=None):
+    """
+    保存済みカウンタと再集計結果の食い違いを検出
+
+    Returns:
+        (deck_id, フィールド名, 保存値, 正しい値) のリスト
+    """
+    if today is None:
+        today = timezone.localdate(timezone=quota.timezone_for(user))
+    decks = list(decks)
+    expected = compute_counters(decks, user, today)
+    stored = {
+        counters.deck_id: counters
+        for counters in DeckUserCounters.objects.filter(user=user, deck__in=decks)
+    }
+
+    mismatches = []
+    for deck in decks:
+        counters = stored.get(deck.pk)
+        if counters is None:
+            mismatches.append((deck.pk, "*", None, expected[deck.pk]))
+            continue
+        counters.roll_over(today)
+        for field, value in expected[deck.pk].items():
+            if getattr(counters, field) != value:
+                mismatches.append((deck.pk, field, getattr(counters, field), value))
+    return mismatches
+
+
+def _update_counters(deck_id, user, apply):
+    """
+    カウンタ行をロックしてapplyで差分を適用（行がなければ集計して作成）
+
+    applyにはカウンタとユーザーのタイムゾーンを渡す。
+    """
+    tz = quota.timezone_for(user)
+    with transaction.atomic():
+        counters = (
+            DeckUserCounters.objects.select_for_update()
+            .filter(deck_id=deck_id, user=user)
+            .first()
+        )
+        if counters is None:
+            rebuild_counters(Deck.objects.filter(pk=deck_id), user)
+            return
+        counters.roll_over(timezone.localdate(timezone=tz))
+        apply(counters, tz)
+        counters.save(update_fields=[*DeckUserCounters.COUNT_FIELDS, "updated_at"])
+
+
+def record_card_added(card, user=None):
+    """カード追加をカウンタに反映（既定はデッキ所有者）"""
+    def apply(counters, tz):
+        counters.total_count += 1
+        counters.new_count += 1
+
+    _update_counters(card.deck_id, user or card.deck.user, apply)
+
+
+def record_card_removed(card, card_state=None, user=None):
+    """カード削除をカウンタに反映（card_stateは削除前の学習状態）"""
+    state = card_state.state if card_state else None
+
+    def apply(counters, tz):
+        counters.total_count -= 1
+        field = DeckUserCounters.state_field(state)
+        setattr(counters, field, getattr(counters, field) - 1)
+        if DeckUserCounters.counts_as_due(state):
+            counters.add_due(card_state.next_review, -1, tz)
+
+    _update_counters(card.deck_id, user or card.deck.user, apply)
+
+
+def record_review(card, user, old_state, old_next_review, card_state):
+    """
+    復習による状態・期限の変化をカウンタに反映
+
+    Args:
+        card: 復習したカード
+        user: 学習したユーザー
+        old_state: 復習前の状態（CardStateがなかった場合はNone）
+        old_next_review: 復習前の次回復習日時
+        card_state: 復習後のCardState
+    """
+    def apply(counters, tz):
+        apply_review(counters, old_state, old_next_review, card_state, tz)
+
+    _update_counters(card.deck_id, user, apply)
+
+
+def record_reviews(user, changes):
+    """
+    複数カードの復習結果をデッキごとにまとめてカウンタに反映
+
+    Args:
+        user: 学習したユーザー
+        changes: (card, 復習前の状態, 復習前の次回復習日時, 復習後のCardState) の列
+    """
+    by_deck = defaultdict(list)
+    for card, old_state, old_next_review, card_state in changes:
+        by_deck[card.deck_id].append((old_state, old_next_review, card_state))
+
+    for deck_id, deck_changes in by_deck.items():
+        def apply(counters, tz, deck_changes=deck_changes):
+            for old_state, old_next_review, card_state in deck_changes:
+                apply_review(counters, old_state, old_next_review, card_state, tz)
+
+        _update_counters(deck_id, user, apply)
+
+
+def apply_review(counters, old_state, old_next_review, card_state, tz=None):
+    """1件の復習による差分をカウンタオブジェクトに適用（保存はしない、日付はtzで数える）"""
+    old_field = DeckUserCounters.state_field(old_state)
+    new_field = DeckUserCounters.state_field(card_state.state)
+    if old_field != new_field:
+        setattr(counters, old_field, getattr(counters, old_field) - 1)
+        setattr(counters, new_field, getattr(counters, new_field) + 1)
+    if DeckUserCounters.counts_as_due(old_state):
+        counters.add_due(old_next_review, -1, tz)
+    if DeckUserCounters.counts_as_due(card_state.state):
+        counters.add_due(card_state.next_review, 1, tz)
+
+
+def attach_deck_counters(decks, user, today=None):
+    """
+    デッキにカウンタの値（num_cards / num_new_cards / num_due_cards）を付与
+
+    カウンタ行のないデッキはまとめて集計して作成する。
+    Deckの件数プロパティはこの値を優先して返す。
+    """
+    if today is None:
+        today = timezone.localdate(timezone=quota.timezone_for(user))
+    decks = list(decks)
+    if not decks:
+        return decks
+
+    counters_by_deck = {
+        counters.deck_id: counters
+        for counters in DeckUserCounters.objects.filter(
+            user=user, deck__in=decks
+        ).defer("due_buckets")
+    }
+    missing = [deck for deck in decks if deck.pk not in counters_by_deck]
+    if missing:
+        for counters in rebuild_counters(missing, user, today):
+            counters_by_deck[counters.deck_id] = counters
+
+    for deck in decks:
+        counters = counters_by_deck[deck.pk]
+        deck.num_cards = counters.total_count
+        deck.num_new_cards = counters.new_count
+        deck.num_due_cards = counters.due_count_on(today)
+    return decks
+
+
+def roll_over_all_counters(today=None, batch_size=500):
+    """
+    集計日の古いカウンタを各ユーザーの今日へ繰り越す（定期実行用）
+
+    todayを指定した場合はすべてのカウンタをその日付へ繰り越す。
+    """
+    # 最も進んだタイムゾーン（UTC+14）の日付より前の行だけが候補になる
+    latest = today or (timezone.now() + LATEST_UTC_OFFSET).date()
+    stale = (
+        DeckUserCounters.objects.filter(due_date__lt=latest)
+        .select_related("user__profile")
+        .order_by("pk")
+    )
+    updated = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                stale.select_for_update(of=("self",)).filter(pk__gt=last_pk)[:batch_size]
+            )
+            if not batch:
+                return updated
+            rolled = [
+                counters for counters in batch
+                if counters.roll_over(
+                    today or timezone.localdate(timezone=quota.timezone_for(counters.user))
+                )
+            ]
+            DeckUserCounters.objects.bulk_update(
+                rolled, ["due_count", "due_date", "due_buckets"]
+            )
+        updated += len(rolled)
+        last_pk = batch[-1].pk
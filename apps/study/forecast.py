@@ -0,0 +1,145 @@
+"""
+コレクション全体の記憶保持率・復習量の予測（NumPyによるベクトル演算）
+
+fsrs.Cardをカードごとに生成せず、CardStateの列を配列として読み込んで
+fsrsライブラリと同じ式で一括計算する。
+"""
+
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+from django.utils import timezone
+from fsrs import Scheduler
+
+from .models import CardState
+from .schedulers import get_scheduler
+
+SECONDS_PER_DAY = 86400.0
+
+
+def _to_timestamp(value: Optional[datetime]) -> float:
+    """datetimeをUNIX秒に変換（Noneは欠損値）"""
+    return value.timestamp() if value is not None else np.nan
+
+
+class CollectionForecast:
+    """複数カードのFSRS状態を配列で保持し、保持率や復習量をまとめて計算"""
+
+    def __init__(
+        self,
+        stability: np.ndarray,
+        difficulty: np.ndarray,
+        last_review: np.ndarray,
+        due: np.ndarray,
+        scheduler: Optional[Scheduler] = None
+    ):
+        """
+        Args:
+            stability: 安定性（日）
+            difficulty: 難易度
+            last_review: 最終復習日時のUNIX秒（未復習はNaN）
+            due: 次回復習日時のUNIX秒
+            scheduler: パラメータを取得するScheduler（省略時はデフォルト）
+        """
+        self.stability = np.asarray(stability, dtype=np.float64)
+        self.difficulty = np.asarray(difficulty, dtype=np.float64)
+        self.last_review = np.asarray(last_review, dtype=np.float64)
+        self.due = np.asarray(due, dtype=np.float64)
+
+        scheduler = scheduler or get_scheduler()
+        # fsrsライブラリと同じ定数（Scheduler.__init__を参照）
+        self.decay = -scheduler.parameters[20]
+        self.factor = 0.9 ** (1 / self.decay) - 1
+        self.desired_retention = scheduler.desired_retention
+        self.maximum_interval = scheduler.maximum_interval
+
+    def __len__(self):
+        return len(self.stability)
+
+    @classmethod
+    def for_user(cls, user, deck=None, scheduler: Optional[Scheduler] = None) -> "CollectionForecast":
+        """ユーザー（とデッキ）のCardStateを配列として読み込む"""
+        card_states = CardState.objects.filter(user=user)
+        if deck is not None:
+            card_states = card_states.filter(card__deck=deck)
+        rows = card_states.values_list("stability", "difficulty", "last_review", "due")
+
+        stability, difficulty, last_review, due = [], [], [], []
+        for row_stability, row_difficulty, row_last_review, row_due in rows.iterator(chunk_size=10000):
+            stability.append(row_stability)
+            difficulty.append(row_difficulty)
+            last_review.append(_to_timestamp(row_last_review))
+            due.append(_to_timestamp(row_due))
+
+        return cls(stability, difficulty, last_review, due, scheduler=scheduler)
+
+    @property
+    def studied(self) -> np.ndarray:
+        """復習済み（保持率を計算できる）カードのマスク"""
+        return ~np.isnan(self.last_review) & (self.stability > 0)
+
+    def retrievability(self, now: Optional[datetime] = None) -> np.ndarray:
+        """
+        現在の記憶保持率 R = (1 + FACTOR * t / S) ** DECAY
+
+        fsrsのget_card_retrievabilityと同様に経過日数tは切り捨ての整数日とし、
+        未復習のカードは0とする。
+        """
+        if now is None:
+            now = timezone.now()
+        studied = self.studied
+        elapsed = np.floor((now.timestamp() - self.last_review[studied]) / SECONDS_PER_DAY)
+        elapsed = np.maximum(elapsed, 0)
+
+        result = np.zeros(len(self), dtype=np.float64)
+        result[studied] = (1 + self.factor * elapsed / self.stability[studied]) ** self.decay
+        return result
+
+    def expected_recall(self, now: Optional[datetime] = None) -> float:
+        """復習済みカードのうち、今テストした場合に想起できる期待枚数の割合"""
+        studied = self.studied
+        if not studied.any():
+            return 0.0
+        return float(self.retrievability(now)[studied].mean())
+
+    def next_intervals(self) -> np.ndarray:
+        """現在の安定性から求めた次回復習間隔（日、fsrsの_next_intervalと同じ丸め）"""
+        intervals = (self.stability / self.factor) * (
+            self.desired_retention ** (1 / self.decay) - 1
+        )
+        intervals = np.round(intervals)
+        return np.clip(intervals, 1, self.maximum_interval)
+
+    def expected_reviews_per_day(self) -> float:
+        """各カードを現在の間隔で復習し続けた場合の1日あたりの平均復習数"""
+        studied = self.studied
+        if not studied.any():
+            return 0.0
+        return float((1 / self.next_intervals()[studied]).sum())
+
+    def due_per_day(self, days: int = 30, now: Optional[datetime] = None) -> np.ndarray:
+        """
+        今後days日間の日ごとの復習予定数
+
+        0日目には期限切れのカードも含める。日の区切りは現在のタイムゾーンの0時。
+        """
+        if now is None:
+            now = timezone.now()
+        day_start = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+        offsets = np.floor((self.due - day_start.timestamp()) / SECONDS_PER_DAY)
+        offsets = offsets[~np.isnan(offsets) & (offsets < days)]
+        offsets = np.maximum(offsets, 0).astype(np.int64)
+        return np.bincount(offsets, minlength=days)
+
+    def summary(self, days: int = 30, now: Optional[datetime] = None) -> dict:
+        """ダッシュボード表示用の集計値"""
+        if now is None:
+            now = timezone.now()
+        return {
+            "card_count": len(self),
+            "studied_count": int(self.studied.sum()),
+            "expected_recall": self.expected_recall(now),
+            "expected_reviews_per_day": self.expected_reviews_per_day(),
+            "due_per_day": self.due_per_day(days, now).tolist(),
+        }
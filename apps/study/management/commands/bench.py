@@ -0,0 +1,90 @@
+"""
+学習の流れを実行してビューごとの応答時間とクエリ数を計測するコマンド
+
+    python manage.py seed_bench
+    python manage.py bench --iterations 20 --output bench.json
+
+テストクライアントで study_session / study_card / answer_card / DeckListView /
+deck_detail_view / study_complete を呼び出し、p50・p95の応答時間とクエリ数を
+JSONで出力する。回答による変更は最後にロールバックするため、繰り返し実行しても
+同じデータで比較できる。
+"""
+
+import json
+import subprocess
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.decks.models import Deck
+from apps.study.bench import bench_username, run_benchmark
+
+
+class Command(BaseCommand):
+    help = "テストクライアントで学習画面を呼び出し、応答時間とクエリ数をJSONで出力します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            help="計測するユーザー名（既定は seed_bench で作成した最初のユーザー）",
+        )
+        parser.add_argument("--deck", type=int, help="計測するデッキID（既定はユーザーの最初のデッキ）")
+        parser.add_argument("--iterations", type=int, default=20, help="繰り返し回数")
+        parser.add_argument("--answers", type=int, default=10, help="1回の学習で回答するカード数")
+        parser.add_argument("--seed", type=int, default=0, help="評価を選ぶ乱数の種")
+        parser.add_argument("--output", help="結果を書き出すファイル（省略時は標準出力）")
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="回答による変更をロールバックせずに残す",
+        )
+
+    def handle(self, *args, **options):
+        username = options["user"] or bench_username("bench", 0)
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            raise CommandError(f"ユーザー「{username}」が存在しません。先に seed_bench を実行してください。")
+
+        deck = None
+        if options["deck"]:
+            deck = Deck.objects.filter(pk=options["deck"], user=user).first()
+            if deck is None:
+                raise CommandError(f"ユーザー「{username}」のデッキ{options['deck']}が存在しません。")
+        elif not Deck.objects.filter(user=user).exists():
+            raise CommandError(f"ユーザー「{username}」にデッキがありません。")
+
+        with transaction.atomic():
+            result = run_benchmark(
+                user,
+                deck=deck,
+                iterations=options["iterations"],
+                answers=options["answers"],
+                seed=options["seed"],
+                host=settings.ALLOWED_HOSTS[0],
+            )
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+        result["commit"] = self._git_commit()
+        output = json.dumps(result, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                file.write(output + "\n")
+            self.stdout.write(self.style.SUCCESS(f"結果を {options['output']} に書き出しました。"))
+        else:
+            self.stdout.write(output)
+
+    def _git_commit(self):
+        """比較用に現在のコミットを記録（gitがない環境ではNone）"""
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
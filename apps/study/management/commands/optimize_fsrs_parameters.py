@@ -0,0 +1,118 @@
+"""
+ユーザーごとのFSRSパラメータを最適化するコマンド（夜間バッチ用）
+
+    python manage.py optimize_fsrs_parameters --workers 8
+
+ユーザー単位でProcessPoolExecutorに投入し、各ワーカーが復習履歴を分割して読み込む。
+投入中のユーザー数は --max-pending で制限するため、ユーザー数が多くてもメモリは一定。
+"""
+
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from apps.study.models import ReviewLog
+from apps.study.optimizer import (
+    fit_user_in_worker,
+    init_worker,
+    optimizer_available,
+    save_fit_result,
+)
+
+
+class Command(BaseCommand):
+    help = "復習履歴からユーザーごとのFSRSパラメータを最適化して保存します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="ワーカープロセス数（0の場合は現在のプロセスで順に実行）",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="復習履歴を1回に読み込む件数",
+        )
+        parser.add_argument(
+            "--min-reviews",
+            type=int,
+            default=100,
+            help="最適化に必要な最小の復習履歴数",
+        )
+        parser.add_argument(
+            "--max-pending",
+            type=int,
+            default=None,
+            help="同時に投入するユーザー数の上限（既定はワーカー数の4倍）",
+        )
+        parser.add_argument(
+            "--user-id",
+            type=int,
+            action="append",
+            dest="user_ids",
+            help="対象ユーザーID（複数指定可、省略時は復習履歴のある全ユーザー）",
+        )
+
+    def handle(self, *args, **options):
+        if not optimizer_available():
+            raise CommandError(
+                'fsrsのOptimizerが利用できません。pip install "fsrs[optimizer]" を実行してください。'
+            )
+
+        user_ids = options["user_ids"] or self._user_ids_with_reviews()
+        started = time.perf_counter()
+
+        if options["workers"] == 0:
+            results = (
+                fit_user_in_worker(user_id, options["chunk_size"], options["min_reviews"])
+                for user_id in user_ids
+            )
+        else:
+            results = self._run_parallel(user_ids, options)
+
+        summary = {"fitted": 0, "skipped": 0, "error": 0}
+        for result in results:
+            save_fit_result(result)
+            summary[result["status"]] += 1
+            # 1ユーザー1行のJSONで結果を出力
+            self.stdout.write(json.dumps(result, ensure_ascii=False, default=str))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"完了: 最適化{summary['fitted']}人 / スキップ{summary['skipped']}人 / "
+            f"エラー{summary['error']}人 ({elapsed:.1f}秒)"
+        ))
+
+    def _user_ids_with_reviews(self):
+        """復習履歴のあるユーザーIDの一覧"""
+        return list(
+            ReviewLog.objects.order_by("user_id")
+            .values_list("user_id", flat=True)
+            .distinct()
+        )
+
+    def _run_parallel(self, user_ids, options):
+        """ワーカープロセスで最適化し、終わった順に結果を返す"""
+        max_pending = options["max_pending"] or options["workers"] * 4
+        # fork時に親のDB接続を子へ引き継がないよう閉じておく
+        connections.close_all()
+
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=init_worker) as executor:
+            pending = set()
+            for user_id in user_ids:
+                pending.add(executor.submit(
+                    fit_user_in_worker, user_id, options["chunk_size"], options["min_reviews"]
+                ))
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            for future in pending:
+                yield future.result()
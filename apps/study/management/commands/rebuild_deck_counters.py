@@ -0,0 +1,73 @@
+"""
+デッキ件数カウンタを再集計するコマンド
+
+    python manage.py rebuild_deck_counters            # 全デッキを再集計
+    python manage.py rebuild_deck_counters --check    # 食い違いの検出のみ
+"""
+
+from itertools import groupby
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.decks.models import Deck
+from apps.study.counters import find_counter_mismatches, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "デッキ件数カウンタ（DeckUserCounters）をCardStateから再集計します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="再集計せず、保存済みカウンタとの食い違いだけを報告する",
+        )
+        parser.add_argument(
+            "--user",
+            help="対象ユーザー名（省略時は全ユーザー）",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="1回に処理するデッキ数",
+        )
+
+    def handle(self, *args, **options):
+        decks = Deck.objects.select_related("user")
+        if options["user"]:
+            decks = decks.filter(user__username=options["user"])
+
+        processed = 0
+        mismatches = []
+        for batch in self._batches(decks, options["batch_size"]):
+            # カウンタはデッキ所有者ごとに集計する
+            for user, user_decks in groupby(batch, key=lambda deck: deck.user):
+                user_decks = list(user_decks)
+                if options["check"]:
+                    mismatches.extend(find_counter_mismatches(user_decks, user))
+                else:
+                    rebuild_counters(user_decks, user)
+                processed += len(user_decks)
+
+        if not options["check"]:
+            self.stdout.write(self.style.SUCCESS(f"{processed}件のデッキを再集計しました。"))
+            return
+
+        for deck_id, field, stored, expected in mismatches:
+            self.stdout.write(f"deck={deck_id} {field}: 保存値={stored} 正しい値={expected}")
+        if mismatches:
+            raise CommandError(f"{len(mismatches)}件の食い違いがあります。")
+        self.stdout.write(self.style.SUCCESS(f"{processed}件のデッキに食い違いはありません。"))
+
+    def _batches(self, decks, batch_size):
+        """デッキをbatch_size件ずつ取得"""
+        last_pk = 0
+        decks = decks.order_by("pk")
+        while True:
+            batch = list(decks.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return
+            last_pk = batch[-1].pk
+            batch.sort(key=lambda deck: deck.user_id)
+            yield batch
@@ -0,0 +1,26 @@
+"""
+デッキ件数カウンタの復習待ち件数を各ユーザーの当日へ繰り越すコマンド
+
+日付はユーザーのタイムゾーンごとに変わるため、cron等で1時間ごとに実行する。
+未実行でも表示は正しいが、日付別バケットが溜まり続けるのを防ぐ。
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.study.counters import roll_over_all_counters
+
+
+class Command(BaseCommand):
+    help = "デッキ件数カウンタの復習待ち件数を当日分まで繰り越します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="1回に更新するカウンタ数",
+        )
+
+    def handle(self, *args, **options):
+        updated = roll_over_all_counters(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{updated}件のカウンタを繰り越しました。"))
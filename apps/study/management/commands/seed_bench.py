@@ -0,0 +1,61 @@
+"""
+性能計測用のデータを一括生成するコマンド
+
+    python manage.py seed_bench --users 10 --decks-per-user 5 --cards-per-deck 1000
+
+ユーザー名は「<prefix>_<番号>」、パスワードは共通（apps.study.bench.BENCH_PASSWORD）。
+"""
+
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.study.bench import bench_username, seed_benchmark_data
+
+
+class Command(BaseCommand):
+    help = "性能計測用のユーザー・デッキ・カード・学習状態・復習履歴を生成します"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10, help="ユーザー数")
+        parser.add_argument("--decks-per-user", type=int, default=5, help="ユーザーごとのデッキ数")
+        parser.add_argument("--cards-per-deck", type=int, default=1000, help="デッキごとのカード数")
+        parser.add_argument(
+            "--seen-ratio",
+            type=float,
+            default=0.5,
+            help="学習済み（CardStateあり）にするカードの割合",
+        )
+        parser.add_argument(
+            "--history-days",
+            type=int,
+            default=180,
+            help="復習履歴を再現する期間（日）",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="乱数の種")
+        parser.add_argument("--prefix", default="bench", help="ユーザー名の接頭辞")
+        parser.add_argument("--batch-size", type=int, default=2000, help="bulk_createの件数")
+
+    def handle(self, *args, **options):
+        if not 0 <= options["seen_ratio"] <= 1:
+            raise CommandError("--seen-ratio は0以上1以下で指定してください。")
+        if User.objects.filter(username=bench_username(options["prefix"], 0)).exists():
+            raise CommandError(
+                f"接頭辞「{options['prefix']}」のユーザーは既に存在します。--prefix を変えてください。"
+            )
+
+        started = time.perf_counter()
+        created = seed_benchmark_data(
+            users=options["users"],
+            decks_per_user=options["decks_per_user"],
+            cards_per_deck=options["cards_per_deck"],
+            seen_ratio=options["seen_ratio"],
+            history_days=options["history_days"],
+            seed=options["seed"],
+            username_prefix=options["prefix"],
+            batch_size=options["batch_size"],
+        )
+        created["seconds"] = round(time.perf_counter() - started, 3)
+        self.stdout.write(json.dumps(created, ensure_ascii=False))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('decks', '0001_initial'),
+        ('study', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudySession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('card_ids', models.JSONField(default=list, verbose_name='出題キュー')),
+                ('cursor', models.PositiveIntegerField(default=0, verbose_name='現在位置')),
+                ('reviewed_count', models.PositiveIntegerField(default=0, verbose_name='回答数')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='開始日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('deck', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='study_sessions', to='decks.deck', verbose_name='デッキ')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='study_sessions', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '学習セッション',
+                'verbose_name_plural': '学習セッション',
+                'constraints': [models.UniqueConstraint(fields=('user', 'deck'), name='unique_study_session_per_deck')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0001_initial'),
+        ('study', '0002_study_session'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cardstate',
+            index=models.Index(fields=['user', 'next_review', 'card'], name='cardstate_user_next_review'),
+        ),
+        migrations.AddIndex(
+            model_name='cardstate',
+            index=models.Index(fields=['user', 'card', 'next_review'], name='cardstate_user_card'),
+        ),
+        migrations.AddIndex(
+            model_name='reviewlog',
+            index=models.Index(fields=['user', 'review_time'], name='reviewlog_user_review_time'),
+        ),
+    ]
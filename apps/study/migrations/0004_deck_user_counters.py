@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('decks', '0001_initial'),
+        ('study', '0003_scheduling_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeckUserCounters',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_count', models.IntegerField(default=0, verbose_name='総カード数')),
+                ('new_count', models.IntegerField(default=0, verbose_name='新規カード数')),
+                ('learning_count', models.IntegerField(default=0, verbose_name='学習中カード数')),
+                ('review_count', models.IntegerField(default=0, verbose_name='復習カード数')),
+                ('due_count', models.IntegerField(default=0, verbose_name='復習待ちカード数')),
+                ('due_date', models.DateField(default=django.utils.timezone.localdate, verbose_name='復習待ち集計日')),
+                ('due_buckets', models.JSONField(default=dict, verbose_name='日付別の復習予定')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('deck', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_counters', to='decks.deck', verbose_name='デッキ')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deck_counters', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': 'デッキ件数カウンタ',
+                'verbose_name_plural': 'デッキ件数カウンタ',
+                'constraints': [models.UniqueConstraint(fields=('deck', 'user'), name='unique_deck_user_counters')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0004_deck_user_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reviewlog',
+            name='review_time',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='復習日時'),
+        ),
+    ]
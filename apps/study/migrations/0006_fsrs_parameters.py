@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0005_review_time_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FSRSParameters',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('parameters', models.JSONField(verbose_name='パラメータ')),
+                ('desired_retention', models.FloatField(default=0.9, verbose_name='目標保持率')),
+                ('review_count', models.PositiveIntegerField(default=0, verbose_name='復習履歴数')),
+                ('log_loss', models.FloatField(blank=True, null=True, verbose_name='対数損失')),
+                ('fit_seconds', models.FloatField(default=0.0, verbose_name='最適化時間（秒）')),
+                ('fitted_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='最適化日時')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fsrs_parameters', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': 'FSRSパラメータ',
+                'verbose_name_plural': 'FSRSパラメータ',
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0001_initial'),
+        ('study', '0006_fsrs_parameters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveBigIntegerField(verbose_name='変更番号')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'デッキ'), (2, 'カード'), (3, '学習状態')], verbose_name='対象')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='対象のID')),
+                ('deleted', models.BooleanField(default=False, verbose_name='削除')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='記録日時')),
+            ],
+            options={
+                'verbose_name': '変更履歴',
+                'verbose_name_plural': '変更履歴',
+            },
+        ),
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.PositiveBigIntegerField(default=0, verbose_name='最新の番号')),
+            ],
+            options={
+                'verbose_name': '変更番号',
+                'verbose_name_plural': '変更番号',
+            },
+        ),
+        migrations.AddField(
+            model_name='reviewlog',
+            name='client_review_id',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='クライアント側の復習ID'),
+        ),
+        migrations.AddConstraint(
+            model_name='reviewlog',
+            constraint=models.UniqueConstraint(condition=models.Q(('client_review_id__isnull', False)), fields=('user', 'client_review_id'), name='unique_client_review_per_user'),
+        ),
+        migrations.AddField(
+            model_name='changelog',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='change_logs', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー'),
+        ),
+        migrations.AddField(
+            model_name='changesequence',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='change_sequence', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー'),
+        ),
+        migrations.AddConstraint(
+            model_name='changelog',
+            constraint=models.UniqueConstraint(fields=('user', 'seq'), name='unique_change_seq_per_user'),
+        ),
+    ]
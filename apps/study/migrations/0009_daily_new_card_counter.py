@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0008_global_study_session'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyNewCardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日付')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='新規カード数')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='daily_new_card_counter', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '1日の新規カード数',
+                'verbose_name_plural': '1日の新規カード数',
+            },
+        ),
+    ]
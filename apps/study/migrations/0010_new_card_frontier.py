@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('decks', '0001_initial'),
+        ('study', '0009_daily_new_card_counter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewCardFrontier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(verbose_name='作成日時')),
+                ('card_id', models.BigIntegerField(verbose_name='カードID')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('deck', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='new_card_frontiers', to='decks.deck', verbose_name='デッキ')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='new_card_frontiers', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '新規カードの探索位置',
+                'verbose_name_plural': '新規カードの探索位置',
+                'constraints': [models.UniqueConstraint(fields=('deck', 'user'), name='unique_new_card_frontier')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0010_new_card_frontier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cardstate',
+            name='step',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='学習ステップ'),
+        ),
+    ]
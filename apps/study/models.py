@@ -1,9 +1,31 @@
+from datetime import datetime, time, timedelta
+
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
 from apps.cards.models import Card
 
 
+def local_day_start(day, tz=None):
+    """tz（省略時は現在のタイムゾーン）での日付dayの始まり（0時）"""
+    return timezone.make_aware(
+        datetime.combine(day, time.min), tz or timezone.get_current_timezone()
+    )
+
+
+def due_cutoff(now=None, tz=None):
+    """
+    復習待ちの判定に使う時刻（今日の終わり＝翌日0時）
+
+    次回復習日時がこの時刻より前のカードを「今日の復習」とする。件数カウンタは
+    日付単位で集計するため、出題キュー・デッキの件数もこの定義にそろえる。
+    tzにはユーザーのタイムゾーン（quota.timezone_for）を渡す。
+    """
+    tz = tz or timezone.get_current_timezone()
+    tomorrow = timezone.localdate(now or timezone.now(), tz) + timedelta(days=1)
+    return local_day_start(tomorrow, tz)
+
+
 class CardState(models.Model):
     """カードのFSRS学習状態を保存（ユーザーごと）"""
 
@@ -55,6 +77,12 @@ class CardState(models.Model):
         default=State.NEW,
         verbose_name="状態"
     )
+    # 学習中・再学習中のステップ（fsrsのCard.step、復習・新規ではNULL）
+    step = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="学習ステップ"
+    )
     reps = models.PositiveIntegerField(
         default=0,
         verbose_name="復習回数"
@@ -82,14 +110,27 @@ class CardState(models.Model):
                 name="unique_card_user_state"
             )
         ]
+        indexes = [
+            # 復習期限の到来したカードの検索（ユーザー → 期限順）
+            models.Index(
+                fields=["user", "next_review", "card"],
+                name="cardstate_user_next_review"
+            ),
+            # デッキ単位の学習済みカード検索（ユーザー → カード）
+            models.Index(
+                fields=["user", "card", "next_review"],
+                name="cardstate_user_card"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.card} - {self.user.username} - {self.get_state_display()}"
 
     @property
     def is_due(self):
-        """復習が必要かどうか"""
-        return self.next_review <= timezone.now()
+        """今日（ユーザーのタイムゾーン）復習が必要かどうか"""
+        from .quota import timezone_for
+        return self.next_review < due_cutoff(tz=timezone_for(self.user))
 
 
 class ReviewLog(models.Model):
@@ -139,8 +180,9 @@ class ReviewLog(models.Model):
         verbose_name="予定間隔（日）"
     )
     # 復習時間
+    # 一括登録・履歴インポートでは実際の復習日時を保存する
     review_time = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         verbose_name="復習日時"
     )
     # 回答時間（ミリ秒）
@@ -148,11 +190,478 @@ class ReviewLog(models.Model):
         default=0,
         verbose_name="回答時間(ms)"
     )
+    # オフラインのクライアントが付けた復習のID（同期の再送で二重に記録しないため）
+    client_review_id = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        verbose_name="クライアント側の復習ID"
+    )
 
     class Meta:
         verbose_name = "復習履歴"
         verbose_name_plural = "復習履歴"
         ordering = ["-review_time"]
+        indexes = [
+            # 期間ごとの復習履歴の集計（ユーザー → 復習日時）
+            models.Index(
+                fields=["user", "review_time"],
+                name="reviewlog_user_review_time"
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "client_review_id"],
+                condition=models.Q(client_review_id__isnull=False),
+                name="unique_client_review_per_user"
+            )
+        ]
 
     def __str__(self):
         return f"{self.card} - {self.get_rating_display()} ({self.review_time})"
+
+
+class StudySession(models.Model):
+    """
+    学習セッション（開始時点の出題キューを固定して保持）
+
+    deckがNULLのセッションは全デッキをまとめて学習する。
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="study_sessions",
+        verbose_name="ユーザー"
+    )
+    deck = models.ForeignKey(
+        "decks.Deck",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="study_sessions",
+        verbose_name="デッキ（NULLは全デッキ）"
+    )
+    # 出題順に並べたカードIDのリスト（セッション開始時に確定）
+    card_ids = models.JSONField(
+        default=list,
+        verbose_name="出題キュー"
+    )
+    # 次に出題するカードの位置
+    cursor = models.PositiveIntegerField(
+        default=0,
+        verbose_name="現在位置"
+    )
+    reviewed_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="回答数"
+    )
+    started_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="開始日時"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="更新日時"
+    )
+
+    class Meta:
+        verbose_name = "学習セッション"
+        verbose_name_plural = "学習セッション"
+        # ユーザー・デッキごとに進行中のセッションは1つ
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "deck"],
+                name="unique_study_session_per_deck"
+            ),
+            # NULLは一意制約で比較されないため、全デッキのセッションは別に制約する
+            models.UniqueConstraint(
+                fields=["user"],
+                condition=models.Q(deck__isnull=True),
+                name="unique_global_study_session"
+            ),
+        ]
+
+    def __str__(self):
+        deck = self.deck if self.deck_id else "全デッキ"
+        return f"{deck} - {self.user.username} ({self.position}/{self.total_cards})"
+
+    @property
+    def total_cards(self):
+        """セッション内のカード総数"""
+        return len(self.card_ids)
+
+    @property
+    def is_finished(self):
+        """全カードを出題し終えたかどうか"""
+        return self.cursor >= len(self.card_ids)
+
+    @property
+    def current_card_id(self):
+        """現在出題中のカードID（終了時はNone）"""
+        if self.is_finished:
+            return None
+        return self.card_ids[self.cursor]
+
+    @property
+    def position(self):
+        """現在のカードが何枚目か（1始まり）"""
+        return min(self.cursor + 1, len(self.card_ids))
+
+    def upcoming_card_ids(self, count):
+        """現在のカードの後に出題するカードIDを最大count件"""
+        return self.card_ids[self.cursor + 1:self.cursor + 1 + count]
+
+    def advance(self, card_id, requeue=False):
+        """
+        回答済みとして次のカードへ進める
+
+        現在のカードと異なるカードへの回答（古いタブからの送信など）では
+        カーソルを動かさず、回答数だけを加算する。requeueがTrueの場合
+        （学習中・再学習中のカード）は、残りのキューになければ末尾に追加して
+        同じセッションでもう一度出題する。
+        """
+        if card_id == self.current_card_id:
+            self.cursor += 1
+        if requeue and card_id not in self.card_ids[self.cursor:]:
+            self.card_ids.append(card_id)
+        self.reviewed_count += 1
+        self.save(update_fields=["card_ids", "cursor", "reviewed_count", "updated_at"])
+        return self.current_card_id
+
+
+class DeckUserCounters(models.Model):
+    """
+    デッキ・ユーザーごとのカード件数（非正規化カウンタ）
+
+    復習やカードの追加・削除のたびに差分で更新し、デッキ一覧・詳細では
+    CardStateを集計せずにこの行を読む。復習待ち件数は日付単位で管理し、
+    due_date当日までに期限が来るカードをdue_countに、それ以降の期限を
+    日付ごとのバケット（due_buckets）に保持する。日付はユーザーの
+    タイムゾーン（quota.timezone_for）で数える。
+    """
+
+    deck = models.ForeignKey(
+        "decks.Deck",
+        on_delete=models.CASCADE,
+        related_name="user_counters",
+        verbose_name="デッキ"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="deck_counters",
+        verbose_name="ユーザー"
+    )
+    total_count = models.IntegerField(
+        default=0,
+        verbose_name="総カード数"
+    )
+    new_count = models.IntegerField(
+        default=0,
+        verbose_name="新規カード数"
+    )
+    learning_count = models.IntegerField(
+        default=0,
+        verbose_name="学習中カード数"
+    )
+    review_count = models.IntegerField(
+        default=0,
+        verbose_name="復習カード数"
+    )
+    # due_date当日までに期限が来るカード数
+    due_count = models.IntegerField(
+        default=0,
+        verbose_name="復習待ちカード数"
+    )
+    due_date = models.DateField(
+        default=timezone.localdate,
+        verbose_name="復習待ち集計日"
+    )
+    # due_dateより後の期限を {"YYYY-MM-DD": 件数} で保持
+    due_buckets = models.JSONField(
+        default=dict,
+        verbose_name="日付別の復習予定"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="更新日時"
+    )
+
+    COUNT_FIELDS = (
+        "total_count",
+        "new_count",
+        "learning_count",
+        "review_count",
+        "due_count",
+        "due_date",
+        "due_buckets",
+    )
+
+    class Meta:
+        verbose_name = "デッキ件数カウンタ"
+        verbose_name_plural = "デッキ件数カウンタ"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["deck", "user"],
+                name="unique_deck_user_counters"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.deck} - {self.user.username} ({self.total_count}枚)"
+
+    @staticmethod
+    def state_field(state):
+        """カードの状態に対応する件数フィールド名（状態なしは新規扱い）"""
+        if state in (CardState.State.LEARNING, CardState.State.RELEARNING):
+            return "learning_count"
+        if state == CardState.State.REVIEW:
+            return "review_count"
+        return "new_count"
+
+    @staticmethod
+    def counts_as_due(state):
+        """復習待ち件数の対象となる状態かどうか（新規カードは含めない）"""
+        return state is not None and state != CardState.State.NEW
+
+    def roll_over(self, today=None):
+        """集計日をtodayに進め、当日までのバケットをdue_countへ繰り入れる"""
+        if today is None:
+            today = timezone.localdate()
+        if self.due_date >= today:
+            return False
+        today_key = today.isoformat()
+        for key in [key for key in self.due_buckets if key <= today_key]:
+            self.due_count += self.due_buckets.pop(key)
+        self.due_date = today
+        return True
+
+    def add_due(self, next_review, delta, tz=None):
+        """期限next_reviewのカードをdelta件だけ復習予定に加減する（日付はtzで数える）"""
+        day = timezone.localdate(next_review, tz)
+        if day <= self.due_date:
+            self.due_count += delta
+            return
+        key = day.isoformat()
+        count = self.due_buckets.get(key, 0) + delta
+        if count:
+            self.due_buckets[key] = count
+        else:
+            self.due_buckets.pop(key, None)
+
+    def due_count_on(self, today=None):
+        """todayまでに期限が来るカード数（集計日が古くても正しい値を返す）"""
+        if today is None:
+            today = timezone.localdate()
+        if self.due_date >= today:
+            return self.due_count
+        today_key = today.isoformat()
+        return self.due_count + sum(
+            count for key, count in self.due_buckets.items() if key <= today_key
+        )
+
+
+class FSRSParameters(models.Model):
+    """ユーザーごとに最適化したFSRSパラメータ"""
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="fsrs_parameters",
+        verbose_name="ユーザー"
+    )
+    parameters = models.JSONField(
+        verbose_name="パラメータ"
+    )
+    desired_retention = models.FloatField(
+        default=0.9,
+        verbose_name="目標保持率"
+    )
+    # 最適化に使った復習履歴と結果
+    review_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="復習履歴数"
+    )
+    log_loss = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name="対数損失"
+    )
+    fit_seconds = models.FloatField(
+        default=0.0,
+        verbose_name="最適化時間（秒）"
+    )
+    fitted_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="最適化日時"
+    )
+
+    class Meta:
+        verbose_name = "FSRSパラメータ"
+        verbose_name_plural = "FSRSパラメータ"
+
+    def __str__(self):
+        return f"{self.user.username}のFSRSパラメータ"
+
+
+class ChangeSequence(models.Model):
+    """
+    ユーザーごとの変更の通し番号（同期トークン）
+
+    番号は行ロックを取って払い出すため、同じユーザーの変更はコミット順に
+    番号が増える（updated_atやAUTO INCREMENTの値では順序が保証されない）。
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="change_sequence",
+        verbose_name="ユーザー"
+    )
+    value = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="最新の番号"
+    )
+
+    class Meta:
+        verbose_name = "変更番号"
+        verbose_name_plural = "変更番号"
+
+    def __str__(self):
+        return f"{self.user.username}: {self.value}"
+
+
+class ChangeLog(models.Model):
+    """同期用の変更履歴（デッキ・カード・学習状態の追加・更新・削除）"""
+
+    class Kind(models.IntegerChoices):
+        """変更の対象"""
+        DECK = 1, "デッキ"
+        CARD = 2, "カード"
+        # 学習状態はカードIDで識別する（ユーザーごとに1つのため）
+        CARD_STATE = 3, "学習状態"
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="change_logs",
+        verbose_name="ユーザー"
+    )
+    seq = models.PositiveBigIntegerField(
+        verbose_name="変更番号"
+    )
+    kind = models.PositiveSmallIntegerField(
+        choices=Kind.choices,
+        verbose_name="対象"
+    )
+    object_id = models.PositiveBigIntegerField(
+        verbose_name="対象のID"
+    )
+    deleted = models.BooleanField(
+        default=False,
+        verbose_name="削除"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="記録日時"
+    )
+
+    class Meta:
+        verbose_name = "変更履歴"
+        verbose_name_plural = "変更履歴"
+        constraints = [
+            # 差分の取得（ユーザー → 番号順）にも使う
+            models.UniqueConstraint(
+                fields=["user", "seq"],
+                name="unique_change_seq_per_user"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} #{self.seq} {self.get_kind_display()} {self.object_id}"
+
+
+class DailyNewCardCounter(models.Model):
+    """
+    ユーザーがその日に初めて学習した（新規から学習を始めた）カードの枚数
+
+    ユーザーごとに1行だけ持ち、dateがユーザーの今日（UserProfile.timezone）と
+    異なる場合は0枚として扱う。新規カードの上限はこの値から求める
+    （ReviewLogを毎回数えない）。
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="daily_new_card_counter",
+        verbose_name="ユーザー"
+    )
+    date = models.DateField(
+        verbose_name="日付"
+    )
+    count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="新規カード数"
+    )
+
+    class Meta:
+        verbose_name = "1日の新規カード数"
+        verbose_name_plural = "1日の新規カード数"
+
+    def __str__(self):
+        return f"{self.user.username} {self.date}: {self.count}"
+
+    def count_on(self, date):
+        """指定した日の枚数（別の日の値なら0）"""
+        return self.count if self.date == date else 0
+
+
+class NewCardFrontier(models.Model):
+    """
+    デッキ・ユーザーごとの新規カードの探索開始位置
+
+    カードを作成順（created_at, id）に並べたとき、この位置より前のカードは
+    すべてこのユーザーのCardStateを持つ。新規カードの検索はここから
+    インデックスを範囲検索すればよく、学習済みのカードを読み飛ばさない。
+    出題キューの構築時に先頭の新規カードの位置まで進める（遅延更新）。
+    カードは作成日時の順に追加されるため、CardStateを削除した場合
+    （new_cards.reset_frontiersで行を削除する）を除いて位置が後戻りすることはない。
+    """
+
+    deck = models.ForeignKey(
+        "decks.Deck",
+        on_delete=models.CASCADE,
+        related_name="new_card_frontiers",
+        verbose_name="デッキ"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="new_card_frontiers",
+        verbose_name="ユーザー"
+    )
+    # 先頭の新規カードの作成日時とID（カードの削除後も位置として使う）
+    created_at = models.DateTimeField(
+        verbose_name="作成日時"
+    )
+    card_id = models.BigIntegerField(
+        verbose_name="カードID"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="更新日時"
+    )
+
+    class Meta:
+        verbose_name = "新規カードの探索位置"
+        verbose_name_plural = "新規カードの探索位置"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["deck", "user"],
+                name="unique_new_card_frontier"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.deck} - {self.user.username}: {self.card_id}"
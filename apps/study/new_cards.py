@@ -0,0 +1,145 @@
+"""
+新規カード（ユーザーのCardStateがないカード）の検索
+
+学習済みのカードIDをすべて読んで除外する（NOT IN）代わりに、NOT EXISTSで
+1枚ずつCardStateの有無を確認し、さらにNewCardFrontierの位置より後だけを
+カードのインデックス（デッキ → 作成日時 → ID）で範囲検索する。学習が進んだ
+大きなデッキでも、次のK枚の取得で読むのはほぼK行で済む。
+
+学習状態を削除した場合（管理画面など）は、同じトランザクション内で
+reset_frontiersを呼び出して探索位置を削除すること。
+"""
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from apps.cards.models import Card
+from .models import CardState, NewCardFrontier
+
+# 1回のクエリで新規カードを検索するデッキ数の上限
+DECKS_PER_QUERY = 100
+
+
+def unseen_cards(deck, user):
+    """deckのうちuserのCardStateがないカード"""
+    return Card.objects.filter(deck=deck).filter(
+        ~Exists(CardState.objects.filter(user=user, card=OuterRef("pk")))
+    )
+
+
+def _after_frontier(queryset, frontier):
+    """(created_at, id)が探索位置以降のカードに絞り込む"""
+    if frontier is None:
+        return queryset
+    # created_at__gteはインデックスの範囲検索の開始位置として残す
+    return queryset.filter(created_at__gte=frontier.created_at).filter(
+        Q(created_at__gt=frontier.created_at) | Q(pk__gte=frontier.card_id)
+    )
+
+
+def _get_frontier(deck, user):
+    return NewCardFrontier.objects.filter(deck=deck, user=user).first()
+
+
+def _advance_frontiers(user, frontiers, firsts):
+    """
+    探索位置を各デッキの先頭の新規カードまで進める
+
+    Args:
+        frontiers: {デッキID: 現在のNewCardFrontier}
+        firsts: {デッキID: (作成日時, カードID)}（先頭の新規カード）
+    """
+    now = timezone.now()
+    created = []
+    updated = []
+    for deck_id, (created_at, card_id) in firsts.items():
+        frontier = frontiers.get(deck_id)
+        if frontier is None:
+            created.append(NewCardFrontier(
+                deck_id=deck_id, user=user, created_at=created_at, card_id=card_id
+            ))
+        elif (frontier.created_at, frontier.card_id) != (created_at, card_id):
+            frontier.created_at = created_at
+            frontier.card_id = card_id
+            frontier.updated_at = now
+            updated.append(frontier)
+    # 同時に作成された場合はどちらの位置でも正しい
+    NewCardFrontier.objects.bulk_create(created, ignore_conflicts=True)
+    NewCardFrontier.objects.bulk_update(updated, ["created_at", "card_id", "updated_at"])
+
+
+def new_card_ids_by_deck(deck_ids, user, limit):
+    """
+    デッキごとに新規カードのIDを作成順に最大limit件取得
+
+    デッキごとの探索位置からの範囲検索（LIMITつきのサブクエリ）をORで
+    まとめ、DECKS_PER_QUERY個のデッキごとに1回のクエリで取得する。
+    取得した先頭のカードまで各デッキの探索位置を進める。
+
+    Returns:
+        {デッキID: [カードID, ...]}（deck_idsの順、新規カードのないデッキは含まない）
+    """
+    deck_ids = list(deck_ids)
+    if limit <= 0 or not deck_ids:
+        return {}
+    frontiers = {
+        frontier.deck_id: frontier
+        for frontier in NewCardFrontier.objects.filter(user=user, deck_id__in=deck_ids)
+    }
+
+    rows = []
+    for start in range(0, len(deck_ids), DECKS_PER_QUERY):
+        condition = Q()
+        for deck_id in deck_ids[start:start + DECKS_PER_QUERY]:
+            condition |= Q(pk__in=(
+                _after_frontier(unseen_cards(deck_id, user), frontiers.get(deck_id))
+                .order_by("created_at", "pk")
+                .values("pk")[:limit]
+            ))
+        rows.extend(
+            Card.objects.filter(condition).order_by()
+            .values_list("deck_id", "created_at", "pk")
+        )
+
+    by_deck = {}
+    for deck_id, created_at, card_id in sorted(rows):
+        by_deck.setdefault(deck_id, []).append((created_at, card_id))
+    _advance_frontiers(user, frontiers, {
+        deck_id: cards[0] for deck_id, cards in by_deck.items()
+    })
+    return {
+        deck_id: [card_id for _, card_id in by_deck[deck_id]]
+        for deck_id in deck_ids
+        if deck_id in by_deck
+    }
+
+
+def new_card_ids(deck, user, limit):
+    """
+    新規カードのIDを作成順に最大limit件取得
+
+    取得した先頭のカードまで探索位置を進める。
+    """
+    return new_card_ids_by_deck([deck.pk], user, limit).get(deck.pk, [])
+
+
+def reset_frontiers(deck_users):
+    """
+    学習状態を削除したデッキ・ユーザーの探索位置を削除
+
+    削除した学習状態のカードは新規カードに戻り、探索位置より前にある場合が
+    あるため、次の検索で先頭から探し直す（探索位置は取得時に作り直される）。
+
+    Args:
+        deck_users: (デッキID, ユーザーID) の列
+    """
+    condition = Q()
+    for deck_id, user_id in set(deck_users):
+        condition |= Q(deck_id=deck_id, user_id=user_id)
+    if condition:
+        NewCardFrontier.objects.filter(condition).delete()
+
+
+def count_new_cards(deck, user):
+    """新規カードの枚数"""
+    return _after_frontier(unseen_cards(deck, user), _get_frontier(deck, user)).count()
@@ -0,0 +1,153 @@
+"""
+ユーザーごとのFSRSパラメータ最適化
+
+復習履歴（ReviewLog）を分割して読み込み、fsrsのOptimizerでパラメータを求める。
+fsrsのOptimizerは追加の依存パッケージ（pip install "fsrs[optimizer]"）が必要。
+"""
+
+import math
+import time
+from collections import defaultdict
+from typing import Iterable, List, Optional, Sequence
+
+from django.utils import timezone
+from fsrs import Card as FSRSCard, Optimizer, Rating, ReviewLog as FSRSReviewLog, Scheduler
+
+from .models import FSRSParameters, ReviewLog
+
+# 予測確率の下限・上限（log(0)を避ける）
+PROBABILITY_EPSILON = 1e-7
+
+
+def optimizer_available() -> bool:
+    """fsrsのOptimizerが利用可能か（追加の依存パッケージがインストール済みか）"""
+    try:
+        Optimizer([])
+    except ImportError:
+        return False
+    return True
+
+
+def load_review_history(user_id: int, chunk_size: int = 5000) -> List[FSRSReviewLog]:
+    """ユーザーの復習履歴をchunk_size件ずつ読み込み、fsrsのReviewLogに変換"""
+    rows = (
+        ReviewLog.objects.filter(user_id=user_id)
+        .order_by("card_id", "review_time", "pk")
+        .values_list("card_id", "rating", "review_time", "duration")
+    )
+    return [
+        FSRSReviewLog(
+            card_id=card_id,
+            rating=Rating(rating),
+            review_datetime=review_time,
+            review_duration=duration or None,
+        )
+        for card_id, rating, review_time, duration in rows.iterator(chunk_size=chunk_size)
+    ]
+
+
+def compute_log_loss(parameters: Sequence[float], review_logs: Iterable[FSRSReviewLog]) -> Optional[float]:
+    """
+    パラメータの対数損失（想起できたかどうかに対する予測保持率の二値交差エントロピー）
+
+    fsrsのOptimizerと同じく、前回の復習から1日以上空いた復習だけを評価する。
+    評価対象がない場合はNone。
+    """
+    scheduler = Scheduler(parameters=parameters, enable_fuzzing=False)
+
+    histories = defaultdict(list)
+    for review_log in review_logs:
+        histories[review_log.card_id].append(review_log)
+
+    total = 0.0
+    count = 0
+    for card_id, history in histories.items():
+        history.sort(key=lambda review_log: review_log.review_datetime)
+        card = FSRSCard(card_id=card_id, due=history[0].review_datetime)
+        for review_log in history:
+            review_time = review_log.review_datetime
+            if card.last_review and (review_time - card.last_review).days > 0:
+                predicted = scheduler.get_card_retrievability(card, review_time)
+                predicted = min(max(predicted, PROBABILITY_EPSILON), 1 - PROBABILITY_EPSILON)
+                recalled = review_log.rating != Rating.Again
+                total -= math.log(predicted) if recalled else math.log(1 - predicted)
+                count += 1
+            card, _ = scheduler.review_card(card, review_log.rating, review_time)
+
+    if count == 0:
+        return None
+    return total / count
+
+
+def fit_user_parameters(user_id: int, chunk_size: int = 5000, min_reviews: int = 100) -> dict:
+    """
+    1ユーザー分のパラメータを最適化
+
+    Returns:
+        user_id, status（"fitted" / "skipped"）, parameters, review_count,
+        log_loss, fit_seconds を含む辞書
+    """
+    started = time.perf_counter()
+    review_logs = load_review_history(user_id, chunk_size=chunk_size)
+    result = {
+        "user_id": user_id,
+        "status": "skipped",
+        "parameters": None,
+        "review_count": len(review_logs),
+        "log_loss": None,
+        "fit_seconds": 0.0,
+    }
+    if len(review_logs) < min_reviews:
+        return result
+
+    parameters = Optimizer(review_logs).compute_optimal_parameters()
+    result.update(
+        status="fitted",
+        parameters=[float(value) for value in parameters],
+        log_loss=compute_log_loss(parameters, review_logs),
+        fit_seconds=time.perf_counter() - started,
+    )
+    return result
+
+
+def save_fit_result(result: dict) -> Optional[FSRSParameters]:
+    """最適化結果をFSRSParametersに保存（スキップしたユーザーは保存しない）"""
+    if result["status"] != "fitted":
+        return None
+    record, _ = FSRSParameters.objects.update_or_create(
+        user_id=result["user_id"],
+        defaults={
+            "parameters": result["parameters"],
+            "review_count": result["review_count"],
+            "log_loss": result["log_loss"],
+            "fit_seconds": result["fit_seconds"],
+            "fitted_at": timezone.now(),
+        },
+    )
+    return record
+
+
+def init_worker():
+    """
+    ワーカープロセスの初期化（spawn方式でもDjangoを使えるようにする）
+
+    DB接続は親プロセスがプール作成前に閉じておき、各ワーカーで新たに接続する。
+    """
+    import django
+
+    django.setup()
+
+
+def fit_user_in_worker(user_id: int, chunk_size: int, min_reviews: int) -> dict:
+    """ワーカープロセスで1ユーザー分を最適化（例外は結果として返す）"""
+    try:
+        return fit_user_parameters(user_id, chunk_size=chunk_size, min_reviews=min_reviews)
+    except Exception as error:  # 1ユーザーの失敗で全体を止めない
+        return {
+            "user_id": user_id,
+            "status": "error",
+            "error": f"{type(error).__name__}: {error}",
+            "review_count": 0,
+            "log_loss": None,
+            "fit_seconds": 0.0,
+        }
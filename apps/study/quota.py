@@ -0,0 +1,105 @@
+"""
+1日の新規カード上限（UserProfile.daily_new_cards）
+
+ユーザーがその日に学習を始めた新規カードの枚数をDailyNewCardCounterに
+数え、出題キューの新規カードを残りの枚数までに制限する。
+「その日」はUserProfile.timezoneでの日付とする。復習待ち（models.due_cutoff）や
+デッキ件数カウンタの日付もtimezone_forで同じタイムゾーンにそろえる。
+"""
+
+from datetime import date as date_type
+from typing import Iterable
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from apps.accounts.models import UserProfile
+from .models import DailyNewCardCounter
+
+DEFAULT_DAILY_NEW_CARDS = UserProfile._meta.get_field("daily_new_cards").default
+
+
+def get_profile(user):
+    """
+    ユーザーのプロフィール（なければNone）
+
+    1回のリクエストで何度も参照するため、逆参照（user.profile）で読み込んで
+    ユーザーのインスタンスにキャッシュする（プロフィールがない場合も含む）。
+    """
+    try:
+        return user.profile
+    except UserProfile.DoesNotExist:
+        return None
+
+
+def zone(name):
+    """タイムゾーン名のZoneInfo（なし・不正な場合はsettings.TIME_ZONE）"""
+    try:
+        return ZoneInfo(name or settings.TIME_ZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(settings.TIME_ZONE)
+
+
+def user_timezone(profile):
+    """プロフィールのタイムゾーン（なし・不正な場合はsettings.TIME_ZONE）"""
+    return zone(profile.timezone if profile is not None else None)
+
+
+def timezone_for(user):
+    """ユーザーのタイムゾーン（1日の区切り）"""
+    return user_timezone(get_profile(user))
+
+
+def local_date(profile, moment=None) -> date_type:
+    """ユーザーのタイムゾーンでの日付"""
+    return timezone.localtime(moment or timezone.now(), user_timezone(profile)).date()
+
+
+def remaining_new_cards(user) -> int:
+    """今日あと何枚の新規カードを学習できるか"""
+    profile = get_profile(user)
+    limit = profile.daily_new_cards if profile is not None else DEFAULT_DAILY_NEW_CARDS
+    counter = DailyNewCardCounter.objects.filter(user=user).first()
+    introduced = counter.count_on(local_date(profile)) if counter is not None else 0
+    return max(limit - introduced, 0)
+
+
+def record_new_cards(user, review_times: Iterable):
+    """
+    新規カードの学習開始を数える（呼び出し側のトランザクション内で）
+
+    review_timesは学習を始めたカードごとの最初の復習日時。カウンタは
+    最新の1日分だけを持つため、最も新しい日付の分だけを加算し、
+    カウンタより古い日付（オフラインで行った過去の復習）は数えない。
+    """
+    review_times = list(review_times)
+    if not review_times:
+        return
+    profile = get_profile(user)
+    dates = [local_date(profile, moment) for moment in review_times]
+    today = max(dates)
+    count = dates.count(today)
+
+    updated = DailyNewCardCounter.objects.filter(user=user).update(
+        count=Case(
+            When(date=today, then=F("count") + count),
+            When(date__lt=today, then=Value(count)),
+            default=F("count"),
+            output_field=DailyNewCardCounter._meta.get_field("count"),
+        ),
+        date=Case(
+            When(date__lt=today, then=Value(today)),
+            default=F("date"),
+            output_field=DailyNewCardCounter._meta.get_field("date"),
+        ),
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            DailyNewCardCounter.objects.create(user=user, date=today, count=count)
+    except IntegrityError:  # 同時に作成された
+        record_new_cards(user, review_times)
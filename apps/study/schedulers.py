@@ -0,0 +1,152 @@
+"""
+FSRSのSchedulerをパラメータの組ごとに共有するレジストリ
+
+Schedulerは復習計算で内部状態を変更しないため、同じパラメータの
+リクエスト間で使い回せる。件数の上限を超えたら最も古く使われたものから破棄する。
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Optional, Sequence
+
+from fsrs import Scheduler
+from fsrs.scheduler import DEFAULT_PARAMETERS
+
+DEFAULT_LEARNING_STEPS = (timedelta(minutes=1), timedelta(minutes=10))
+DEFAULT_RELEARNING_STEPS = (timedelta(minutes=10),)
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """件数上限つきのスレッドセーフなLRUキャッシュ（ヒット・ミス数を記録）"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """キーに対応する値を返し、最近使ったものとして記録"""
+        with self._lock:
+            value = self._items.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """値を登録して返す（同じキーが先に登録されていればそちらを返す）"""
+        with self._lock:
+            value = self._items.setdefault(key, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+            return value
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self) -> dict:
+        """キャッシュの利用状況"""
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self):
+        """登録済みの値と統計をすべて破棄"""
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def scheduler_key(scheduler: Scheduler) -> tuple:
+    """Schedulerの設定をハッシュ可能なキーに変換"""
+    return SchedulerRegistry.make_key(
+        scheduler.parameters,
+        scheduler.desired_retention,
+        scheduler.learning_steps,
+        scheduler.relearning_steps,
+        scheduler.maximum_interval,
+        scheduler.enable_fuzzing,
+    )
+
+
+class SchedulerRegistry(LRUCache):
+    """パラメータの組をキーにSchedulerを保持するLRUキャッシュ"""
+
+    def __init__(self, maxsize: int = 256):
+        super().__init__(maxsize)
+
+    @staticmethod
+    def make_key(
+        parameters: Sequence[float],
+        desired_retention: float,
+        learning_steps: Sequence[timedelta],
+        relearning_steps: Sequence[timedelta],
+        maximum_interval: int,
+        enable_fuzzing: bool
+    ) -> tuple:
+        """Schedulerの設定をハッシュ可能なキーに変換"""
+        return (
+            tuple(float(value) for value in parameters),
+            float(desired_retention),
+            tuple(step.total_seconds() for step in learning_steps),
+            tuple(step.total_seconds() for step in relearning_steps),
+            int(maximum_interval),
+            bool(enable_fuzzing),
+        )
+
+    def get_scheduler(
+        self,
+        parameters: Optional[Sequence[float]] = None,
+        desired_retention: float = 0.9,
+        learning_steps: Sequence[timedelta] = DEFAULT_LEARNING_STEPS,
+        relearning_steps: Sequence[timedelta] = DEFAULT_RELEARNING_STEPS,
+        maximum_interval: int = 36500,
+        enable_fuzzing: bool = True
+    ) -> Scheduler:
+        """設定に対応するSchedulerを返す（なければ作成して登録）"""
+        if parameters is None:
+            parameters = DEFAULT_PARAMETERS
+        key = self.make_key(
+            parameters,
+            desired_retention,
+            learning_steps,
+            relearning_steps,
+            maximum_interval,
+            enable_fuzzing,
+        )
+
+        scheduler = self.get(key)
+        if scheduler is not None:
+            return scheduler
+
+        # Schedulerの生成（パラメータ検証を含む）はロックの外で行う
+        return self.put(key, Scheduler(
+            parameters=parameters,
+            desired_retention=desired_retention,
+            learning_steps=tuple(learning_steps),
+            relearning_steps=tuple(relearning_steps),
+            maximum_interval=maximum_interval,
+            enable_fuzzing=enable_fuzzing,
+        ))
+
+
+scheduler_registry = SchedulerRegistry()
+
+
+def get_scheduler(**kwargs) -> Scheduler:
+    """共有レジストリからSchedulerを取得"""
+    return scheduler_registry.get_scheduler(**kwargs)
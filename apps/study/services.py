@@ -3,20 +3,89 @@ FSRS v4アルゴリズムを使用した学習サービス
 """
 
 from datetime import datetime, timedelta
-from typing import Optional, Tuple
+from typing import Dict, Iterable, Optional
+from django.db import transaction
 from django.utils import timezone
 from fsrs import Scheduler, Card as FSRSCard, Rating, State
 
 from django.contrib.auth.models import User
 from apps.cards.models import Card
-from .models import CardState, ReviewLog
+from apps.monitoring.metrics import registry as metrics
+from apps.monitoring.tracing import current_span, span, traced
+from . import counters, quota
+from .models import CardState, ChangeLog, FSRSParameters, ReviewLog
+from .schedulers import LRUCache, get_scheduler, scheduler_key, scheduler_registry
+from .sync import record_changes
+
+# 回答ボタンの間隔表示のメモ化（キーは量子化したカード状態とSchedulerの設定）
+interval_preview_cache = LRUCache(maxsize=4096)
+
+REVIEW_CARD_SECONDS = metrics.histogram(
+    "fsrs_review_card_duration_seconds",
+    "FSRSService.review_cardの処理時間（秒）",
+)
+
+
+def _cache_metrics():
+    """間隔表示キャッシュとSchedulerレジストリのヒット・ミス数"""
+    samples = []
+    for cache_name, cache in [
+        ("interval_preview", interval_preview_cache),
+        ("scheduler_registry", scheduler_registry),
+    ]:
+        stats = cache.stats()
+        samples.append(("cache_hits_total", "キャッシュのヒット数", {"cache": cache_name}, stats["hits"]))
+        samples.append(("cache_misses_total", "キャッシュのミス数", {"cache": cache_name}, stats["misses"]))
+    return samples
+
+
+metrics.register_collector(_cache_metrics)
+
+# メモ化キーで安定性・難易度を丸める桁数
+PREVIEW_STABILITY_DIGITS = 3
+PREVIEW_DIFFICULTY_DECIMALS = 2
+
+
+def _round_significant(value: float, digits: int) -> float:
+    """有効数字digits桁に丸める"""
+    if value == 0:
+        return 0.0
+    return float(f"{value:.{digits}g}")
 
 
 class FSRSService:
     """FSRSアルゴリズムを使用した復習スケジューリングサービス"""
 
-    def __init__(self):
-        self.scheduler = Scheduler()
+    # 復習で更新されるCardStateのフィールド
+    CARD_STATE_FIELDS = [
+        "stability",
+        "difficulty",
+        "due",
+        "next_review",
+        "last_review",
+        "state",
+        "step",
+        "reps",
+        "lapses",
+        "updated_at",
+    ]
+
+    def __init__(self, scheduler: Optional[Scheduler] = None):
+        # Schedulerはパラメータの組ごとにレジストリで共有する
+        self.scheduler = scheduler or get_scheduler()
+        self._preview_scheduler = None
+        self._preview_key = None
+
+    @classmethod
+    def for_user(cls, user: User) -> "FSRSService":
+        """ユーザーの最適化済みパラメータ（なければデフォルト）を使うサービスを作成"""
+        record = FSRSParameters.objects.filter(user=user).first()
+        if record is None:
+            return cls()
+        return cls(get_scheduler(
+            parameters=record.parameters,
+            desired_retention=record.desired_retention,
+        ))
 
     def get_or_create_card_state(self, card: Card, user: User) -> CardState:
         """カードの学習状態を取得または作成（ユーザーごと）"""
@@ -46,15 +115,20 @@ class FSRSService:
 
         fsrs_state = state_mapping.get(card_state.state, State.Learning)
 
+        # card_idを渡す（省略するとfsrsがID採番のため1ミリ秒待機する）
+        card_id = card_state.card_id or 0
+
         # 新規カードの場合はstep=0のデフォルトカードを使用
         if card_state.state == CardState.State.NEW:
-            fsrs_card = FSRSCard()
-            fsrs_card.due = card_state.due
-            return fsrs_card
+            return FSRSCard(card_id=card_id, due=card_state.due)
 
         # 既存のカード状態を復元
+        # ステップを保存する前の学習中・再学習中のカードは最初のステップから数える
+        # （fsrsはRelearningでstep=Noneを受け付けない）
         fsrs_card = FSRSCard(
+            card_id=card_id,
             state=fsrs_state,
+            step=None if fsrs_state == State.Review else (card_state.step or 0),
             stability=card_state.stability if card_state.stability > 0 else None,
             difficulty=card_state.difficulty if card_state.difficulty > 0 else None,
             due=card_state.due,
@@ -71,7 +145,10 @@ class FSRSService:
             ReviewLog.Rating.GOOD: Rating.Good,
             ReviewLog.Rating.EASY: Rating.Easy,
         }
-        return rating_mapping.get(rating, Rating.Good)
+        try:
+            return rating_mapping[rating]
+        except KeyError:
+            raise ValueError(f"評価は1〜4で指定してください: {rating}") from None
 
     def _fsrs_state_to_card_state(self, fsrs_state: State) -> int:
         """FSRSのStateをCardState.Stateに変換"""
@@ -83,6 +160,7 @@ class FSRSService:
         }
         return state_mapping.get(fsrs_state, CardState.State.LEARNING)
 
+    @traced("fsrs.review_card")
     def review_card(
         self,
         card: Card,
@@ -107,9 +185,49 @@ class FSRSService:
         if review_time is None:
             review_time = timezone.now()
 
+        with REVIEW_CARD_SECONDS.time(), transaction.atomic():
+            return self._review_card(card, user, rating, duration, review_time)
+
+    def _review_card(self, card, user, rating, duration, review_time):
+        """review_cardの本体（トランザクション内で実行）"""
         # CardStateを取得または作成
-        card_state = self.get_or_create_card_state(card, user)
+        with span("card_state.load"):
+            card_state = self.get_or_create_card_state(card, user)
+
+        # 復習前の状態を保存（カウンタ更新用）
+        old_state = card_state.state
+        old_next_review = card_state.next_review
+
+        with span("fsrs.schedule"):
+            review_log = self._apply_review(card_state, rating, duration, review_time)
+        with span("card_state.save"):
+            card_state.save()
+        with span("review_log.save"):
+            review_log.save()
+
+        # デッキ件数カウンタを更新
+        with span("counters.record_review"):
+            counters.record_review(card, user, old_state, old_next_review, card_state)
+        with span("sync.record_changes"):
+            record_changes(user, ChangeLog.Kind.CARD_STATE, [card.pk])
+
+        # 新規カードの学習開始を1日の新規カード数に数える
+        if old_state == CardState.State.NEW:
+            with span("quota.record_new_cards"):
+                quota.record_new_cards(user, [review_time])
+
+        return card_state
 
+    def _apply_review(
+        self,
+        card_state: CardState,
+        rating: int,
+        duration: int,
+        review_time: datetime
+    ) -> ReviewLog:
+        """
+        復習結果をCardStateに反映し、対応するReviewLogを返す（どちらも保存しない）
+        """
         # 復習前の状態を保存（ログ用）
         old_stability = card_state.stability
         old_difficulty = card_state.difficulty
@@ -138,16 +256,15 @@ class FSRSService:
         card_state.next_review = result_card.due
         card_state.last_review = review_time
         card_state.state = self._fsrs_state_to_card_state(result_card.state)
+        card_state.step = result_card.step
         # repsとlapsesは自分で管理（fsrs 6.xのCardには存在しない）
         card_state.reps += 1
         if rating == ReviewLog.Rating.AGAIN and card_state.state in [CardState.State.REVIEW, CardState.State.RELEARNING]:
             card_state.lapses += 1
-        card_state.save()
 
-        # ReviewLogを作成
-        ReviewLog.objects.create(
-            card=card,
-            user=user,
+        return ReviewLog(
+            card_id=card_state.card_id,
+            user_id=card_state.user_id,
             rating=rating,
             state=old_state,
             stability=old_stability,
@@ -158,8 +275,114 @@ class FSRSService:
             duration=duration,
         )
 
-        return card_state
+    @traced("fsrs.review_cards")
+    def review_cards(
+        self,
+        items: Iterable[tuple],
+        user: User
+    ) -> Dict[int, CardState]:
+        """
+        複数の復習をまとめて記録
+
+        CardStateを1クエリで読み込み、復習日時の順にスケジューリングしたうえで
+        bulk_create / bulk_update により1トランザクションで保存する。
+        同じカードへの複数回の復習も順に適用される。
+
+        Args:
+            items: (card_id, rating, duration, review_time) の列
+                   review_timeがNoneの場合は現在時刻
+                   5番目の要素にはクライアント側の復習ID（ReviewLog.client_review_id）を指定できる
+            user: 学習するユーザー
 
+        Returns:
+            {card_id: 更新後のCardState} の辞書
+
+        Raises:
+            ValueError: 評価が1〜4でない復習を含む場合（何も保存しない）
+        """
+        now = timezone.now()
+        items = sorted(
+            (
+                (card_id, rating, duration, review_time or now, *client_review_id)
+                for card_id, rating, duration, review_time, *client_review_id in items
+            ),
+            key=lambda item: item[3],
+        )
+        if not items:
+            return {}
+        invalid = sorted({item[1] for item in items} - set(ReviewLog.Rating.values))
+        if invalid:
+            raise ValueError(f"評価は1〜4で指定してください: {invalid}")
+
+        card_ids = {item[0] for item in items}
+
+        with transaction.atomic():
+            cards = Card.objects.in_bulk(card_ids)
+            missing = card_ids - cards.keys()
+            if missing:
+                raise Card.DoesNotExist(f"カードが存在しません: {sorted(missing)}")
+
+            card_states = {
+                card_state.card_id: card_state
+                for card_state in CardState.objects.select_for_update().filter(
+                    user=user, card_id__in=card_ids
+                )
+            }
+            # 復習前の状態を保存（カウンタ更新用）
+            originals = {
+                card_id: (card_state.state, card_state.next_review)
+                for card_id, card_state in card_states.items()
+            }
+
+            created_states = []
+            review_logs = []
+            # 新規カードごとの最初の復習日時（1日の新規カード数用）
+            introduced = {}
+            for card_id, rating, duration, review_time, *client_review_id in items:
+                card_state = card_states.get(card_id)
+                if card_state is None:
+                    card_state = CardState(
+                        card=cards[card_id],
+                        user=user,
+                        stability=0.0,
+                        difficulty=0.0,
+                        state=CardState.State.NEW,
+                        due=review_time,
+                        next_review=review_time,
+                    )
+                    card_states[card_id] = card_state
+                    created_states.append(card_state)
+                if card_state.state == CardState.State.NEW:
+                    introduced.setdefault(card_id, review_time)
+                review_log = self._apply_review(card_state, rating, duration, review_time)
+                if client_review_id:
+                    review_log.client_review_id = client_review_id[0]
+                review_logs.append(review_log)
+
+            updated_states = [
+                card_states[card_id] for card_id in originals
+            ]
+            for card_state in updated_states:
+                # bulk_updateではauto_nowが反映されないため明示的に設定する
+                card_state.updated_at = now
+            CardState.objects.bulk_create(created_states)
+            CardState.objects.bulk_update(updated_states, self.CARD_STATE_FIELDS)
+            ReviewLog.objects.bulk_create(review_logs)
+
+            # デッキ件数カウンタを更新（デッキごとに1回）
+            counters.record_reviews(
+                user,
+                [
+                    (cards[card_id], *originals.get(card_id, (None, None)), card_state)
+                    for card_id, card_state in card_states.items()
+                ],
+            )
+            record_changes(user, ChangeLog.Kind.CARD_STATE, card_states)
+            quota.record_new_cards(user, introduced.values())
+
+        return card_states
+
+    @traced("fsrs.preview_intervals")
     def get_next_review_intervals(
         self,
         card: Card,
@@ -167,7 +390,7 @@ class FSRSService:
         review_time: Optional[datetime] = None
     ) -> dict:
         """
-        各評価に対する次回復習間隔を取得
+        各評価に対する次回復習間隔を取得（読み取り専用、CardStateは作成しない）
 
         Args:
             card: カード
@@ -180,40 +403,102 @@ class FSRSService:
         if review_time is None:
             review_time = timezone.now()
 
-        card_state = self.get_or_create_card_state(card, user)
+        card_state = CardState.objects.filter(card=card, user=user).first()
+        if card_state is None:
+            card_state = CardState(
+                card=card,
+                user=user,
+                state=CardState.State.NEW,
+                due=review_time,
+                next_review=review_time,
+            )
+        return self.preview_intervals(card_state, review_time)
+
+    def preview_intervals(self, card_state: CardState, review_time: datetime) -> dict:
+        """
+        CardStateに対する評価ごとの間隔表示をメモ化して返す
+
+        結果は状態・ステップ・安定性・難易度・経過日数とSchedulerの設定だけで
+        決まるため、これらを量子化したキーでキャッシュする。新規カードはすべて
+        同じキーになる。
+        """
         fsrs_card = self._card_state_to_fsrs_card(card_state)
+        elapsed_days = None
+        if fsrs_card.last_review is not None:
+            # fsrsは経過時間を切り捨ての整数日で扱う
+            elapsed_days = max((review_time - fsrs_card.last_review).days, 0)
+        stability = fsrs_card.stability
+        if stability is not None:
+            stability = _round_significant(stability, PREVIEW_STABILITY_DIGITS)
+        difficulty = fsrs_card.difficulty
+        if difficulty is not None:
+            difficulty = round(difficulty, PREVIEW_DIFFICULTY_DECIMALS)
+
+        scheduler = self._get_preview_scheduler()
+        key = (
+            self._preview_key,
+            fsrs_card.state,
+            fsrs_card.step,
+            stability,
+            difficulty,
+            elapsed_days,
+        )
+        intervals = interval_preview_cache.get(key)
+        current = current_span()
+        if current is not None:
+            current.set_attribute("cache_hit", intervals is not None)
+        if intervals is not None:
+            return dict(intervals)
+
+        # 量子化した値からカードを組み立てる（同じキーなら同じ結果になる）
+        last_review = None
+        if elapsed_days is not None:
+            last_review = review_time - timedelta(days=elapsed_days)
 
         intervals = {}
-
-        for rating in [Rating.Again, Rating.Hard, Rating.Good, Rating.Easy]:
+        for rating, rating_value in [
+            (Rating.Again, ReviewLog.Rating.AGAIN),
+            (Rating.Hard, ReviewLog.Rating.HARD),
+            (Rating.Good, ReviewLog.Rating.GOOD),
+            (Rating.Easy, ReviewLog.Rating.EASY),
+        ]:
             # 各評価でのスケジュールを計算（fsrs 6.xはタプル (Card, ReviewLog) を返す）
-            # fsrs 6.xのCardはstep, stability, difficulty, due, state, last_reviewのみ
-            result_card, _ = self.scheduler.review_card(
+            result_card, _ = scheduler.review_card(
                 FSRSCard(
-                    stability=fsrs_card.stability,
-                    difficulty=fsrs_card.difficulty,
-                    due=fsrs_card.due,
+                    card_id=fsrs_card.card_id,
+                    stability=stability,
+                    difficulty=difficulty,
+                    due=review_time,
                     state=fsrs_card.state,
                     step=fsrs_card.step,
-                    last_review=fsrs_card.last_review,
+                    last_review=last_review,
                 ),
                 rating,
                 review_time
             )
-
             interval_seconds = (result_card.due - review_time).total_seconds()
-
             # 日本語の間隔文字列に変換
-            rating_value = {
-                Rating.Again: ReviewLog.Rating.AGAIN,
-                Rating.Hard: ReviewLog.Rating.HARD,
-                Rating.Good: ReviewLog.Rating.GOOD,
-                Rating.Easy: ReviewLog.Rating.EASY,
-            }[rating]
-
             intervals[rating_value] = self._format_interval(interval_seconds)
 
-        return intervals
+        return dict(interval_preview_cache.put(key, intervals))
+
+    def _get_preview_scheduler(self) -> Scheduler:
+        """
+        間隔表示用のScheduler（ファジングなし）
+
+        ファジングは実際の復習時にだけ適用し、表示は同じ状態なら常に同じにする。
+        """
+        if self._preview_scheduler is None:
+            self._preview_scheduler = get_scheduler(
+                parameters=self.scheduler.parameters,
+                desired_retention=self.scheduler.desired_retention,
+                learning_steps=self.scheduler.learning_steps,
+                relearning_steps=self.scheduler.relearning_steps,
+                maximum_interval=self.scheduler.maximum_interval,
+                enable_fuzzing=False,
+            )
+            self._preview_key = scheduler_key(self._preview_scheduler)
+        return self._preview_scheduler
 
     def _format_interval(self, seconds: float) -> str:
         """秒数を日本語の間隔文字列に変換"""
@@ -231,7 +516,3 @@ class FSRSService:
                 return f"{int(days / 30)}ヶ月"
             else:
                 return f"{days / 365:.1f}年"
-
-
-# シングルトンインスタンス
-fsrs_service = FSRSService()
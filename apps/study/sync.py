@@ -0,0 +1,228 @@
+"""
+オフラインのクライアントとの差分同期
+
+デッキ・カード・学習状態を変更したら、同じトランザクション内で
+record_changesを呼び出して変更履歴（ChangeLog）に記録する。番号は
+ユーザーごとのChangeSequenceの行ロックを取って払い出すため、コミットより前に
+後の番号が見えることはなく、クライアントは最後に受け取った番号（同期トークン）
+より後の変更だけを取得すればよい。
+
+管理画面など、ここを通らない変更は記録されない。トークンを持たない
+クライアントには全件を返す（pull_changesのsinceがNone）。
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.decks.models import Deck
+from apps.cards.models import Card
+from .models import CardState, ChangeLog, ChangeSequence, ReviewLog
+
+# 1回の差分取得で返す変更の件数の上限
+PULL_LIMIT = 1000
+
+
+def _allocate(user, count: int) -> int:
+    """番号をcount個払い出し、最後の番号を返す（トランザクション終了までロックを保持）"""
+    updated = ChangeSequence.objects.filter(user=user).update(value=F("value") + count)
+    if not updated:
+        try:
+            with transaction.atomic():
+                ChangeSequence.objects.create(user=user, value=count)
+            return count
+        except IntegrityError:  # 同時に作成された
+            ChangeSequence.objects.filter(user=user).update(value=F("value") + count)
+    return ChangeSequence.objects.filter(user=user).values_list("value", flat=True).get()
+
+
+def record_changes(user, kind: int, object_ids: Iterable[int], deleted: bool = False):
+    """
+    変更を記録
+
+    Args:
+        user: 変更したデータの所有者
+        kind: ChangeLog.Kind
+        object_ids: 変更した対象のID（学習状態はカードID）
+        deleted: 削除した場合はTrue
+    """
+    object_ids = list(dict.fromkeys(object_ids))
+    if not object_ids:
+        return
+    # 呼び出し側のトランザクションに含める（セーブポイントは作らない）
+    with transaction.atomic(savepoint=False):
+        last = _allocate(user, len(object_ids))
+        first = last - len(object_ids) + 1
+        ChangeLog.objects.bulk_create([
+            ChangeLog(user=user, seq=first + index, kind=kind, object_id=object_id, deleted=deleted)
+            for index, object_id in enumerate(object_ids)
+        ])
+
+
+def current_token(user) -> int:
+    """ユーザーの最新の変更番号（変更がなければ0）"""
+    return (
+        ChangeSequence.objects.filter(user=user).values_list("value", flat=True).first() or 0
+    )
+
+
+@dataclass
+class SyncChanges:
+    """差分取得の結果"""
+
+    token: int
+    more: bool = False
+    decks: List[Deck] = field(default_factory=list)
+    cards: List[Card] = field(default_factory=list)
+    card_states: List[CardState] = field(default_factory=list)
+    # 対象ごとの削除されたID
+    deleted: Dict[str, List[int]] = field(
+        default_factory=lambda: {"decks": [], "cards": [], "card_states": []}
+    )
+
+
+_KIND_KEYS = {
+    ChangeLog.Kind.DECK: "decks",
+    ChangeLog.Kind.CARD: "cards",
+    ChangeLog.Kind.CARD_STATE: "card_states",
+}
+
+
+def pull_changes(user, since: Optional[int] = None, limit: int = PULL_LIMIT) -> SyncChanges:
+    """
+    同期トークンより後の変更を取得
+
+    sinceがNoneの場合は全件を返す。同じ対象への複数の変更は最新の1件にまとめ、
+    記録後に削除された対象は削除として返す。limit件を超える場合は
+    moreをTrueにし、返したところまでのトークンを返す。
+    """
+    if since is None:
+        # 先にトークンを読む（読み込み中の変更は次回の取得で再送される）
+        token = current_token(user)
+        return SyncChanges(
+            token=token,
+            decks=list(Deck.objects.filter(user=user).order_by("pk")),
+            cards=list(Card.objects.filter(deck__user=user).order_by("pk")),
+            card_states=list(CardState.objects.filter(user=user).order_by("card_id")),
+        )
+
+    logs = list(
+        ChangeLog.objects.filter(user=user, seq__gt=since)
+        .order_by("seq")
+        .values_list("seq", "kind", "object_id", "deleted")[:limit + 1]
+    )
+    more = len(logs) > limit
+    logs = logs[:limit]
+    result = SyncChanges(token=logs[-1][0] if logs else since, more=more)
+
+    latest = OrderedDict()
+    for _, kind, object_id, deleted in logs:
+        latest.pop((kind, object_id), None)
+        latest[(kind, object_id)] = deleted
+    changed = {kind: [] for kind in _KIND_KEYS}
+    for (kind, object_id), deleted in latest.items():
+        if deleted:
+            result.deleted[_KIND_KEYS[kind]].append(object_id)
+        else:
+            changed[kind].append(object_id)
+
+    querysets = {
+        ChangeLog.Kind.DECK: (Deck.objects.filter(user=user), "pk"),
+        ChangeLog.Kind.CARD: (Card.objects.filter(deck__user=user), "pk"),
+        ChangeLog.Kind.CARD_STATE: (CardState.objects.filter(user=user), "card_id"),
+    }
+    for kind, object_ids in changed.items():
+        if not object_ids:
+            continue
+        queryset, key = querysets[kind]
+        objects = {
+            getattr(item, key): item
+            for item in queryset.filter(**{f"{key}__in": object_ids})
+        }
+        key_name = _KIND_KEYS[kind]
+        setattr(result, key_name, [objects[pk] for pk in object_ids if pk in objects])
+        # 記録後に削除された対象
+        result.deleted[key_name].extend(pk for pk in object_ids if pk not in objects)
+    return result
+
+
+@dataclass
+class PushedReview:
+    """クライアントから送られた1件の復習"""
+
+    client_review_id: str
+    card_id: int
+    rating: int
+    duration: int
+    reviewed_at: datetime
+
+
+# 送られた復習の処理結果
+APPLIED = "applied"
+DUPLICATE = "duplicate"
+STALE = "stale"
+NOT_FOUND = "not_found"
+INVALID = "invalid"
+
+
+def push_reviews(service, user, reviews: List[PushedReview]) -> Dict[str, str]:
+    """
+    オフラインで行った復習をまとめて記録
+
+    FSRSService.review_cardsで復習日時の順に適用する。次の復習は記録しない。
+    - 記録済みのclient_review_id（再送）: duplicate
+    - 評価が1〜4でない復習: invalid
+    - 他のユーザーのカード・存在しないカード: not_found
+    - サーバーの最終復習日時より前の復習（他の端末で先に復習済み）: stale
+    未来の復習日時はサーバーの現在時刻に丸める。
+
+    Returns:
+        {client_review_id: 処理結果}
+    """
+    now = timezone.now()
+    results = {}
+    with transaction.atomic():
+        client_ids = [review.client_review_id for review in reviews]
+        recorded = set(
+            ReviewLog.objects.filter(user=user, client_review_id__in=client_ids)
+            .values_list("client_review_id", flat=True)
+        )
+        card_ids = {review.card_id for review in reviews}
+        owned = set(
+            Card.objects.filter(pk__in=card_ids, deck__user=user).values_list("pk", flat=True)
+        )
+        last_reviews = dict(
+            CardState.objects.select_for_update()
+            .filter(user=user, card_id__in=owned)
+            .values_list("card_id", "last_review")
+        )
+
+        items = []
+        for review in reviews:
+            if review.client_review_id in recorded or review.client_review_id in results:
+                results.setdefault(review.client_review_id, DUPLICATE)
+                continue
+            if review.rating not in ReviewLog.Rating.values:
+                results[review.client_review_id] = INVALID
+                continue
+            if review.card_id not in owned:
+                results[review.client_review_id] = NOT_FOUND
+                continue
+            reviewed_at = min(review.reviewed_at, now)
+            last_review = last_reviews.get(review.card_id)
+            if last_review is not None and reviewed_at < last_review:
+                results[review.client_review_id] = STALE
+                continue
+            results[review.client_review_id] = APPLIED
+            items.append((
+                review.card_id, review.rating, review.duration, reviewed_at,
+                review.client_review_id,
+            ))
+
+        service.review_cards(items, user)
+    return results
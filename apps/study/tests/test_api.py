@@ -0,0 +1,241 @@
+"""
+学習機能のJSON APIのテスト
+"""
+
+import json
+
+import pytest
+from django.urls import reverse
+from django.contrib.auth.models import User
+
+from apps.decks.models import Deck
+from apps.cards.models import Card
+from apps.study.models import CardState, ReviewLog, StudySession
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="testpass123"
+    )
+
+
+@pytest.fixture
+def other_user(db):
+    return User.objects.create_user(
+        username="otheruser",
+        email="other@example.com",
+        password="testpass123"
+    )
+
+
+@pytest.fixture
+def deck(user):
+    return Deck.objects.create(user=user, name="テストデッキ")
+
+
+@pytest.fixture
+def cards(deck):
+    return [
+        Card.objects.create(deck=deck, front=f"質問{index}", back=f"答え{index}")
+        for index in range(3)
+    ]
+
+
+@pytest.mark.django_db
+class TestAPIAccess:
+    """認証と所有者の確認のテスト"""
+
+    def test_requires_login(self, client, deck):
+        """未ログインでは401をJSONで返すことをテスト"""
+        response = client.get(reverse("study_api:queue", args=[deck.pk]))
+        assert response.status_code == 401
+        assert "error" in response.json()
+
+    def test_other_user_deck(self, client, other_user, deck, cards):
+        """他ユーザーのデッキは404をJSONで返すことをテスト"""
+        client.force_login(other_user)
+        response = client.get(reverse("study_api:card", args=[deck.pk, cards[0].pk]))
+        assert response.status_code == 404
+        assert response["Content-Type"] == "application/json"
+
+
+@pytest.mark.django_db
+class TestQueue:
+    """出題キューのテスト"""
+
+    def test_queue_page(self, client, user, deck, cards):
+        """セッションのキューからカードを出題順に返すことをテスト"""
+        client.force_login(user)
+        response = client.get(reverse("study_api:queue", args=[deck.pk]), {"limit": 2})
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data["version"] == 1
+        assert data["total"] == 3
+        session = StudySession.objects.get(user=user, deck=deck)
+        assert [card["id"] for card in data["cards"]] == session.card_ids[:2]
+        assert data["next"] == 2
+
+    def test_queue_field_selection(self, client, user, deck, cards):
+        """指定したフィールドだけを返すことをテスト"""
+        client.force_login(user)
+        response = client.get(
+            reverse("study_api:queue", args=[deck.pk]), {"fields": "id,front"}
+        )
+
+        assert all(set(card) == {"id", "front"} for card in response.json()["cards"])
+
+    def test_queue_unknown_field(self, client, user, deck, cards):
+        """不明なフィールドの指定は400を返すことをテスト"""
+        client.force_login(user)
+        response = client.get(
+            reverse("study_api:queue", args=[deck.pk]), {"fields": "id,state"}
+        )
+        assert response.status_code == 400
+
+    def test_queue_not_modified_until_answer(self, client, user, deck, cards):
+        """回答するまでは304を返し、回答後は新しいページを返すことをテスト"""
+        client.force_login(user)
+        url = reverse("study_api:queue", args=[deck.pk])
+        response = client.get(url)
+        etag = response["ETag"]
+
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        first = response.json()["cards"][0]["id"]
+        client.post(reverse("study_api:answer", args=[deck.pk, first]), {"rating": 3})
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response.json()["position"] == 2
+
+
+@pytest.mark.django_db
+class TestCardDetail:
+    """カードの取得のテスト"""
+
+    def test_card_with_state(self, client, user, deck, cards):
+        """カードの内容と学習状態を返すことをテスト"""
+        CardState.objects.create(card=cards[0], user=user, state=CardState.State.REVIEW, reps=2)
+        client.force_login(user)
+        response = client.get(reverse("study_api:card", args=[deck.pk, cards[0].pk]))
+
+        card = response.json()["card"]
+        assert card["front"] == "質問0"
+        assert card["back"] == "答え0"
+        assert card["state"]["state"] == CardState.State.REVIEW
+        assert card["state"]["reps"] == 2
+
+    def test_card_without_back(self, client, user, deck, cards):
+        """答えを省いて取得できることをテスト"""
+        client.force_login(user)
+        response = client.get(
+            reverse("study_api:card", args=[deck.pk, cards[0].pk]), {"fields": "id,front"}
+        )
+
+        assert response.json()["card"] == {"id": cards[0].pk, "front": "質問0"}
+        assert "答え0" not in response.content.decode()
+
+    def test_card_conditional_get(self, client, user, deck, cards):
+        """ETagとLast-Modifiedが一致すれば304を返し、更新後は200を返すことをテスト"""
+        client.force_login(user)
+        url = reverse("study_api:card", args=[deck.pk, cards[0].pk])
+        response = client.get(url)
+        etag = response["ETag"]
+        last_modified = response["Last-Modified"]
+
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+        assert client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code == 304
+
+        # 回答で学習状態が変わるとETagも変わる
+        client.post(reverse("study_api:answer", args=[deck.pk, cards[0].pk]), {"rating": 3})
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+
+    def test_etag_depends_on_fields(self, client, user, deck, cards):
+        """フィールドの指定が異なれば別のETagになることをテスト"""
+        client.force_login(user)
+        url = reverse("study_api:card", args=[deck.pk, cards[0].pk])
+        full = client.get(url)["ETag"]
+        compact = client.get(url, {"fields": "id,front"})["ETag"]
+        assert full != compact
+
+
+@pytest.mark.django_db
+class TestIntervals:
+    """復習間隔の取得のテスト"""
+
+    def test_intervals(self, client, user, deck, cards):
+        """評価ごとの間隔を返し、学習状態は作成しないことをテスト"""
+        client.force_login(user)
+        url = reverse("study_api:intervals", args=[deck.pk, cards[0].pk])
+        response = client.get(url)
+
+        assert set(response.json()["intervals"]) == {"1", "2", "3", "4"}
+        assert not CardState.objects.filter(card=cards[0], user=user).exists()
+        assert client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 304
+
+
+@pytest.mark.django_db
+class TestAnswer:
+    """回答のテスト"""
+
+    def test_answer_json(self, client, user, deck, cards):
+        """JSONで回答すると復習を記録し、次のカードを返すことをテスト"""
+        client.force_login(user)
+        client.get(reverse("study_api:queue", args=[deck.pk]))
+        session = StudySession.objects.get(user=user, deck=deck)
+        first, second = session.card_ids[:2]
+
+        response = client.post(
+            reverse("study_api:answer", args=[deck.pk, first]),
+            json.dumps({"rating": ReviewLog.Rating.GOOD, "duration": 4200}),
+            content_type="application/json",
+        )
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data["next_card"] == second
+        assert data["next_url"] == reverse("study_api:card", args=[deck.pk, second])
+        assert data["finished"] is False
+        assert data["card"]["state"]["reps"] == 1
+        review_log = ReviewLog.objects.get(card_id=first, user=user)
+        assert review_log.duration == 4200
+
+    def test_answer_last_card(self, client, user, deck, cards):
+        """最後のカードに回答すると終了し、セッションを削除することをテスト"""
+        client.force_login(user)
+        client.get(reverse("study_api:queue", args=[deck.pk]))
+        card_id = StudySession.objects.get(user=user, deck=deck).current_card_id
+
+        # 学習中のカードは末尾に戻るため、Goodで学習を終えるまで回答する
+        answers = 0
+        while card_id is not None and answers < 10:
+            response = client.post(
+                reverse("study_api:answer", args=[deck.pk, card_id]), {"rating": 3}
+            )
+            card_id = response.json()["next_card"]
+            answers += 1
+
+        assert answers == 2 * len(cards)
+        assert response.json()["finished"] is True
+        assert response.json()["next_card"] is None
+        assert not StudySession.objects.filter(user=user, deck=deck).exists()
+
+    @pytest.mark.parametrize("data", [{"rating": 5}, {"rating": "good"}, {}])
+    def test_answer_invalid_rating(self, client, user, deck, cards, data):
+        """不正な評価は400を返し、復習を記録しないことをテスト"""
+        client.force_login(user)
+        response = client.post(reverse("study_api:answer", args=[deck.pk, cards[0].pk]), data)
+
+        assert response.status_code == 400
+        assert not ReviewLog.objects.filter(user=user).exists()
+
+    def test_answer_requires_post(self, client, user, deck, cards):
+        """GETでは回答できないことをテスト"""
+        client.force_login(user)
+        response = client.get(reverse("study_api:answer", args=[deck.pk, cards[0].pk]))
+        assert response.status_code == 405
@@ -0,0 +1,122 @@
+"""
+性能計測（seed_bench / bench コマンドと計測関数）のテスト
+"""
+
+import json
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from apps.cards.models import Card
+from apps.study.bench import find_regressions, measure, percentile, seed_benchmark_data
+from apps.study.models import CardState, DeckUserCounters, ReviewLog
+
+
+def test_percentile():
+    """最近傍法のパーセンタイルをテスト"""
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.95) == 95
+    assert percentile([], 0.5) is None
+
+
+def test_measure_reports_throughput_and_memory():
+    """処理速度とメモリ割り当て量が計測されることをテスト"""
+    result = measure(lambda: [0] * 100_000, min_seconds=0.01)
+
+    assert result["rounds"] >= 3
+    assert result["ops_per_sec"] > 0
+    # 約800KiBのリストを確保する
+    assert result["peak_kib"] > 700
+
+
+def test_find_regressions():
+    """基準値から劣化した項目だけが報告されることをテスト"""
+    baseline = {
+        "fast": {"ops_per_sec": 1000, "peak_kib": 10},
+        "lean": {"ops_per_sec": 1000, "peak_kib": 1000},
+    }
+    results = {
+        "fast": {"ops_per_sec": 400, "peak_kib": 10},
+        "lean": {"ops_per_sec": 900, "peak_kib": 2000},
+        "unknown": {"ops_per_sec": 1, "peak_kib": 1},
+    }
+
+    regressions = find_regressions(results, baseline, tolerance=0.5)
+
+    assert len(regressions) == 2
+    assert regressions[0].startswith("fast:")
+    assert regressions[1].startswith("lean:")
+
+
+@pytest.mark.django_db
+class TestSeedBench:
+    """seed_benchコマンドのテストクラス"""
+
+    def test_seed_creates_requested_sizes(self):
+        """指定した件数のデータと復習履歴が作成されることをテスト"""
+        out = StringIO()
+        call_command(
+            "seed_bench", users=2, decks_per_user=2, cards_per_deck=20,
+            seen_ratio=0.5, stdout=out,
+        )
+        created = json.loads(out.getvalue())
+
+        assert created["users"] == User.objects.count() == 2
+        assert created["cards"] == Card.objects.count() == 80
+        assert created["card_states"] == CardState.objects.count()
+        assert created["review_logs"] == ReviewLog.objects.count()
+        assert ReviewLog.objects.count() >= CardState.objects.count() > 0
+        # カウンタも作成される
+        assert DeckUserCounters.objects.count() == 4
+
+    def test_seed_is_deterministic(self):
+        """同じ乱数の種なら同じ復習履歴になることをテスト"""
+        first = seed_benchmark_data(users=1, decks_per_user=1, cards_per_deck=30, seed=1, username_prefix="a")
+        second = seed_benchmark_data(users=1, decks_per_user=1, cards_per_deck=30, seed=1, username_prefix="b")
+
+        assert first == second
+        ratings = [
+            list(ReviewLog.objects.filter(user__username=username).order_by("pk").values_list("rating", flat=True))
+            for username in ("a_0", "b_0")
+        ]
+        assert ratings[0] == ratings[1]
+
+    def test_seed_rejects_existing_prefix(self):
+        """既存の接頭辞ではエラーになることをテスト"""
+        seed_benchmark_data(users=1, decks_per_user=1, cards_per_deck=1)
+
+        with pytest.raises(CommandError):
+            call_command("seed_bench", users=1, stdout=StringIO())
+
+
+@pytest.mark.django_db
+class TestBench:
+    """benchコマンドのテストクラス"""
+
+    def test_bench_reports_all_views_and_rolls_back(self):
+        """全ビューの計測結果を出力し、回答による変更を残さないことをテスト"""
+        seed_benchmark_data(users=1, decks_per_user=1, cards_per_deck=10)
+        review_log_count = ReviewLog.objects.count()
+
+        out = StringIO()
+        call_command("bench", iterations=2, answers=3, stdout=out)
+        result = json.loads(out.getvalue())
+
+        assert set(result["views"]) == {
+            "deck_list", "deck_detail", "study_session",
+            "study_card", "answer_card", "study_complete",
+        }
+        assert result["views"]["answer_card"]["count"] == 6
+        for stats in result["views"].values():
+            assert stats["p50_ms"] <= stats["p95_ms"]
+            assert stats["queries_max"] > 0
+        assert ReviewLog.objects.count() == review_log_count
+
+    def test_bench_requires_seeded_user(self):
+        """計測用ユーザーがいない場合はエラーになることをテスト"""
+        with pytest.raises(CommandError):
+            call_command("bench", stdout=StringIO())
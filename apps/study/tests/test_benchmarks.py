@@ -0,0 +1,232 @@
+"""
+FSRSServiceと出題キューのマイクロベンチマーク
+
+通常のテスト実行では除外される（pytest.iniのaddopts）。実行方法:
+
+    pytest -m benchmark apps/study/tests/test_benchmarks.py
+
+結果はbenchmark_baseline.jsonの基準値と比較し、ops/secが基準値の
+(1 - BENCH_TOLERANCE)倍を下回るか、ピークメモリが(1 + BENCH_TOLERANCE)倍を
+超えると失敗する。基準値は実行環境に依存するため、環境を変えた場合や
+意図的に性能が変わった場合は BENCH_UPDATE_BASELINE=1 で書き換える。
+"""
+
+import json
+import os
+import random
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from apps.cards.models import Card
+from apps.decks.models import Deck
+from apps.study import counters, new_cards
+from apps.study.bench import find_regressions, measure
+from apps.study.models import CardState, ReviewLog
+from apps.study.services import FSRSService, interval_preview_cache
+from apps.study.views import get_study_cards
+
+pytestmark = pytest.mark.benchmark
+
+BASELINE_PATH = Path(__file__).with_name("benchmark_baseline.json")
+DECK_SIZES = [100, 10_000, 100_000]
+TOLERANCE = float(os.environ.get("BENCH_TOLERANCE", "0.5"))
+UPDATE_BASELINE = os.environ.get("BENCH_UPDATE_BASELINE") == "1"
+
+
+def load_baseline():
+    """保存済みの基準値を読み込む"""
+    if not BASELINE_PATH.exists():
+        return {}
+    return json.loads(BASELINE_PATH.read_text(encoding="utf-8"))["results"]
+
+
+@pytest.fixture(scope="module")
+def benchmark_results():
+    """計測結果を集め、BENCH_UPDATE_BASELINE=1の場合は基準値として保存"""
+    results = {}
+    yield results
+    if UPDATE_BASELINE and results:
+        baseline = load_baseline()
+        baseline.update(results)
+        BASELINE_PATH.write_text(
+            json.dumps(
+                {"tolerance": TOLERANCE, "results": dict(sorted(baseline.items()))},
+                ensure_ascii=False,
+                indent=2,
+            ) + "\n",
+            encoding="utf-8",
+        )
+
+
+@pytest.fixture
+def check_benchmark(benchmark_results, capsys):
+    """計測結果を記録し、基準値から劣化していれば失敗させる"""
+    def check(name, result):
+        benchmark_results[name] = result
+        with capsys.disabled():
+            print(f"\n{name}: {json.dumps(result)}")
+        if UPDATE_BASELINE:
+            return
+        regressions = find_regressions({name: result}, load_baseline(), TOLERANCE)
+        assert not regressions, "性能が劣化しました: " + "; ".join(regressions)
+
+    return check
+
+
+@pytest.fixture(scope="module", params=DECK_SIZES, ids=str)
+def bench_deck(request, django_db_setup, django_db_blocker):
+    """
+    指定枚数のデッキ（半数が学習済み、学習済みの半数が復習期限切れ）
+
+    作成に時間がかかるため、同じ枚数のテストでは使い回す。
+    """
+    size = request.param
+    rng = random.Random(size)
+    now = timezone.now()
+
+    with django_db_blocker.unblock():
+        user = User.objects.create_user(username=f"bench_{size}", password="benchpass123")
+        deck = Deck.objects.create(user=user, name=f"ベンチマーク{size}")
+        cards = Card.objects.bulk_create(
+            [Card(deck=deck, front=f"質問{index}", back=f"答え{index}") for index in range(size)],
+            batch_size=5000,
+        )
+        card_states = []
+        for card in cards[: size // 2]:
+            due = now + timedelta(days=rng.uniform(-10, 10))
+            card_states.append(CardState(
+                card=card,
+                user=user,
+                stability=rng.uniform(1, 100),
+                difficulty=rng.uniform(1, 10),
+                state=CardState.State.REVIEW,
+                due=due,
+                next_review=due,
+                last_review=due - timedelta(days=rng.uniform(1, 30)),
+                reps=rng.randint(1, 20),
+            ))
+        CardState.objects.bulk_create(card_states, batch_size=5000)
+        counters.rebuild_counters([deck], user)
+
+    yield user, deck, cards
+
+    with django_db_blocker.unblock():
+        user.delete()
+
+
+@pytest.fixture(scope="module")
+def mostly_seen_deck(django_db_setup, django_db_blocker):
+    """
+    10万枚のうち作成順に90%を学習済みのデッキ
+
+    学習が進んだ大きなデッキで、残りの新規カードを探す場合の計測用。
+    """
+    size = 100_000
+    now = timezone.now()
+
+    with django_db_blocker.unblock():
+        user = User.objects.create_user(username="bench_seen", password="benchpass123")
+        deck = Deck.objects.create(user=user, name="ベンチマーク学習済み")
+        cards = Card.objects.bulk_create(
+            [Card(deck=deck, front=f"質問{index}", back=f"答え{index}") for index in range(size)],
+            batch_size=5000,
+        )
+        CardState.objects.bulk_create(
+            [
+                CardState(
+                    card=card, user=user, state=CardState.State.REVIEW,
+                    due=now + timedelta(days=30), next_review=now + timedelta(days=30),
+                    last_review=now - timedelta(days=1), reps=1,
+                )
+                for card in cards[: size * 9 // 10]
+            ],
+            batch_size=5000,
+        )
+
+    yield user, deck
+
+    with django_db_blocker.unblock():
+        user.delete()
+
+
+def test_card_state_to_fsrs_card(check_benchmark):
+    """CardStateからfsrsのCardへの変換"""
+    service = FSRSService()
+    card_state = CardState(
+        card_id=1,
+        stability=12.3,
+        difficulty=4.5,
+        state=CardState.State.REVIEW,
+        last_review=timezone.now() - timedelta(days=3),
+    )
+
+    check_benchmark(
+        "card_state_to_fsrs_card",
+        measure(lambda: service._card_state_to_fsrs_card(card_state)),
+    )
+
+
+@pytest.mark.django_db
+def test_review_card(bench_deck, check_benchmark):
+    """学習済みカードの復習（CardState・ReviewLog・カウンタの更新を含む）"""
+    user, deck, cards = bench_deck
+    service = FSRSService()
+    reviewed = iter(cards[: len(cards) // 2] * 100)
+
+    check_benchmark(
+        f"review_card[{len(cards)}]",
+        measure(lambda: service.review_card(next(reviewed), user, ReviewLog.Rating.GOOD)),
+    )
+
+
+@pytest.mark.parametrize("cache", ["warm", "cold"])
+@pytest.mark.django_db
+def test_get_next_review_intervals(bench_deck, check_benchmark, cache):
+    """回答ボタンの間隔表示（warm: キャッシュあり / cold: 毎回キャッシュを破棄）"""
+    user, deck, cards = bench_deck
+    service = FSRSService()
+    card = cards[0]
+
+    def preview():
+        if cache == "cold":
+            interval_preview_cache.clear()
+        return service.get_next_review_intervals(card, user)
+
+    check_benchmark(f"get_next_review_intervals_{cache}[{len(cards)}]", measure(preview))
+
+
+@pytest.mark.django_db
+def test_get_study_cards(bench_deck, check_benchmark):
+    """出題キュー（期限切れ＋新規カード）の構築"""
+    user, deck, cards = bench_deck
+
+    check_benchmark(
+        f"get_study_cards[{len(cards)}]",
+        measure(lambda: get_study_cards(deck, user), min_seconds=0.2),
+    )
+
+
+@pytest.mark.django_db
+def test_new_card_ids_mostly_seen(mostly_seen_deck, check_benchmark):
+    """学習済み90%のデッキで次の新規カード20枚を取得（探索位置から範囲検索）"""
+    user, deck = mostly_seen_deck
+
+    check_benchmark(
+        "new_card_ids_90pct_seen[100000]",
+        measure(lambda: new_cards.new_card_ids(deck, user, 20)),
+    )
+
+
+@pytest.mark.django_db
+def test_count_new_cards_mostly_seen(mostly_seen_deck, check_benchmark):
+    """学習済み90%のデッキの新規カード数"""
+    user, deck = mostly_seen_deck
+
+    check_benchmark(
+        "count_new_cards_90pct_seen[100000]",
+        measure(lambda: new_cards.count_new_cards(deck, user), min_seconds=0.2),
+    )
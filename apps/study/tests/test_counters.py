@@ -0,0 +1,241 @@
+"""
+デッキ件数カウンタのテスト
+"""
+
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import UserProfile
+from apps.decks.models import Deck
+from apps.cards.models import Card
+from apps.study import counters
+from apps.study.models import CardState, DeckUserCounters, ReviewLog, due_cutoff
+from apps.study.services import FSRSService
+from apps.study.views import get_study_card_ids
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="testpass123"
+    )
+
+
+@pytest.fixture
+def deck(user):
+    deck = Deck.objects.create(user=user, name="テストデッキ")
+    for i in range(3):
+        Card.objects.create(deck=deck, front=f"質問{i}", back=f"答え{i}")
+    return deck
+
+
+@pytest.mark.django_db
+class TestDeckUserCounters:
+    """DeckUserCountersのテストクラス"""
+
+    def test_rebuild_counts(self, user, deck):
+        """再集計で状態別の件数が求まることをテスト"""
+        now = timezone.now()
+        cards = list(deck.cards.order_by("pk"))
+        CardState.objects.create(
+            card=cards[0], user=user, state=CardState.State.REVIEW,
+            next_review=now - timedelta(days=1),
+        )
+        CardState.objects.create(
+            card=cards[1], user=user, state=CardState.State.LEARNING,
+            next_review=now + timedelta(days=3),
+        )
+
+        counters.rebuild_counters([deck], user)
+        row = DeckUserCounters.objects.get(deck=deck, user=user)
+
+        assert row.total_count == 3
+        assert row.new_count == 1
+        assert row.learning_count == 1
+        assert row.review_count == 1
+        assert row.due_count == 1
+        assert row.due_buckets == {timezone.localdate(now + timedelta(days=3)).isoformat(): 1}
+
+    def test_review_updates_counters_incrementally(self, user, deck):
+        """復習のたびに差分更新した結果が再集計と一致することをテスト"""
+        counters.rebuild_counters([deck], user)
+        service = FSRSService()
+        cards = list(deck.cards.order_by("pk"))
+
+        service.review_card(cards[0], user, ReviewLog.Rating.AGAIN)
+        service.review_card(cards[1], user, ReviewLog.Rating.EASY)
+        service.review_card(cards[0], user, ReviewLog.Rating.GOOD)
+
+        row = DeckUserCounters.objects.get(deck=deck, user=user)
+        assert row.new_count == 1
+        assert row.learning_count + row.review_count == 2
+        assert counters.find_counter_mismatches([deck], user) == []
+
+    def test_review_creates_missing_counters(self, user, deck):
+        """カウンタがない場合は復習時に集計して作成されることをテスト"""
+        FSRSService().review_card(deck.cards.first(), user, ReviewLog.Rating.GOOD)
+
+        row = DeckUserCounters.objects.get(deck=deck, user=user)
+        assert row.total_count == 3
+        assert row.new_count == 2
+        assert counters.find_counter_mismatches([deck], user) == []
+
+    def test_review_does_not_load_deck(self, user, deck):
+        """復習のカウンタ更新でデッキを読み込まないことをテスト"""
+        counters.rebuild_counters([deck], user)
+        card = Card.objects.get(pk=deck.cards.first().pk)
+        service = FSRSService()
+
+        with CaptureQueriesContext(connection) as queries:
+            service.review_card(card, user, ReviewLog.Rating.GOOD)
+            service.review_cards([(card.pk, ReviewLog.Rating.GOOD, 0, None)], user)
+
+        assert not [query for query in queries if "decks_deck" in query["sql"]]
+        assert counters.find_counter_mismatches([deck], user) == []
+
+    def test_roll_over_moves_buckets(self, user, deck):
+        """繰り越しで当日までのバケットが復習待ちに加わることをテスト"""
+        today = timezone.localdate()
+        row = DeckUserCounters.objects.create(
+            deck=deck,
+            user=user,
+            due_count=1,
+            due_date=today - timedelta(days=2),
+            due_buckets={
+                (today - timedelta(days=1)).isoformat(): 2,
+                today.isoformat(): 3,
+                (today + timedelta(days=1)).isoformat(): 4,
+            },
+        )
+
+        assert row.due_count_on(today) == 6
+        assert counters.roll_over_all_counters(today) == 1
+
+        row.refresh_from_db()
+        assert row.due_count == 6
+        assert row.due_date == today
+        assert row.due_buckets == {(today + timedelta(days=1)).isoformat(): 4}
+
+    def test_check_command_detects_mismatch(self, user, deck):
+        """整合性チェックで食い違いが検出されることをテスト"""
+        counters.rebuild_counters([deck], user)
+        call_command("rebuild_deck_counters", "--check")
+
+        DeckUserCounters.objects.filter(deck=deck).update(total_count=99)
+        with pytest.raises(CommandError):
+            call_command("rebuild_deck_counters", "--check")
+
+        call_command("rebuild_deck_counters")
+        assert DeckUserCounters.objects.get(deck=deck).total_count == 3
+
+
+@pytest.mark.django_db
+class TestCounterViews:
+    """カード追加・削除とデッキ表示のカウンタ連携テスト"""
+
+    def test_card_create_and_delete_update_counters(self, client, user, deck):
+        """ビューからのカード追加・削除でカウンタが更新されることをテスト"""
+        counters.rebuild_counters([deck], user)
+        client.force_login(user)
+
+        client.post(
+            reverse("cards:card_create", args=[deck.pk]),
+            {"front": "追加", "back": "答え"},
+        )
+        row = DeckUserCounters.objects.get(deck=deck, user=user)
+        assert row.total_count == 4
+        assert row.new_count == 4
+
+        card = deck.cards.first()
+        FSRSService().review_card(card, user, ReviewLog.Rating.GOOD)
+        client.post(reverse("cards:card_delete", args=[card.pk]))
+
+        row.refresh_from_db()
+        assert row.total_count == 3
+        assert row.new_count == 3
+        assert row.learning_count + row.review_count == 0
+        assert counters.find_counter_mismatches([deck], user) == []
+
+    def test_deck_list_reads_counters(self, client, user, deck):
+        """デッキ一覧の件数はカウンタから読まれることをテスト"""
+        counters.rebuild_counters([deck], user)
+        DeckUserCounters.objects.filter(deck=deck).update(total_count=42)
+        client.force_login(user)
+
+        response = client.get(reverse("decks:deck_list"))
+        assert response.context["decks"][0].card_count == 42
+
+    def test_due_count_matches_study_queue(self, client, user, deck):
+        """一覧の「今日の復習」と出題キューが同じ定義であることをテスト"""
+        now = timezone.now()
+        overdue, later_today, tomorrow = deck.cards.order_by("pk")
+        for card, next_review in [
+            (overdue, now - timedelta(hours=1)),
+            (later_today, due_cutoff(now) - timedelta(seconds=1)),
+            (tomorrow, due_cutoff(now) + timedelta(hours=1)),
+        ]:
+            CardState.objects.create(
+                card=card, user=user, state=CardState.State.REVIEW,
+                due=next_review, next_review=next_review,
+            )
+        client.force_login(user)
+
+        response = client.get(reverse("decks:deck_list"))
+        assert response.context["decks"][0].due_card_count == 2
+        assert Deck.objects.get(pk=deck.pk).due_card_count == 2
+        # 期限切れのカードが先、今日のうちに期限が来るカードは最後
+        assert get_study_card_ids(deck, user) == [overdue.pk, later_today.pk]
+
+    def test_due_count_uses_user_timezone(self, client, user, deck):
+        """「今日の復習」の区切りがサーバーではなくユーザーのタイムゾーンであることをテスト"""
+        UserProfile.objects.create(user=user, timezone="America/Los_Angeles")
+        tz = ZoneInfo("America/Los_Angeles")
+        now = timezone.now()
+        # サーバー（Asia/Tokyo）の日付の区切りとずれるため、どちらかは判定が変わる
+        overdue, before_cutoff, at_cutoff = deck.cards.order_by("pk")
+        for card, next_review in [
+            (overdue, now - timedelta(hours=1)),
+            (before_cutoff, due_cutoff(now, tz) - timedelta(seconds=1)),
+            (at_cutoff, due_cutoff(now, tz)),
+        ]:
+            CardState.objects.create(
+                card=card, user=user, state=CardState.State.REVIEW,
+                due=next_review, next_review=next_review,
+            )
+        client.force_login(user)
+
+        response = client.get(reverse("decks:deck_list"))
+        assert response.context["decks"][0].due_card_count == 2
+        assert Deck.objects.get(pk=deck.pk).due_card_count == 2
+        assert Deck.objects.with_study_counts(user).get(pk=deck.pk).due_card_count == 2
+        assert get_study_card_ids(deck, user) == [overdue.pk, before_cutoff.pk]
+        assert counters.find_counter_mismatches([deck], user) == []
+
+    def test_roll_over_uses_user_timezone(self, user, deck):
+        """定期実行の繰り越しは各ユーザーのタイムゾーンの今日まで進めることをテスト"""
+        UserProfile.objects.create(user=user, timezone="Pacific/Kiritimati")
+        today = timezone.localdate(timezone=ZoneInfo("Pacific/Kiritimati"))
+        DeckUserCounters.objects.create(
+            deck=deck,
+            user=user,
+            due_date=today - timedelta(days=1),
+            due_buckets={today.isoformat(): 3},
+        )
+
+        assert counters.roll_over_all_counters() == 1
+
+        row = DeckUserCounters.objects.get(deck=deck, user=user)
+        assert row.due_date == today
+        assert row.due_count == 3
+        assert row.due_buckets == {}
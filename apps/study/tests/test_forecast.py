@@ -0,0 +1,134 @@
+"""
+保持率・復習量予測のテスト
+"""
+
+import time
+from datetime import timedelta
+
+import numpy as np
+import pytest
+from django.contrib.auth.models import User
+from django.utils import timezone
+from fsrs import Card as FSRSCard, Scheduler, State
+
+from apps.decks.models import Deck
+from apps.cards.models import Card
+from apps.study.forecast import CollectionForecast
+from apps.study.models import CardState, ReviewLog
+from apps.study.services import FSRSService
+
+
+class TestCollectionForecast:
+    """CollectionForecastのテストクラス"""
+
+    def test_retrievability_matches_fsrs(self):
+        """保持率がfsrsライブラリの計算と一致することをテスト"""
+        now = timezone.now()
+        scheduler = Scheduler()
+        stabilities = [0.5, 2.0, 10.0, 150.0]
+        elapsed = [timedelta(hours=3), timedelta(days=1, hours=5), timedelta(days=12), timedelta(days=400)]
+
+        forecast = CollectionForecast(
+            stability=stabilities,
+            difficulty=[5.0] * 4,
+            last_review=[(now - delta).timestamp() for delta in elapsed],
+            due=[now.timestamp()] * 4,
+            scheduler=scheduler,
+        )
+        expected = [
+            scheduler.get_card_retrievability(
+                FSRSCard(state=State.Review, stability=stability, difficulty=5.0, last_review=now - delta),
+                now,
+            )
+            for stability, delta in zip(stabilities, elapsed)
+        ]
+
+        np.testing.assert_allclose(forecast.retrievability(now), expected, rtol=1e-12)
+
+    def test_unreviewed_cards_have_zero_retrievability(self):
+        """未復習のカードは保持率0で、平均から除外されることをテスト"""
+        now = timezone.now()
+        forecast = CollectionForecast(
+            stability=[0.0, 5.0],
+            difficulty=[0.0, 5.0],
+            last_review=[np.nan, (now - timedelta(days=5)).timestamp()],
+            due=[now.timestamp(), now.timestamp()],
+        )
+
+        retrievability = forecast.retrievability(now)
+        assert retrievability[0] == 0
+        assert forecast.expected_recall(now) == pytest.approx(retrievability[1])
+
+    def test_next_intervals_match_fsrs(self):
+        """次回間隔がfsrsライブラリの計算と一致することをテスト"""
+        scheduler = Scheduler(desired_retention=0.85, maximum_interval=365)
+        stabilities = [0.1, 1.0, 7.5, 80.0, 5000.0]
+        forecast = CollectionForecast(
+            stability=stabilities,
+            difficulty=[5.0] * 5,
+            last_review=[0.0] * 5,
+            due=[0.0] * 5,
+            scheduler=scheduler,
+        )
+
+        expected = [scheduler._next_interval(stability=s) for s in stabilities]
+        np.testing.assert_array_equal(forecast.next_intervals(), expected)
+
+    def test_due_per_day(self):
+        """日ごとの復習予定数（期限切れは0日目）をテスト"""
+        now = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+        dues = [now - timedelta(days=3), now, now + timedelta(days=1), now + timedelta(days=40)]
+        forecast = CollectionForecast(
+            stability=[1.0] * 4,
+            difficulty=[5.0] * 4,
+            last_review=[now.timestamp()] * 4,
+            due=[due.timestamp() for due in dues],
+        )
+
+        assert forecast.due_per_day(days=3, now=now).tolist() == [2, 1, 0]
+
+    @pytest.mark.benchmark
+    def test_million_cards_under_one_second(self):
+        """
+        100万枚の保持率・予測が1秒以内に計算できることをテスト
+
+        実行時間は環境に依存するため通常のテストからは除外する
+        （pytest -m benchmark で実行）。
+        """
+        rng = np.random.default_rng(0)
+        size = 1_000_000
+        now = timezone.now()
+        forecast = CollectionForecast(
+            stability=rng.uniform(0.1, 365, size),
+            difficulty=rng.uniform(1, 10, size),
+            last_review=now.timestamp() - rng.uniform(0, 365, size) * 86400,
+            due=now.timestamp() + rng.uniform(-30, 365, size) * 86400,
+        )
+
+        start = time.perf_counter()
+        forecast.summary(now=now)
+        assert time.perf_counter() - start < 1.0
+
+
+@pytest.mark.django_db
+class TestCollectionForecastForUser:
+    """CardStateからの読み込みのテスト"""
+
+    def test_for_user(self):
+        """ユーザーのCardStateが配列として読み込まれることをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        reviewed = Card.objects.create(deck=deck, front="質問1", back="答え1")
+        unreviewed = Card.objects.create(deck=deck, front="質問2", back="答え2")
+        FSRSService().review_card(reviewed, user, ReviewLog.Rating.GOOD)
+        CardState.objects.create(card=unreviewed, user=user)
+
+        forecast = CollectionForecast.for_user(user, deck=deck)
+
+        assert len(forecast) == 2
+        assert forecast.studied.sum() == 1
+        assert 0 < forecast.expected_recall() <= 1
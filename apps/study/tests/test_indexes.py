@@ -0,0 +1,119 @@
+"""
+スケジューリング用クエリのインデックス利用テスト
+
+実際に発行されたSQLを記録し、EXPLAIN QUERY PLANで
+学習状態・復習履歴テーブルの検索にインデックスが使われていることを確認する。
+"""
+
+import re
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.decks.models import Deck
+from apps.cards.models import Card
+from apps.study.services import FSRSService
+from apps.study.views import get_study_card_ids
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != "sqlite", reason="EXPLAIN QUERY PLANはSQLite専用"
+)
+
+
+def explain_plans(captured):
+    """記録したクエリごとのEXPLAIN QUERY PLANの出力を返す"""
+    plans = []
+    with connection.cursor() as cursor:
+        for query in captured:
+            cursor.execute("EXPLAIN QUERY PLAN " + query["sql"])
+            plans.append("\n".join(row[-1] for row in cursor.fetchall()))
+    return plans
+
+
+def assert_table_uses_index(plans, table):
+    """tableを参照するすべての計画でインデックス検索になっていることを確認"""
+    pattern = re.compile(rf"\b{re.escape(table)}\b")
+    steps = [
+        line
+        for plan in plans
+        for line in plan.splitlines()
+        if pattern.search(line)
+    ]
+    assert steps, f"{table}を参照するクエリがありません: {plans}"
+    for step in steps:
+        # 主キー（rowid）での検索もインデックス検索として扱う
+        assert "USING" in step and ("INDEX" in step or "PRIMARY KEY" in step), step
+        assert not step.startswith("SCAN"), step
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="testpass123"
+    )
+
+
+@pytest.fixture
+def deck(user):
+    deck = Deck.objects.create(user=user, name="テストデッキ")
+    cards = [Card.objects.create(deck=deck, front=f"質問{i}", back="答え") for i in range(3)]
+    FSRSService().review_card(cards[0], user, 3)
+    return deck
+
+
+@pytest.mark.django_db
+class TestSchedulingIndexes:
+    """スケジューリング用クエリのテストクラス"""
+
+    def test_study_queue_uses_indexes(self, user, deck):
+        """出題キューの構築でインデックスが使われる"""
+        with CaptureQueriesContext(connection) as captured:
+            get_study_card_ids(deck, user)
+
+        assert_table_uses_index(explain_plans(captured), "study_cardstate")
+
+    def test_due_card_count_uses_index(self, user, deck):
+        """復習待ち件数の集計でインデックスが使われる"""
+        with CaptureQueriesContext(connection) as captured:
+            deck.due_card_count
+
+        plans = explain_plans(captured)
+        assert_table_uses_index(plans, "study_cardstate")
+        assert "cardstate_user_next_review" in "\n".join(plans)
+
+    def test_new_card_count_uses_index(self, user, deck):
+        """新規カード件数の集計でインデックスが使われる"""
+        with CaptureQueriesContext(connection) as captured:
+            deck.new_card_count
+
+        # NOT EXISTSのサブクエリ（エイリアスU0）はカード・ユーザーの一意制約で引く
+        plans = explain_plans(captured)
+        assert_table_uses_index(plans, "U0")
+        assert_table_uses_index(plans, "cards_card")
+
+    def test_new_cards_scan_from_frontier(self, user, deck):
+        """新規カードは探索位置からカードの作成順のインデックスで範囲検索する"""
+        get_study_card_ids(deck, user)
+        with CaptureQueriesContext(connection) as captured:
+            get_study_card_ids(deck, user)
+
+        new_card_queries = [q for q in captured if "NOT EXISTS" in q["sql"]]
+        plans = explain_plans(new_card_queries)
+        assert_table_uses_index(plans, "cards_card")
+        assert "card_deck_created_at" in "\n".join(plans)
+
+    def test_study_complete_uses_index(self, client, user, deck):
+        """学習完了画面の統計でインデックスが使われる"""
+        client.force_login(user)
+        with CaptureQueriesContext(connection) as captured:
+            client.get(reverse("study:complete", args=[deck.pk]))
+
+        review_queries = [q for q in captured if "study_reviewlog" in q["sql"]]
+        plans = explain_plans(review_queries)
+        assert_table_uses_index(plans, "study_reviewlog")
+        assert "reviewlog_user_review_time" in "\n".join(plans)
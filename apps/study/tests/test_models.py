@@ -8,7 +8,7 @@ from django.utils import timezone
 
 from apps.decks.models import Deck
 from apps.cards.models import Card
-from apps.study.models import CardState, ReviewLog
+from apps.study.models import CardState, ReviewLog, StudySession, due_cutoff
 
 
 @pytest.mark.django_db
@@ -67,8 +67,12 @@ class TestCardState:
         )
         assert card_state.is_due is True
 
-        # 未来の日時を設定
-        card_state.next_review = timezone.now() + timezone.timedelta(hours=1)
+        # 今日のうちに期限が来る場合も今日の復習に含める
+        card_state.next_review = due_cutoff() - timezone.timedelta(minutes=1)
+        assert card_state.is_due is True
+
+        # 明日以降の日時を設定
+        card_state.next_review = due_cutoff() + timezone.timedelta(hours=1)
         card_state.save()
         assert card_state.is_due is False
 
@@ -172,3 +176,90 @@ class TestReviewLog:
         logs = list(card.review_logs.all())
         assert logs[0] == log2  # 新しい方が先
         assert logs[1] == log1
+
+
+@pytest.mark.django_db
+class TestStudySession:
+    """StudySessionモデルのテストクラス"""
+
+    def test_advance_moves_cursor(self):
+        """現在のカードに回答するとカーソルが進むことをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        session = StudySession.objects.create(user=user, deck=deck, card_ids=[10, 20, 30])
+
+        assert session.current_card_id == 10
+        assert session.position == 1
+        assert session.total_cards == 3
+
+        assert session.advance(10) == 20
+        assert session.position == 2
+        assert session.reviewed_count == 1
+
+    def test_advance_other_card_keeps_cursor(self):
+        """現在と異なるカードへの回答ではカーソルが動かないことをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        session = StudySession.objects.create(user=user, deck=deck, card_ids=[10, 20])
+
+        assert session.advance(20) == 10
+        assert session.cursor == 0
+        assert session.reviewed_count == 1
+
+    def test_finished(self):
+        """最後のカードに回答すると終了状態になることをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        session = StudySession.objects.create(user=user, deck=deck, card_ids=[10])
+
+        assert session.advance(10) is None
+        assert session.is_finished is True
+
+    def test_advance_requeues_card(self):
+        """requeueを指定するとカードをキューの末尾に戻すことをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        session = StudySession.objects.create(user=user, deck=deck, card_ids=[10, 20])
+
+        assert session.advance(10, requeue=True) == 20
+        assert session.card_ids == [10, 20, 10]
+        assert session.advance(20) == 10
+        # 残りのキューにあるカードは重ねて追加しない
+        session.advance(20, requeue=True)
+        session.advance(20, requeue=True)
+        assert session.card_ids == [10, 20, 10, 20]
+        session.refresh_from_db()
+        assert session.card_ids == [10, 20, 10, 20]
+
+    def test_upcoming_card_ids(self):
+        """現在のカードの後に出題するカードIDを件数の上限まで返すことをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        session = StudySession.objects.create(user=user, deck=deck, card_ids=[10, 20, 30, 40])
+
+        assert session.upcoming_card_ids(2) == [20, 30]
+        session.advance(10)
+        session.advance(20)
+        assert session.upcoming_card_ids(2) == [40]
+        session.advance(30)
+        assert session.upcoming_card_ids(2) == []
@@ -0,0 +1,126 @@
+"""
+新規カードの検索（探索位置つき）のテスト
+"""
+
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from apps.decks.models import Deck
+from apps.cards.models import Card
+from apps.study import counters, new_cards
+from apps.study.models import CardState, NewCardFrontier, ReviewLog
+from apps.study.services import FSRSService
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="testpass123"
+    )
+
+
+@pytest.fixture
+def deck(user):
+    return Deck.objects.create(user=user, name="テストデッキ")
+
+
+@pytest.fixture
+def cards(deck):
+    return [
+        Card.objects.create(deck=deck, front=f"質問{i}", back=f"答え{i}")
+        for i in range(6)
+    ]
+
+
+def expected_new_card_ids(deck, user):
+    """探索位置を使わずに求めた新規カード（作成順）"""
+    seen = set(CardState.objects.filter(user=user).values_list("card_id", flat=True))
+    return [
+        card.pk
+        for card in Card.objects.filter(deck=deck).order_by("created_at", "pk")
+        if card.pk not in seen
+    ]
+
+
+@pytest.mark.django_db
+class TestNewCards:
+    """new_card_ids / count_new_cardsのテスト"""
+
+    def test_new_cards_in_creation_order(self, user, deck, cards):
+        """CardStateのないカードを作成順に返すことをテスト"""
+        FSRSService().review_card(cards[1], user, ReviewLog.Rating.GOOD)
+
+        assert new_cards.new_card_ids(deck, user, 3) == [cards[0].pk, cards[2].pk, cards[3].pk]
+        assert new_cards.count_new_cards(deck, user) == 5
+
+    def test_frontier_advances_to_first_new_card(self, user, deck, cards):
+        """探索位置が先頭の新規カードまで進むことをテスト"""
+        service = FSRSService()
+        for card in cards[:3]:
+            service.review_card(card, user, ReviewLog.Rating.GOOD)
+
+        new_cards.new_card_ids(deck, user, 2)
+
+        frontier = NewCardFrontier.objects.get(deck=deck, user=user)
+        assert frontier.card_id == cards[3].pk
+
+    def test_consistent_after_reviews_out_of_order(self, user, deck, cards):
+        """探索位置より後のカードを先に学習しても結果が変わらないことをテスト"""
+        service = FSRSService()
+        new_cards.new_card_ids(deck, user, 1)
+        for index in (4, 0, 2, 1):
+            service.review_card(cards[index], user, ReviewLog.Rating.GOOD)
+            assert new_cards.new_card_ids(deck, user, 10) == expected_new_card_ids(deck, user)
+            assert new_cards.count_new_cards(deck, user) == len(expected_new_card_ids(deck, user))
+
+    def test_card_added_after_frontier(self, user, deck, cards):
+        """すべて学習した後に追加したカードを返すことをテスト"""
+        service = FSRSService()
+        for card in cards:
+            service.review_card(card, user, ReviewLog.Rating.GOOD)
+        assert new_cards.new_card_ids(deck, user, 10) == []
+
+        added = Card.objects.create(deck=deck, front="追加", back="答え")
+
+        assert new_cards.new_card_ids(deck, user, 10) == [added.pk]
+        assert deck.new_card_count == 1
+
+    def test_other_users_states_are_ignored(self, user, deck, cards):
+        """他ユーザーのCardStateは新規カードの判定に影響しないことをテスト"""
+        other = User.objects.create_user(username="other", password="testpass123")
+        FSRSService().review_card(cards[0], other, ReviewLog.Rating.GOOD)
+
+        assert new_cards.new_card_ids(deck, user, 1) == [cards[0].pk]
+        assert new_cards.count_new_cards(deck, user) == 6
+
+    def test_admin_delete_resets_frontier(self, admin_client, user, deck, cards):
+        """管理画面で学習状態を削除したカードが再び新規カードになることをテスト"""
+        service = FSRSService()
+        for card in cards[:3]:
+            service.review_card(card, user, ReviewLog.Rating.GOOD)
+        assert new_cards.new_card_ids(deck, user, 1) == [cards[3].pk]
+
+        card_state = CardState.objects.get(card=cards[0], user=user)
+        admin_client.post(
+            reverse("admin:study_cardstate_changelist"),
+            {"action": "delete_selected", "_selected_action": [card_state.pk], "post": "yes"},
+        )
+
+        assert not NewCardFrontier.objects.filter(deck=deck, user=user).exists()
+        assert new_cards.new_card_ids(deck, user, 2) == [cards[0].pk, cards[3].pk]
+        assert counters.find_counter_mismatches([deck], user) == []
+
+    def test_admin_delete_one(self, admin_client, user, deck, cards):
+        """管理画面で1件ずつ削除した場合も探索位置を削除することをテスト"""
+        FSRSService().review_card(cards[0], user, ReviewLog.Rating.GOOD)
+        new_cards.new_card_ids(deck, user, 1)
+        card_state = CardState.objects.get(card=cards[0], user=user)
+
+        admin_client.post(
+            reverse("admin:study_cardstate_delete", args=[card_state.pk]), {"post": "yes"}
+        )
+
+        assert new_cards.new_card_ids(deck, user, 1) == [cards[0].pk]
@@ -0,0 +1,105 @@
+"""
+FSRSパラメータ最適化のテスト
+"""
+
+import json
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+from fsrs import Rating, ReviewLog as FSRSReviewLog
+from fsrs.scheduler import DEFAULT_PARAMETERS
+
+from apps.decks.models import Deck
+from apps.cards.models import Card
+from apps.study import optimizer
+from apps.study.models import FSRSParameters, ReviewLog
+from apps.study.services import FSRSService
+
+
+class FakeOptimizer:
+    """テスト用: デフォルトパラメータを返すOptimizer"""
+
+    def __init__(self, review_logs):
+        self.review_logs = review_logs
+
+    def compute_optimal_parameters(self, verbose=False):
+        return list(DEFAULT_PARAMETERS)
+
+
+def make_history(card_id, ratings, start, gap_days=3):
+    """gap_days間隔の復習履歴を作成"""
+    return [
+        FSRSReviewLog(
+            card_id=card_id,
+            rating=rating,
+            review_datetime=start + timedelta(days=gap_days * i),
+            review_duration=None,
+        )
+        for i, rating in enumerate(ratings)
+    ]
+
+
+class TestComputeLogLoss:
+    """compute_log_lossのテストクラス"""
+
+    def test_log_loss_is_positive(self):
+        """複数日にわたる履歴の対数損失が正の値になることをテスト"""
+        start = timezone.now() - timedelta(days=30)
+        history = make_history(1, [Rating.Good, Rating.Good, Rating.Again, Rating.Good], start)
+
+        loss = optimizer.compute_log_loss(DEFAULT_PARAMETERS, history)
+        assert loss is not None
+        assert loss > 0
+
+    def test_log_loss_prefers_matching_outcomes(self):
+        """想起できた履歴の方が忘れた履歴より損失が小さいことをテスト"""
+        start = timezone.now() - timedelta(days=30)
+        recalled = make_history(1, [Rating.Good, Rating.Good, Rating.Good], start)
+        forgotten = make_history(1, [Rating.Good, Rating.Again, Rating.Again], start)
+
+        assert optimizer.compute_log_loss(DEFAULT_PARAMETERS, recalled) < optimizer.compute_log_loss(
+            DEFAULT_PARAMETERS, forgotten
+        )
+
+    def test_log_loss_same_day_only(self):
+        """同日内の復習だけの場合は評価対象がないことをテスト"""
+        start = timezone.now()
+        history = make_history(1, [Rating.Good, Rating.Good], start, gap_days=0)
+
+        assert optimizer.compute_log_loss(DEFAULT_PARAMETERS, history) is None
+
+
+@pytest.mark.django_db
+class TestOptimizeCommand:
+    """optimize_fsrs_parametersコマンドのテスト"""
+
+    def test_command_fits_and_saves(self, monkeypatch, capsys):
+        """復習履歴の十分なユーザーだけパラメータが保存されることをテスト"""
+        monkeypatch.setattr(optimizer, "Optimizer", FakeOptimizer)
+        active = User.objects.create_user(username="active", password="testpass123")
+        casual = User.objects.create_user(username="casual", password="testpass123")
+        service = FSRSService()
+        start = timezone.now() - timedelta(days=40)
+        for user in (active, casual):
+            deck = Deck.objects.create(user=user, name="テストデッキ")
+            card = Card.objects.create(deck=deck, front="質問", back="答え")
+            reviews = 5 if user == active else 1
+            for i in range(reviews):
+                service.review_card(card, user, ReviewLog.Rating.GOOD, review_time=start + timedelta(days=5 * i))
+
+        call_command("optimize_fsrs_parameters", "--workers", "0", "--min-reviews", "3")
+
+        record = FSRSParameters.objects.get(user=active)
+        assert record.parameters == list(DEFAULT_PARAMETERS)
+        assert record.review_count == 5
+        assert record.log_loss is not None
+        assert not FSRSParameters.objects.filter(user=casual).exists()
+
+        lines = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith("{")]
+        assert {line["user_id"]: line["status"] for line in lines} == {
+            active.pk: "fitted",
+            casual.pk: "skipped",
+        }
@@ -0,0 +1,120 @@
+"""
+1日の新規カード上限のテスト
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.accounts.models import UserProfile
+from apps.decks.models import Deck
+from apps.cards.models import Card
+from apps.study import quota
+from apps.study.models import DailyNewCardCounter, ReviewLog
+from apps.study.services import FSRSService
+from apps.study.views import get_study_card_ids
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="testpass123"
+    )
+
+
+@pytest.fixture
+def profile(user):
+    return UserProfile.objects.create(user=user, timezone="Asia/Tokyo", daily_new_cards=3)
+
+
+@pytest.fixture
+def deck(user):
+    deck = Deck.objects.create(user=user, name="テストデッキ")
+    for i in range(5):
+        Card.objects.create(deck=deck, front=f"質問{i}", back=f"答え{i}")
+    return deck
+
+
+@pytest.mark.django_db
+class TestDailyNewCardCounter:
+    """新規カード数のカウンタのテスト"""
+
+    def test_counts_only_new_cards(self, user, profile, deck):
+        """新規カードの最初の復習だけを数えることをテスト"""
+        cards = list(deck.cards.order_by("pk"))
+        service = FSRSService()
+        service.review_card(cards[0], user, ReviewLog.Rating.AGAIN)
+        service.review_card(cards[0], user, ReviewLog.Rating.GOOD)
+        service.review_cards([
+            (cards[1].pk, ReviewLog.Rating.GOOD, 0, None),
+            (cards[1].pk, ReviewLog.Rating.GOOD, 0, None),
+            (cards[0].pk, ReviewLog.Rating.GOOD, 0, None),
+        ], user)
+
+        assert DailyNewCardCounter.objects.get(user=user).count == 2
+        assert quota.remaining_new_cards(user) == 1
+
+    def test_resets_on_next_local_day(self, user, profile, deck):
+        """ユーザーのタイムゾーンで日付が変わると0から数え直すことをテスト"""
+        cards = list(deck.cards.order_by("pk"))
+        # 2026-01-01 14:30 UTCは東京では1月1日23:30、15:30 UTCは1月2日0:30
+        before = datetime(2026, 1, 1, 14, 30, tzinfo=dt_timezone.utc)
+        after = before + timedelta(hours=1)
+        service = FSRSService()
+        service.review_card(cards[0], user, ReviewLog.Rating.GOOD, review_time=before)
+        service.review_card(cards[1], user, ReviewLog.Rating.GOOD, review_time=before)
+        service.review_card(cards[2], user, ReviewLog.Rating.GOOD, review_time=after)
+
+        counter = DailyNewCardCounter.objects.get(user=user)
+        assert counter.date.isoformat() == "2026-01-02"
+        assert counter.count == 1
+
+    def test_older_day_is_not_counted(self, user, profile, deck):
+        """カウンタより前の日の復習（オフラインの再送）は数えないことをテスト"""
+        now = datetime(2026, 1, 2, 3, 0, tzinfo=dt_timezone.utc)
+        quota.record_new_cards(user, [now])
+        quota.record_new_cards(user, [now - timedelta(days=1)])
+
+        counter = DailyNewCardCounter.objects.get(user=user)
+        assert counter.date.isoformat() == "2026-01-02"
+        assert counter.count == 1
+
+    def test_default_limit_without_profile(self, user):
+        """プロフィールがなければ既定の上限を使うことをテスト"""
+        assert quota.remaining_new_cards(user) == quota.DEFAULT_DAILY_NEW_CARDS
+
+
+@pytest.mark.django_db
+class TestQueueQuota:
+    """出題キューの新規カード数のテスト"""
+
+    def test_deck_queue_limited_to_remaining(self, user, profile, deck):
+        """デッキの出題キューの新規カードが残りの枚数までになることをテスト"""
+        assert len(get_study_card_ids(deck, user)) == 3
+
+        FSRSService().review_card(deck.cards.order_by("pk").first(), user, ReviewLog.Rating.EASY)
+
+        # 学習したカード（明日以降が期限）は出題せず、新規カードは残り2枚
+        assert len(get_study_card_ids(deck, user)) == 2
+
+    def test_global_queue_limited_to_remaining(self, user, profile, deck):
+        """全デッキの出題キューも残りの枚数までになることをテスト"""
+        DailyNewCardCounter.objects.create(
+            user=user, date=quota.local_date(profile), count=3
+        )
+        assert get_study_card_ids(None, user) == []
+
+    def test_does_not_count_review_logs(self, user, profile, deck):
+        """残りの枚数を求めるのに復習履歴を読まないことをテスト"""
+        # プロフィールをキャッシュしていないインスタンス（リクエストごとのユーザーと同じ）
+        user = User.objects.get(pk=user.pk)
+        with CaptureQueriesContext(connection) as queries:
+            quota.remaining_new_cards(user)
+
+        assert len(queries) == 2
+        assert all("study_reviewlog" not in query["sql"] for query in queries)
@@ -0,0 +1,78 @@
+"""
+Schedulerレジストリのテスト
+"""
+
+import pytest
+from django.contrib.auth.models import User
+from fsrs.scheduler import DEFAULT_PARAMETERS
+
+from apps.study.models import FSRSParameters
+from apps.study.schedulers import SchedulerRegistry
+from apps.study.services import FSRSService
+
+
+class TestSchedulerRegistry:
+    """SchedulerRegistryのテストクラス"""
+
+    def test_same_parameters_share_scheduler(self):
+        """同じ設定では同じSchedulerが返されることをテスト"""
+        registry = SchedulerRegistry()
+
+        first = registry.get_scheduler()
+        second = registry.get_scheduler(parameters=list(DEFAULT_PARAMETERS))
+
+        assert first is second
+        assert registry.stats() == {"size": 1, "maxsize": 256, "hits": 1, "misses": 1}
+
+    def test_different_parameters_create_scheduler(self):
+        """設定が異なれば別のSchedulerが作成されることをテスト"""
+        registry = SchedulerRegistry()
+
+        default = registry.get_scheduler()
+        strict = registry.get_scheduler(desired_retention=0.95)
+        short = registry.get_scheduler(maximum_interval=365)
+
+        assert len({id(default), id(strict), id(short)}) == 3
+        assert strict.desired_retention == 0.95
+        assert short.maximum_interval == 365
+        assert registry.stats()["misses"] == 3
+
+    def test_least_recently_used_is_evicted(self):
+        """上限を超えると最も古く使われたSchedulerが破棄されることをテスト"""
+        registry = SchedulerRegistry(maxsize=2)
+
+        first = registry.get_scheduler(desired_retention=0.8)
+        registry.get_scheduler(desired_retention=0.85)
+        # 0.8を使い直したので、次の追加で0.85が破棄される
+        registry.get_scheduler(desired_retention=0.8)
+        registry.get_scheduler(desired_retention=0.9)
+
+        assert registry.stats()["size"] == 2
+        assert registry.get_scheduler(desired_retention=0.8) is first
+        misses = registry.stats()["misses"]
+        registry.get_scheduler(desired_retention=0.85)
+        assert registry.stats()["misses"] == misses + 1
+
+
+@pytest.mark.django_db
+class TestFSRSServiceForUser:
+    """FSRSService.for_userのテストクラス"""
+
+    def test_for_user_uses_fitted_parameters(self):
+        """最適化済みパラメータのあるユーザーはそのSchedulerを使うことをテスト"""
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        parameters = list(DEFAULT_PARAMETERS)
+        parameters[0] = 0.5
+        FSRSParameters.objects.create(user=user, parameters=parameters, desired_retention=0.85)
+
+        service = FSRSService.for_user(user)
+
+        assert list(service.scheduler.parameters) == parameters
+        assert service.scheduler.desired_retention == 0.85
+        assert FSRSService.for_user(user).scheduler is service.scheduler
+
+    def test_for_user_default(self):
+        """パラメータのないユーザーはデフォルトのSchedulerを共有することをテスト"""
+        user = User.objects.create_user(username="testuser", password="testpass123")
+
+        assert FSRSService.for_user(user).scheduler is FSRSService().scheduler
@@ -2,14 +2,18 @@
 FSRSサービスのテスト
 """
 
+from datetime import timedelta
+
 import pytest
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from apps.decks.models import Deck
 from apps.cards.models import Card
-from apps.study.models import CardState, ReviewLog
-from apps.study.services import FSRSService
+from apps.study.models import CardState, DeckUserCounters, ReviewLog
+from apps.study.services import FSRSService, interval_preview_cache
 
 
 @pytest.mark.django_db
@@ -58,6 +62,28 @@ class TestFSRSService:
         assert card_state.pk == existing_state.pk
         assert card_state.state == CardState.State.REVIEW
 
+    def test_learning_steps_are_saved(self):
+        """学習ステップを保存し、Goodを続けると学習を終えることをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        card = Card.objects.create(deck=deck, front="質問", back="答え")
+        service = FSRSService()
+        now = timezone.now()
+
+        card_state = service.review_card(card, user, ReviewLog.Rating.GOOD, review_time=now)
+        assert card_state.state == CardState.State.LEARNING
+        assert CardState.objects.get(pk=card_state.pk).step == 1
+
+        card_state = service.review_card(
+            card, user, ReviewLog.Rating.GOOD, review_time=card_state.due
+        )
+        assert card_state.state == CardState.State.REVIEW
+        assert CardState.objects.get(pk=card_state.pk).step is None
+
     def test_review_card_again(self):
         """'もう一度'評価での復習をテスト"""
         user = User.objects.create_user(
@@ -141,6 +167,26 @@ class TestFSRSService:
         # ReviewLogが3件作成されていることを確認
         assert ReviewLog.objects.filter(card=card, user=user).count() == 3
 
+    def test_review_card_relearning(self):
+        """再学習中のカードを復習できることをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        card = Card.objects.create(deck=deck, front="質問", back="答え")
+        now = timezone.now()
+
+        service = FSRSService()
+        service.review_card(card, user, ReviewLog.Rating.EASY, review_time=now - timedelta(days=30))
+        card_state = service.review_card(card, user, ReviewLog.Rating.AGAIN, review_time=now - timedelta(days=1))
+        assert card_state.state == CardState.State.RELEARNING
+
+        card_state = service.review_card(card, user, ReviewLog.Rating.GOOD, review_time=now)
+        assert card_state.state == CardState.State.REVIEW
+        assert card_state.reps == 3
+
     def test_review_card_with_duration(self):
         """回答時間付きの復習をテスト"""
         user = User.objects.create_user(
@@ -190,3 +236,200 @@ class TestFSRSService:
         assert service._format_interval(86400) == "1日"
         assert service._format_interval(86400 * 7) == "7日"
         assert service._format_interval(86400 * 60) == "2ヶ月"
+
+
+@pytest.mark.django_db
+class TestFSRSServiceBatch:
+    """FSRSService.review_cardsのテストクラス"""
+
+    def test_review_cards_matches_review_card(self):
+        """一括復習の結果が1件ずつの復習と一致することをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        batch_card = Card.objects.create(deck=deck, front="質問1", back="答え1")
+        single_card = Card.objects.create(deck=deck, front="質問2", back="答え2")
+        start = timezone.now() - timedelta(days=1)
+
+        service = FSRSService()
+        states = service.review_cards(
+            [
+                (batch_card.pk, ReviewLog.Rating.GOOD, 1000, start),
+                (batch_card.pk, ReviewLog.Rating.AGAIN, 2000, start + timedelta(minutes=10)),
+            ],
+            user,
+        )
+        service.review_card(single_card, user, ReviewLog.Rating.GOOD, review_time=start)
+        expected = service.review_card(
+            single_card, user, ReviewLog.Rating.AGAIN, review_time=start + timedelta(minutes=10)
+        )
+
+        batch_state = CardState.objects.get(card=batch_card, user=user)
+        assert states[batch_card.pk].pk == batch_state.pk
+        assert batch_state.reps == expected.reps == 2
+        assert batch_state.state == expected.state
+        assert batch_state.stability == pytest.approx(expected.stability)
+        assert batch_state.difficulty == pytest.approx(expected.difficulty)
+        assert batch_state.next_review == expected.next_review
+
+        logs = list(ReviewLog.objects.filter(card=batch_card).order_by("review_time"))
+        assert [log.rating for log in logs] == [ReviewLog.Rating.GOOD, ReviewLog.Rating.AGAIN]
+        assert [log.duration for log in logs] == [1000, 2000]
+        assert logs[0].review_time == start
+
+    def test_review_cards_query_count_is_constant(self):
+        """復習件数が増えてもクエリ数が増えないことをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        cards = [Card.objects.create(deck=deck, front=f"質問{i}", back="答え") for i in range(20)]
+        service = FSRSService()
+
+        def count_queries(batch):
+            with CaptureQueriesContext(connection) as captured:
+                service.review_cards(
+                    [(card.pk, ReviewLog.Rating.GOOD, 0, None) for card in batch], user
+                )
+            return len(captured)
+
+        # 新規と既存のCardStateが混在する状態で比較する
+        service.review_card(cards[0], user, ReviewLog.Rating.GOOD)
+        service.review_card(cards[10], user, ReviewLog.Rating.GOOD)
+        assert count_queries(cards[:2]) == count_queries(cards[10:20])
+        assert ReviewLog.objects.filter(user=user).count() == 14
+
+    def test_review_cards_updates_counters(self):
+        """一括復習でデッキ件数カウンタが更新されることをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        cards = [Card.objects.create(deck=deck, front=f"質問{i}", back="答え") for i in range(3)]
+        service = FSRSService()
+        service.review_card(cards[0], user, ReviewLog.Rating.GOOD)
+
+        service.review_cards(
+            [(card.pk, ReviewLog.Rating.GOOD, 0, None) for card in cards[:2]], user
+        )
+
+        row = DeckUserCounters.objects.get(deck=deck, user=user)
+        assert row.total_count == 3
+        assert row.new_count == 1
+        assert row.learning_count + row.review_count == 2
+
+    def test_review_cards_unknown_card(self):
+        """存在しないカードを含む場合は何も保存しないことをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        card = Card.objects.create(deck=deck, front="質問", back="答え")
+
+        with pytest.raises(Card.DoesNotExist):
+            FSRSService().review_cards(
+                [(card.pk, ReviewLog.Rating.GOOD, 0, None), (card.pk + 100, ReviewLog.Rating.GOOD, 0, None)],
+                user,
+            )
+        assert not ReviewLog.objects.exists()
+
+    @pytest.mark.parametrize("rating", [0, 5, 7])
+    def test_review_cards_invalid_rating(self, rating):
+        """評価が1〜4でない復習を含む場合は何も保存しないことをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        card = Card.objects.create(deck=deck, front="質問", back="答え")
+
+        with pytest.raises(ValueError):
+            FSRSService().review_cards(
+                [(card.pk, ReviewLog.Rating.GOOD, 0, None), (card.pk, rating, 0, None)],
+                user,
+            )
+        assert not ReviewLog.objects.exists()
+        assert not CardState.objects.exists()
+
+
+@pytest.mark.django_db
+class TestIntervalPreview:
+    """回答ボタンの間隔表示（メモ化）のテストクラス"""
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        interval_preview_cache.clear()
+        yield
+        interval_preview_cache.clear()
+
+    def test_preview_does_not_create_card_state(self):
+        """間隔の取得でCardStateが作成されないことをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        card = Card.objects.create(deck=deck, front="質問", back="答え")
+
+        FSRSService().get_next_review_intervals(card, user)
+
+        assert not CardState.objects.filter(card=card, user=user).exists()
+
+    def test_new_cards_share_cache_entry(self):
+        """新規カードはすべて同じキャッシュを使うことをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        cards = [
+            Card.objects.create(deck=deck, front=f"質問{i}", back=f"答え{i}")
+            for i in range(3)
+        ]
+
+        service = FSRSService()
+        results = [service.get_next_review_intervals(card, user) for card in cards]
+
+        assert results[0] == results[1] == results[2]
+        stats = interval_preview_cache.stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 2
+
+    def test_cached_labels_match_scheduler(self):
+        """キャッシュから返す表示がfsrsで直接計算した間隔と一致することをテスト"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        deck = Deck.objects.create(user=user, name="テストデッキ")
+        card = Card.objects.create(deck=deck, front="質問", back="答え")
+        now = timezone.now()
+
+        service = FSRSService()
+        service.review_card(card, user, ReviewLog.Rating.GOOD, review_time=now - timedelta(days=3))
+        service.review_card(card, user, ReviewLog.Rating.GOOD, review_time=now - timedelta(days=2))
+        card_state = CardState.objects.get(card=card, user=user)
+
+        first = service.get_next_review_intervals(card, user, review_time=now)
+        second = service.get_next_review_intervals(card, user, review_time=now)
+        assert first == second
+        assert interval_preview_cache.stats()["hits"] == 1
+
+        scheduler = service._get_preview_scheduler()
+        fsrs_card = service._card_state_to_fsrs_card(card_state)
+        result_card, _ = scheduler.review_card(fsrs_card, service._rating_to_fsrs_rating(ReviewLog.Rating.GOOD), now)
+        expected = service._format_interval((result_card.due - now).total_seconds())
+        assert first[ReviewLog.Rating.GOOD] == expected
@@ -0,0 +1,245 @@
+"""
+差分同期のテスト
+"""
+
+import json
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth.models import User
+
+from apps.decks.models import Deck
+from apps.cards.models import Card
+from apps.study import sync
+from apps.study.models import CardState, ChangeLog, ReviewLog
+from apps.study.services import FSRSService
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        username="testuser",
+        email="test@example.com",
+        password="testpass123"
+    )
+
+
+@pytest.fixture
+def deck(user):
+    return Deck.objects.create(user=user, name="テストデッキ")
+
+
+@pytest.fixture
+def cards(deck):
+    return [
+        Card.objects.create(deck=deck, front=f"質問{index}", back=f"答え{index}")
+        for index in range(3)
+    ]
+
+
+def push(client, *reviews):
+    return client.post(
+        reverse("study_api:sync_push"),
+        json.dumps({"reviews": list(reviews)}),
+        content_type="application/json",
+    )
+
+
+def pushed_review(client_review_id, card, rating=3, reviewed_at=None):
+    reviewed_at = reviewed_at or timezone.now()
+    return {
+        "client_review_id": client_review_id,
+        "card_id": card.pk,
+        "rating": rating,
+        "duration": 3000,
+        "reviewed_at": reviewed_at.isoformat(),
+    }
+
+
+@pytest.mark.django_db
+class TestRecordChanges:
+    """変更履歴の記録のテスト"""
+
+    def test_sequence_increases_per_user(self, user, cards):
+        """ユーザーごとに連続した番号を払い出すことをテスト"""
+        other = User.objects.create_user(username="other", password="testpass123")
+        sync.record_changes(user, ChangeLog.Kind.CARD, [cards[0].pk, cards[1].pk])
+        sync.record_changes(other, ChangeLog.Kind.CARD, [cards[2].pk])
+        sync.record_changes(user, ChangeLog.Kind.CARD, [cards[2].pk])
+
+        assert list(
+            ChangeLog.objects.filter(user=user).order_by("seq").values_list("seq", "object_id")
+        ) == [(1, cards[0].pk), (2, cards[1].pk), (3, cards[2].pk)]
+        assert sync.current_token(user) == 3
+        assert sync.current_token(other) == 1
+
+    def test_review_records_card_state_change(self, user, cards):
+        """復習で学習状態の変更を記録することをテスト"""
+        service = FSRSService()
+        service.review_card(cards[0], user, ReviewLog.Rating.GOOD)
+        service.review_cards([(cards[1].pk, ReviewLog.Rating.GOOD, 0, None)], user)
+
+        assert list(
+            ChangeLog.objects.filter(user=user, kind=ChangeLog.Kind.CARD_STATE)
+            .order_by("seq").values_list("object_id", flat=True)
+        ) == [cards[0].pk, cards[1].pk]
+
+    def test_views_record_changes(self, client, user, deck, cards):
+        """デッキ・カードの編集と削除を記録することをテスト"""
+        client.force_login(user)
+        client.post(reverse("cards:card_edit", args=[cards[0].pk]), {"front": "新", "back": "答"})
+        client.post(reverse("cards:card_delete", args=[cards[1].pk]))
+        client.post(reverse("decks:deck_delete", args=[deck.pk]))
+
+        assert list(
+            ChangeLog.objects.filter(user=user).order_by("seq")
+            .values_list("kind", "object_id", "deleted")
+        ) == [
+            (ChangeLog.Kind.CARD, cards[0].pk, False),
+            (ChangeLog.Kind.CARD, cards[1].pk, True),
+            (ChangeLog.Kind.DECK, deck.pk, True),
+        ]
+
+
+@pytest.mark.django_db
+class TestPullChanges:
+    """差分取得のテスト"""
+
+    def test_full_sync_without_token(self, user, deck, cards):
+        """トークンがなければ全件を返すことをテスト"""
+        changes = sync.pull_changes(user)
+
+        assert changes.decks == [deck]
+        assert {card.pk for card in changes.cards} == {card.pk for card in cards}
+        assert changes.token == 0
+
+    def test_changes_since_token(self, user, cards):
+        """トークンより後の変更を、対象ごとに最新の1件にまとめて返すことをテスト"""
+        FSRSService().review_card(cards[0], user, ReviewLog.Rating.GOOD)
+        token = sync.current_token(user)
+        service = FSRSService()
+        service.review_card(cards[1], user, ReviewLog.Rating.GOOD)
+        service.review_card(cards[1], user, ReviewLog.Rating.GOOD)
+        sync.record_changes(user, ChangeLog.Kind.CARD, [cards[2].pk], deleted=True)
+
+        changes = sync.pull_changes(user, since=token)
+
+        assert [state.card_id for state in changes.card_states] == [cards[1].pk]
+        assert changes.deleted["cards"] == [cards[2].pk]
+        assert changes.token == sync.current_token(user)
+        assert changes.more is False
+
+    def test_pull_is_paginated(self, user, cards):
+        """件数の上限を超える場合は続きがあることを返すことをテスト"""
+        sync.record_changes(user, ChangeLog.Kind.CARD, [card.pk for card in cards])
+
+        first = sync.pull_changes(user, since=0, limit=2)
+        second = sync.pull_changes(user, since=first.token, limit=2)
+
+        assert first.more is True
+        assert [card.pk for card in first.cards] == [cards[0].pk, cards[1].pk]
+        assert second.more is False
+        assert [card.pk for card in second.cards] == [cards[2].pk]
+
+    def test_object_deleted_after_change(self, user, cards):
+        """記録後に削除された対象は削除として返すことをテスト"""
+        sync.record_changes(user, ChangeLog.Kind.CARD, [cards[0].pk])
+        card_pk = cards[0].pk
+        cards[0].delete()
+
+        changes = sync.pull_changes(user, since=0)
+
+        assert changes.cards == []
+        assert changes.deleted["cards"] == [card_pk]
+
+
+@pytest.mark.django_db
+class TestSyncAPI:
+    """差分同期APIのテスト"""
+
+    def test_pull(self, client, user, deck, cards):
+        """全件取得の後、トークンで差分だけを取得できることをテスト"""
+        client.force_login(user)
+        full = client.get(reverse("study_api:sync_pull")).json()
+        assert full["full"] is True
+        assert len(full["cards"]) == 3
+        assert full["cards"][0]["deck"] == deck.pk
+
+        push(client, pushed_review("r1", cards[0]))
+        changes = client.get(reverse("study_api:sync_pull"), {"since": full["token"]}).json()
+
+        assert changes["full"] is False
+        assert changes["cards"] == []
+        assert [state["card"] for state in changes["card_states"]] == [cards[0].pk]
+        assert changes["card_states"][0]["reps"] == 1
+
+    def test_push_applies_in_review_order(self, client, user, cards):
+        """オフラインの復習を復習日時の順に適用することをテスト"""
+        client.force_login(user)
+        now = timezone.now()
+        response = push(
+            client,
+            pushed_review("r2", cards[0], reviewed_at=now - timedelta(hours=1)),
+            pushed_review("r1", cards[0], rating=1, reviewed_at=now - timedelta(hours=2)),
+        )
+
+        assert response.json()["results"] == {"r2": "applied", "r1": "applied"}
+        logs = ReviewLog.objects.filter(user=user).order_by("review_time")
+        assert [log.client_review_id for log in logs] == ["r1", "r2"]
+        assert CardState.objects.get(user=user, card=cards[0]).reps == 2
+
+    def test_push_is_idempotent(self, client, user, cards):
+        """同じ復習を再送しても二重に記録しないことをテスト"""
+        client.force_login(user)
+        review = pushed_review("r1", cards[0])
+        push(client, review)
+        response = push(client, review, review)
+
+        assert response.json()["results"] == {"r1": "duplicate"}
+        assert ReviewLog.objects.filter(user=user).count() == 1
+
+    def test_push_rejects_stale_review(self, client, user, cards):
+        """サーバーで後に復習済みのカードへの古い復習は適用しないことをテスト"""
+        FSRSService().review_card(cards[0], user, ReviewLog.Rating.GOOD)
+        client.force_login(user)
+        response = push(
+            client, pushed_review("old", cards[0], reviewed_at=timezone.now() - timedelta(days=1))
+        )
+
+        assert response.json()["results"] == {"old": "stale"}
+        assert ReviewLog.objects.filter(user=user).count() == 1
+
+    def test_push_other_user_card(self, client, user, cards):
+        """他ユーザーのカードへの復習は記録しないことをテスト"""
+        other = User.objects.create_user(username="other", password="testpass123")
+        client.force_login(other)
+        response = push(client, pushed_review("r1", cards[0]))
+
+        assert response.json()["results"] == {"r1": "not_found"}
+        assert not ReviewLog.objects.exists()
+
+    def test_push_reviews_invalid_rating(self, user, cards):
+        """評価が1〜4でない復習はinvalidとし、他の復習だけを記録することをテスト"""
+        now = timezone.now()
+        results = sync.push_reviews(FSRSService(), user, [
+            sync.PushedReview("ok", cards[0].pk, ReviewLog.Rating.GOOD, 3000, now),
+            sync.PushedReview("bad", cards[1].pk, 7, 3000, now),
+        ])
+
+        assert results == {"ok": sync.APPLIED, "bad": sync.INVALID}
+        assert list(ReviewLog.objects.values_list("client_review_id", "rating")) == [("ok", 3)]
+
+    @pytest.mark.parametrize("review", [
+        {"client_review_id": "r1", "card_id": 1, "rating": 5, "reviewed_at": "2026-01-01T00:00:00+00:00"},
+        {"client_review_id": "r1", "card_id": 1, "rating": 3, "reviewed_at": "2026-01-01T00:00:00"},
+        {"card_id": 1, "rating": 3, "reviewed_at": "2026-01-01T00:00:00+00:00"},
+    ])
+    def test_push_invalid_review(self, client, user, cards, review):
+        """不正な復習が含まれる場合は何も記録せずに400を返すことをテスト"""
+        client.force_login(user)
+        response = push(client, pushed_review("ok", cards[0]), review)
+
+        assert response.status_code == 400
+        assert not ReviewLog.objects.exists()
@@ -2,13 +2,24 @@
 学習機能ビューのテスト
 """
 
+import time
+from datetime import timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
 
+from apps.accounts.models import UserProfile
+
 from apps.decks.models import Deck
 from apps.cards.models import Card
-from apps.study.models import CardState, ReviewLog
+from apps.study.models import CardState, NewCardFrontier, ReviewLog, StudySession, local_day_start
+from apps.study.services import FSRSService
+from apps.study.views import get_study_card_ids
 
 
 @pytest.fixture
@@ -69,6 +80,18 @@ class TestStudySession:
         response = client.get(reverse("study:session", args=[deck.pk]))
         assert response.status_code == 404
 
+    def test_study_session_freezes_queue(self, client, user, deck):
+        """セッション開始時に出題キューが確定される"""
+        card1 = Card.objects.create(deck=deck, front="質問1", back="答え1")
+        card2 = Card.objects.create(deck=deck, front="質問2", back="答え2")
+
+        client.force_login(user)
+        client.get(reverse("study:session", args=[deck.pk]))
+
+        session = StudySession.objects.get(user=user, deck=deck)
+        assert session.card_ids == [card1.pk, card2.pk]
+        assert session.cursor == 0
+
 
 @pytest.mark.django_db
 class TestStudyCard:
@@ -108,6 +131,76 @@ class TestStudyCard:
         assert ReviewLog.Rating.AGAIN in intervals
         assert ReviewLog.Rating.GOOD in intervals
 
+    def test_study_card_progress_from_session(self, client, user, deck):
+        """進捗はセッションのカーソルから表示される"""
+        card1 = Card.objects.create(deck=deck, front="質問1", back="答え1")
+        card2 = Card.objects.create(deck=deck, front="質問2", back="答え2")
+        StudySession.objects.create(
+            user=user, deck=deck, card_ids=[card1.pk, card2.pk], cursor=1
+        )
+
+        client.force_login(user)
+        response = client.get(reverse("study:card", args=[deck.pk, card2.pk]))
+        assert response.context["current_index"] == 2
+        assert response.context["total_cards"] == 2
+
+    def test_study_card_prefetches_upcoming_cards(self, client, user, deck, settings):
+        """セッションで次に出題するカードの画像を先読みさせ、答えは含めないことをテスト"""
+        settings.STUDY_PREFETCH_CARDS = 2
+        cards = [
+            Card.objects.create(deck=deck, front=f"質問{index}", back=f"答え{index}")
+            for index in range(4)
+        ]
+        cards[1].front_image = "cards/front/next.png"
+        cards[1].save()
+        cards[2].back_image = "cards/back/after.png"
+        cards[2].save()
+        # 先読みする枚数より後のカードの画像は含めない
+        cards[3].front_image = "cards/front/later.png"
+        cards[3].save()
+        StudySession.objects.create(
+            user=user, deck=deck, card_ids=[card.pk for card in cards]
+        )
+
+        client.force_login(user)
+        response = client.get(reverse("study:card", args=[deck.pk, cards[0].pk]))
+
+        assert response.context["preload_images"] == [
+            "/media/cards/front/next.png", "/media/cards/back/after.png"
+        ]
+        assert response["Link"] == (
+            "</media/cards/front/next.png>; rel=preload; as=image, "
+            "</media/cards/back/after.png>; rel=preload; as=image"
+        )
+        content = response.content.decode()
+        assert '<link rel="preload" as="image" href="/media/cards/front/next.png">' in content
+        assert "答え1" not in content
+
+    def test_study_card_last_card_has_no_prefetch(self, client, user, deck, card):
+        """最後のカードでは先読みするカードがないことをテスト"""
+        StudySession.objects.create(user=user, deck=deck, card_ids=[card.pk])
+
+        client.force_login(user)
+        response = client.get(reverse("study:card", args=[deck.pk, card.pk]))
+
+        assert response.context["preload_images"] == []
+        assert not response.has_header("Link")
+
+    def test_study_card_does_not_write_session(self, client, user, deck, card):
+        """カードの表示ではセッションに書き込まないことをテスト"""
+        StudySession.objects.create(user=user, deck=deck, card_ids=[card.pk])
+        client.force_login(user)
+
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(reverse("study:card", args=[deck.pk, card.pk]))
+
+        assert response.status_code == 200
+        assert not [
+            query["sql"] for query in context.captured_queries
+            if "django_session" in query["sql"] and not query["sql"].startswith("SELECT")
+        ]
+        assert response.context["answer_token"]
+
     def test_study_card_other_user(self, client, other_user, deck, card):
         """他ユーザーのカードにはアクセス不可"""
         client.force_login(other_user)
@@ -144,9 +237,10 @@ class TestAnswerCard:
     def test_answer_card_redirects_to_next_or_complete(self, client, user, deck, card):
         """回答後は次のカードか完了ページにリダイレクト"""
         client.force_login(user)
+        # Easyなら今日のうちには期限が来ない
         response = client.post(
             reverse("study:answer", args=[deck.pk, card.pk]),
-            {"rating": "3"}
+            {"rating": "4"}
         )
         assert response.status_code == 302
         # カードが1枚だけなので完了ページへ
@@ -166,6 +260,75 @@ class TestAnswerCard:
         # 次のカードへリダイレクト（card2）
         assert f"/card/{card2.pk}/" in response.url
 
+    def test_answer_card_follows_session_queue(self, client, user, deck):
+        """セッション中は確定したキューの順に次のカードへ進む"""
+        card1 = Card.objects.create(deck=deck, front="質問1", back="答え1")
+        card2 = Card.objects.create(deck=deck, front="質問2", back="答え2")
+
+        client.force_login(user)
+        client.get(reverse("study:session", args=[deck.pk]))
+
+        # セッション開始後に追加したカードはキューに入らない
+        Card.objects.create(deck=deck, front="質問3", back="答え3")
+
+        # 学習中のカードは末尾に戻り、2回目のGoodで学習を終える
+        for card, next_card in [(card1, card2), (card2, card1), (card1, card2)]:
+            response = client.post(
+                reverse("study:answer", args=[deck.pk, card.pk]),
+                {"rating": "3"}
+            )
+            assert f"/card/{next_card.pk}/" in response.url
+
+        response = client.post(
+            reverse("study:answer", args=[deck.pk, card2.pk]),
+            {"rating": "3"}
+        )
+        assert "complete" in response.url
+        assert not StudySession.objects.filter(user=user, deck=deck).exists()
+
+    def test_answer_good_finishes_learning_steps(self, client, user, deck, card):
+        """Goodを続けると新規カードが学習ステップを進み、セッションが終わる"""
+        client.force_login(user)
+        client.get(reverse("study:session", args=[deck.pk]))
+
+        response = client.post(reverse("study:answer", args=[deck.pk, card.pk]), {"rating": "3"})
+        assert f"/card/{card.pk}/" in response.url
+        assert CardState.objects.get(card=card, user=user).state == CardState.State.LEARNING
+
+        response = client.post(reverse("study:answer", args=[deck.pk, card.pk]), {"rating": "3"})
+        assert "complete" in response.url
+        assert CardState.objects.get(card=card, user=user).state == CardState.State.REVIEW
+        assert not StudySession.objects.filter(user=user, deck=deck).exists()
+
+    def test_answer_card_requeues_learning_card(self, client, user, deck):
+        """学習中のままのカードはセッションの最後にもう一度出題する"""
+        card1 = Card.objects.create(deck=deck, front="質問1", back="答え1")
+        card2 = Card.objects.create(deck=deck, front="質問2", back="答え2")
+
+        client.force_login(user)
+        client.get(reverse("study:session", args=[deck.pk]))
+
+        response = client.post(
+            reverse("study:answer", args=[deck.pk, card1.pk]),
+            {"rating": "1"}
+        )
+        assert f"/card/{card2.pk}/" in response.url
+
+        response = client.post(
+            reverse("study:answer", args=[deck.pk, card2.pk]),
+            {"rating": "4"}
+        )
+        assert f"/card/{card1.pk}/" in response.url
+        session = StudySession.objects.get(user=user, deck=deck)
+        assert session.card_ids == [card1.pk, card2.pk, card1.pk]
+
+        response = client.post(
+            reverse("study:answer", args=[deck.pk, card1.pk]),
+            {"rating": "4"}
+        )
+        assert "complete" in response.url
+        assert not StudySession.objects.filter(user=user, deck=deck).exists()
+
     def test_answer_card_invalid_rating(self, client, user, deck, card):
         """無効な評価はカードページにリダイレクト"""
         client.force_login(user)
@@ -187,6 +350,127 @@ class TestAnswerCard:
         assert response.status_code == 405  # Method Not Allowed
 
 
+@pytest.mark.django_db
+class TestAnswerDuration:
+    """フォームのトークンによる回答時間の計測のテスト"""
+
+    def answer(self, client, deck, card, token):
+        return client.post(
+            reverse("study:answer", args=[deck.pk, card.pk]),
+            {"rating": ReviewLog.Rating.GOOD, "answer_token": token},
+        )
+
+    def test_duration_from_token(self, client, user, deck, card, monkeypatch):
+        """表示時のトークンから回答時間を記録することをテスト"""
+        client.force_login(user)
+        response = client.get(reverse("study:card", args=[deck.pk, card.pk]))
+        token = response.context["answer_token"]
+        shown = time.time()
+        monkeypatch.setattr(time, "time", lambda: shown + 4.2)
+
+        self.answer(client, deck, card, token)
+
+        duration = ReviewLog.objects.get(card=card, user=user).duration
+        assert 4000 <= duration <= 4300
+
+    @pytest.mark.parametrize("token", ["", "改ざん:されたトークン"])
+    def test_invalid_token(self, client, user, deck, card, token):
+        """トークンがないか改ざんされた場合は回答時間0で記録することをテスト"""
+        client.force_login(user)
+        self.answer(client, deck, card, token)
+        assert ReviewLog.objects.get(card=card, user=user).duration == 0
+
+    def test_token_for_other_card(self, client, user, deck, card):
+        """別のカードのトークンは使えないことをテスト"""
+        other = Card.objects.create(deck=deck, front="質問2", back="答え2")
+        client.force_login(user)
+        token = client.get(
+            reverse("study:card", args=[deck.pk, other.pk])
+        ).context["answer_token"]
+
+        self.answer(client, deck, card, token)
+        assert ReviewLog.objects.get(card=card, user=user).duration == 0
+
+    def test_expired_token(self, client, user, deck, card, settings, monkeypatch):
+        """有効期間を過ぎたトークンは回答時間0で記録することをテスト"""
+        settings.STUDY_ANSWER_TOKEN_MAX_AGE = 60
+        client.force_login(user)
+        token = client.get(reverse("study:card", args=[deck.pk, card.pk])).context["answer_token"]
+        shown = time.time()
+        monkeypatch.setattr(time, "time", lambda: shown + 120)
+
+        self.answer(client, deck, card, token)
+        assert ReviewLog.objects.get(card=card, user=user).duration == 0
+
+
+@pytest.mark.django_db
+class TestAnswerCardHtmx:
+    """HTMXによる回答（次のカードの断片を返す）のテスト"""
+
+    def test_answer_returns_next_card_fragment(self, client, user, deck):
+        """次のカードの断片だけを1回の応答で返すことをテスト"""
+        card1 = Card.objects.create(deck=deck, front="質問1", back="答え1")
+        card2 = Card.objects.create(deck=deck, front="質問2", back="答え2")
+        client.force_login(user)
+        client.get(reverse("study:session", args=[deck.pk]))
+
+        response = client.post(
+            reverse("study:answer", args=[deck.pk, card1.pk]),
+            {"rating": ReviewLog.Rating.GOOD},
+            HTTP_HX_REQUEST="true",
+        )
+
+        assert response.status_code == 200
+        assert [t.name for t in response.templates] == ["study/_card.html"]
+        content = response.content.decode()
+        assert "<html" not in content
+        assert 'id="study-card"' in content
+        # 問題・答え（非表示）・間隔・進捗を含む
+        assert "質問2" in content
+        assert "答え2" in content
+        assert response.context["intervals"]
+        assert response.context["current_index"] == 2
+        assert response["HX-Push-Url"] == reverse("study:card", args=[deck.pk, card2.pk])
+        assert ReviewLog.objects.filter(card=card1, user=user).count() == 1
+
+    def test_answer_last_card_redirects_client(self, client, user, deck, card):
+        """最後のカードの回答では完了画面へのクライアントリダイレクトを返すことをテスト"""
+        client.force_login(user)
+        client.get(reverse("study:session", args=[deck.pk]))
+
+        response = client.post(
+            reverse("study:answer", args=[deck.pk, card.pk]),
+            {"rating": ReviewLog.Rating.GOOD},
+            HTTP_HX_REQUEST="true",
+        )
+        # 学習中のカードはもう一度出題する
+        assert response["HX-Push-Url"] == reverse("study:card", args=[deck.pk, card.pk])
+
+        response = client.post(
+            reverse("study:answer", args=[deck.pk, card.pk]),
+            {"rating": ReviewLog.Rating.GOOD},
+            HTTP_HX_REQUEST="true",
+        )
+
+        assert response["HX-Redirect"] == reverse("study:complete", args=[deck.pk])
+        assert not StudySession.objects.filter(user=user, deck=deck).exists()
+
+    def test_invalid_rating_rerenders_card(self, client, user, deck, card):
+        """無効な評価では同じカードの断片を返すことをテスト"""
+        client.force_login(user)
+
+        response = client.post(
+            reverse("study:answer", args=[deck.pk, card.pk]),
+            {"rating": 9},
+            HTTP_HX_REQUEST="true",
+        )
+
+        assert response.status_code == 200
+        assert response.context["card"] == card
+        assert response.context["show_answer"] is True
+        assert not ReviewLog.objects.exists()
+
+
 @pytest.mark.django_db
 class TestStudyComplete:
     """学習完了ビューのテスト"""
@@ -212,8 +496,132 @@ class TestStudyComplete:
         assert stats["total_reviews"] == 1
         assert stats["good_count"] == 1
 
+    def test_study_complete_uses_user_timezone(self, client, user, deck, card):
+        """今日の統計はユーザーのタイムゾーンの日付で数える"""
+        UserProfile.objects.create(user=user, timezone="America/Los_Angeles")
+        tz = ZoneInfo("America/Los_Angeles")
+        # fsrsは復習日時をUTCで受け取る
+        today_start = local_day_start(timezone.localdate(timezone=tz), tz).astimezone(dt_timezone.utc)
+        service = FSRSService()
+        service.review_card(card, user, ReviewLog.Rating.AGAIN, review_time=today_start - timedelta(minutes=1))
+        service.review_card(card, user, ReviewLog.Rating.GOOD, review_time=today_start + timedelta(minutes=1))
+
+        client.force_login(user)
+        response = client.get(reverse("study:complete", args=[deck.pk]))
+
+        stats = response.context["stats"]
+        assert stats["total_reviews"] == 1
+        assert stats["good_count"] == 1
+
     def test_study_complete_other_user(self, client, other_user, deck):
         """他ユーザーのデッキにはアクセス不可"""
         client.force_login(other_user)
         response = client.get(reverse("study:complete", args=[deck.pk]))
         assert response.status_code == 404
+
+
+@pytest.mark.django_db
+class TestGlobalStudy:
+    """全デッキの学習のテスト"""
+
+    def make_due(self, user, card, days_ago):
+        due = timezone.now() - timedelta(days=days_ago)
+        return CardState.objects.create(
+            card=card, user=user, state=CardState.State.REVIEW,
+            due=due, next_review=due, last_review=due - timedelta(days=1),
+        )
+
+    def test_queue_merges_decks(self, user, deck):
+        """期限切れのカードを期限順に、新規カードをデッキごとに交互に並べることをテスト"""
+        other_deck = Deck.objects.create(user=user, name="デッキ2")
+        a = [Card.objects.create(deck=deck, front=f"A{i}", back="答え") for i in range(3)]
+        b = [Card.objects.create(deck=other_deck, front=f"B{i}", back="答え") for i in range(2)]
+        self.make_due(user, a[0], days_ago=1)
+        self.make_due(user, b[0], days_ago=3)
+
+        card_ids = get_study_card_ids(None, user)
+
+        assert card_ids == [b[0].pk, a[0].pk, a[1].pk, b[1].pk, a[2].pk]
+
+    def test_new_cards_limited_by_profile(self, user, deck):
+        """新規カードはUserProfile.daily_new_cardsまでであることをテスト"""
+        UserProfile.objects.create(user=user, daily_new_cards=2)
+        for i in range(5):
+            Card.objects.create(deck=deck, front=f"質問{i}", back="答え")
+
+        assert len(get_study_card_ids(None, user)) == 2
+
+    def test_new_cards_follow_frontier(self, user, deck):
+        """全デッキの出題キューもデッキごとの探索位置から新規カードを探すことをテスト"""
+        cards = [Card.objects.create(deck=deck, front=f"質問{i}", back="答え") for i in range(3)]
+        assert get_study_card_ids(None, user) == [card.pk for card in cards]
+        assert NewCardFrontier.objects.get(deck=deck, user=user).card_id == cards[0].pk
+
+        FSRSService().review_card(cards[0], user, ReviewLog.Rating.EASY)
+
+        assert get_study_card_ids(None, user) == [cards[1].pk, cards[2].pk]
+        assert NewCardFrontier.objects.get(deck=deck, user=user).card_id == cards[1].pk
+        assert get_study_card_ids(deck, user) == [cards[1].pk, cards[2].pk]
+
+    def test_queue_query_count_independent_of_decks(self, user):
+        """デッキの数によらずクエリ数が一定であることをテスト"""
+        def count_queries():
+            # プロフィールをキャッシュしていないインスタンス（リクエストごとのユーザーと同じ）
+            fresh_user = User.objects.get(pk=user.pk)
+            with CaptureQueriesContext(connection) as context:
+                get_study_card_ids(None, fresh_user)
+            return len(context.captured_queries)
+
+        Card.objects.create(deck=Deck.objects.create(user=user, name="D0"), front="質問", back="答え")
+        one_deck = count_queries()
+        for index in range(1, 5):
+            Card.objects.create(
+                deck=Deck.objects.create(user=user, name=f"D{index}"), front="質問", back="答え"
+            )
+        assert count_queries() == one_deck
+
+    def test_study_all_flow(self, client, user, deck):
+        """全デッキのセッションで回答し、完了画面まで進むことをテスト"""
+        other_deck = Deck.objects.create(user=user, name="デッキ2")
+        card1 = Card.objects.create(deck=deck, front="質問1", back="答え1")
+        card2 = Card.objects.create(deck=other_deck, front="質問2", back="答え2")
+        client.force_login(user)
+
+        response = client.get(reverse("study:session_all"))
+        assert response.url == reverse("study:card_all", args=[card1.pk])
+        session = StudySession.objects.get(user=user, deck__isnull=True)
+        assert session.card_ids == [card1.pk, card2.pk]
+
+        response = client.get(response.url)
+        assert response.context["answer_url"] == reverse("study:answer_all", args=[card1.pk])
+        assert "デッキ2" not in response.content.decode()
+
+        for card, next_card in [(card1, card2), (card2, card1), (card1, card2)]:
+            response = client.post(reverse("study:answer_all", args=[card.pk]), {"rating": 3})
+            assert response.url == reverse("study:card_all", args=[next_card.pk])
+        response = client.post(reverse("study:answer_all", args=[card2.pk]), {"rating": 3})
+        assert response.url == reverse("study:complete_all")
+        assert not StudySession.objects.filter(user=user).exists()
+
+        response = client.get(response.url)
+        assert response.context["stats"]["total_reviews"] == 4
+
+    def test_deck_session_is_separate(self, client, user, deck, card):
+        """デッキ単位のセッションと全デッキのセッションは別であることをテスト"""
+        client.force_login(user)
+        client.get(reverse("study:session", args=[deck.pk]))
+        client.get(reverse("study:session_all"))
+
+        assert StudySession.objects.filter(user=user).count() == 2
+
+    def test_other_user_card(self, client, other_user, card):
+        """他ユーザーのカードにはアクセス不可"""
+        client.force_login(other_user)
+        response = client.get(reverse("study:card_all", args=[card.pk]))
+        assert response.status_code == 404
+
+    def test_no_cards(self, client, user):
+        """学習するカードがない場合はno_cardsページを表示"""
+        client.force_login(user)
+        response = client.get(reverse("study:session_all"))
+        assert "study/no_cards.html" in [t.name for t in response.templates]
@@ -13,4 +13,9 @@ urlpatterns = [
     path("<int:deck_pk>/card/<int:card_pk>/", views.study_card, name="card"),
     path("<int:deck_pk>/answer/<int:card_pk>/", views.answer_card, name="answer"),
     path("<int:deck_pk>/complete/", views.study_complete, name="complete"),
+    # 全デッキの学習
+    path("all/", views.study_session, name="session_all"),
+    path("all/card/<int:card_pk>/", views.study_card, name="card_all"),
+    path("all/answer/<int:card_pk>/", views.answer_card, name="answer_all"),
+    path("all/complete/", views.study_complete, name="complete_all"),
 ]
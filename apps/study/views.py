@@ -2,102 +2,266 @@
 学習機能のビュー
 """
 
+import time
+from datetime import timedelta
+from itertools import zip_longest
+
+from django.conf import settings
+from django.core import signing
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from django.db.models import Count, Q
 from django.http import Http404, JsonResponse
 from django.utils import timezone
 from django.views.decorators.http import require_POST
+from django_htmx.http import HttpResponseClientRedirect, push_url
 
 from apps.decks.models import Deck
 from apps.cards.models import Card
-from .models import CardState, ReviewLog
+from apps.monitoring.metrics import registry as metrics
+from apps.monitoring.tracing import span, traced
+from .models import CardState, ReviewLog, StudySession, due_cutoff, local_day_start
+from . import new_cards, quota
 from .services import FSRSService
 
+STUDY_QUEUE_SECONDS = metrics.histogram(
+    "study_queue_build_duration_seconds",
+    "出題キューの構築時間（秒）",
+)
+STUDY_QUEUE_CARDS = metrics.histogram(
+    "study_queue_cards",
+    "出題キューのカード数",
+    buckets=(0, 10, 20, 50, 100, 200, 500, 1000, 5000, 10000, 100000),
+)
 
-def get_study_cards(deck, user, limit=None):
+
+def get_study_card_ids(deck, user, limit=None):
     """
-    学習対象のカードを取得（ユーザーごと）
+    学習対象のカードIDを出題順に取得（ユーザーごと）
 
     優先順位:
-    1. 復習期限が過ぎたカード（古い順）
-    2. 新規カード（作成順）
+    1. 復習期限が過ぎたカード（期限の早い順）
+    2. 新規カード（作成順、今日の残りの新規カード数まで）
+    3. 今日のうちに期限が来るカード（期限の早い順）
+
+    「今日の復習」の定義はデッキの件数と同じ（models.due_cutoff、ユーザーの
+    タイムゾーンでの今日の終わりまで）。
+
+    deckがNoneの場合は全デッキから出題する（_build_global_study_card_ids）。
     """
+    attributes = {"deck_id": deck.pk} if deck is not None else {"scope": "all"}
+    with STUDY_QUEUE_SECONDS.time(), span("study.queue.build", **attributes) as current:
+        if deck is None:
+            card_ids = _build_global_study_card_ids(user, limit)
+        else:
+            card_ids = _build_study_card_ids(deck, user, limit)
+        if current is not None:
+            current.set_attribute("cards", len(card_ids))
+    STUDY_QUEUE_CARDS.observe(len(card_ids))
+    return card_ids
+
+
+def _split_due_now(due_cards, now):
+    """(カードID, 次回復習日時)の列を期限切れと今日のうちに期限が来るものに分ける"""
+    due_cards = list(due_cards)
+    due_now = [card_id for card_id, next_review in due_cards if next_review <= now]
+    due_later = [card_id for card_id, next_review in due_cards if next_review > now]
+    return due_now, due_later
+
+
+def _build_study_card_ids(deck, user, limit):
+    """get_study_card_idsの本体"""
     now = timezone.now()
 
-    # 復習期限が過ぎたカード（このユーザーのCardStateで判定）
-    due_cards = list(
+    # 今日が期限のカード（このユーザーのCardStateで判定）
+    due_now, due_later = _split_due_now(
         Card.objects.filter(
             deck=deck,
             card_states__user=user,
-            card_states__next_review__lte=now
+            card_states__next_review__lt=due_cutoff(now, quota.timezone_for(user))
         ).order_by("card_states__next_review")
+        .values_list("pk", "card_states__next_review"),
+        now,
     )
 
     # 新規カード（このユーザーのCardStateがないカード）
-    cards_with_state = CardState.objects.filter(
-        card__deck=deck,
-        user=user
-    ).values_list("card_id", flat=True)
-
-    new_cards = list(
-        Card.objects.filter(deck=deck)
-        .exclude(pk__in=cards_with_state)
-        .order_by("created_at")
-    )
+    new_card_ids = new_cards.new_card_ids(deck, user, quota.remaining_new_cards(user))
 
-    # 結合（復習カード優先）
-    cards = due_cards + new_cards
+    # 結合（期限切れのカード優先、まだ期限の来ていないカードは最後）
+    card_ids = due_now + new_card_ids + due_later
 
     if limit:
-        cards = cards[:limit]
+        card_ids = card_ids[:limit]
 
-    return cards
+    return card_ids
 
 
-@login_required
-def study_session(request, deck_pk):
-    """学習セッション開始"""
-    deck = get_object_or_404(Deck, pk=deck_pk, user=request.user)
+def _build_global_study_card_ids(user, limit):
+    """
+    全デッキの出題キュー
 
-    # 学習対象カードを取得（ユーザーごと）
-    cards = get_study_cards(deck, request.user)
+    - 今日が期限のカード: CardStateのインデックス（ユーザー → 次回復習日時）の順に
+      LIMITつきの1回のクエリで読む（まだ期限の来ていないカードは新規カードの後）
+    - 新規カード: デッキごとの探索位置から、デッキ単位の出題キューと同じ方法
+      （new_cards.new_card_ids_by_deck）で取得し、各デッキから1枚ずつ交互に
+      出題する。枚数は今日の残りの新規カード数まで
+    """
+    now = timezone.now()
+    limit = limit or settings.STUDY_GLOBAL_QUEUE_LIMIT
+
+    due_now, due_later = _split_due_now(
+        CardState.objects.filter(
+            user=user,
+            next_review__lt=due_cutoff(now, quota.timezone_for(user)),
+            card__deck__user=user,
+        )
+        .order_by("next_review")
+        .values_list("card_id", "next_review")[:limit],
+        now,
+    )
 
-    if not cards:
-        # 学習するカードがない場合
-        return render(request, "study/no_cards.html", {"deck": deck})
+    remaining = min(quota.remaining_new_cards(user), limit)
+    new_card_ids = []
+    if remaining > 0:
+        deck_ids = Deck.objects.filter(user=user).order_by("pk").values_list("pk", flat=True)
+        by_deck = new_cards.new_card_ids_by_deck(deck_ids, user, remaining)
+        # 各デッキから1枚ずつ交互に並べる
+        new_card_ids = [
+            card_id
+            for round_ids in zip_longest(*by_deck.values())
+            for card_id in round_ids
+            if card_id is not None
+        ][:remaining]
 
-    # 最初のカードにリダイレクト
-    return redirect("study:card", deck_pk=deck.pk, card_pk=cards[0].pk)
+    return (due_now + new_card_ids + due_later)[:limit]
 
 
-@login_required
-def study_card(request, deck_pk, card_pk):
-    """カード学習画面"""
-    deck = get_object_or_404(Deck, pk=deck_pk, user=request.user)
-    card = get_object_or_404(Card, pk=card_pk, deck=deck)
+def study_cards_queryset(deck, user):
+    """出題対象のカード（deckがNoneの場合はユーザーの全デッキ）"""
+    if deck is None:
+        return Card.objects.filter(deck__user=user).select_related("deck")
+    return Card.objects.filter(deck=deck)
 
-    # 学習対象カードを取得（進捗表示用・ユーザーごと）
-    cards = get_study_cards(deck, request.user)
 
-    # 現在のカードのインデックスを取得
-    card_ids = [c.pk for c in cards]
-    if card.pk in card_ids:
-        current_index = card_ids.index(card.pk) + 1
-    else:
-        current_index = 1
+def study_url(name, deck, card_pk=None):
+    """学習画面のURL（deckがNoneの場合は全デッキの学習）"""
+    args = [card_pk] if card_pk is not None else []
+    if deck is None:
+        return reverse(f"study:{name}_all", args=args)
+    return reverse(f"study:{name}", args=[deck.pk, *args])
 
-    total_cards = len(cards)
 
-    # FSRSサービスで次回復習間隔を取得（ユーザーごと）
-    service = FSRSService()
-    intervals = service.get_next_review_intervals(card, request.user)
+def get_study_cards(deck, user, limit=None):
+    """学習対象のカードを出題順に取得（ユーザーごと）"""
+    card_ids = get_study_card_ids(deck, user, limit=limit)
+    cards = Card.objects.in_bulk(card_ids)
+    return [cards[pk] for pk in card_ids if pk in cards]
+
+
+def start_study_session(deck, user):
+    """出題キューを確定して学習セッションを開始（既存のセッションは置き換える）"""
+    session, _ = StudySession.objects.update_or_create(
+        user=user,
+        deck=deck,
+        defaults={
+            "card_ids": get_study_card_ids(deck, user),
+            "cursor": 0,
+            "reviewed_count": 0,
+            "started_at": timezone.now(),
+        }
+    )
+    return session
+
+
+def get_or_start_study_session(deck, user):
+    """進行中の学習セッションを取得（なければ開始）"""
+    session = StudySession.objects.filter(user=user, deck=deck).first()
+    if session is None:
+        session = start_study_session(deck, user)
+    return session
+
+
+def advance_study_session(deck, user, card, card_state):
+    """
+    回答したカードの次に出題するカードIDを求める
+
+    回答後も学習中・再学習中のカードはキューの末尾に戻す。
+    セッション外からの回答は、回答後の状態でキューを確定する。
+    全カードに回答し終えた場合はセッションを削除し、次のカードIDはNoneになる。
+
+    Returns:
+        (セッション, 次のカードID)
+    """
+    with span("study.next_card"):
+        session = StudySession.objects.filter(user=user, deck=deck).first()
+        if session is None:
+            session = start_study_session(deck, user)
+            next_card_id = session.current_card_id
+        else:
+            next_card_id = session.advance(card.pk, requeue=card_state.state in (
+                CardState.State.LEARNING, CardState.State.RELEARNING
+            ))
+        if next_card_id is None:
+            session.delete()
+    return session, next_card_id
+
+
+def make_answer_token(card):
+    """カードの表示開始時刻を含む署名つきトークン（回答時間の計測用）"""
+    return _answer_signer().sign_object({"card": card.pk, "shown": time.time()})
+
+
+def answer_duration(token, card):
+    """
+    トークンから回答時間（ミリ秒）を求める
+
+    改ざん・期限切れ・別のカードのトークンの場合は0とする。
+    """
+    if not token:
+        return 0
+    try:
+        value = _answer_signer().unsign_object(
+            token, max_age=settings.STUDY_ANSWER_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return 0
+    if not isinstance(value, dict) or value.get("card") != card.pk:
+        return 0
+    try:
+        return max(int((time.time() - float(value["shown"])) * 1000), 0)
+    except (KeyError, TypeError, ValueError):
+        return 0
+
 
-    # セッション開始時刻を記録（回答時間計測用）
-    if "study_start_time" not in request.session:
-        request.session["study_start_time"] = timezone.now().isoformat()
+def _answer_signer():
+    return signing.TimestampSigner(salt="apps.study.answer_token")
 
-    # カード表示開始時刻を記録
-    request.session["card_start_time"] = timezone.now().isoformat()
+
+def get_upcoming_cards(deck, session, count):
+    """セッションのキューで次に出題するカードを最大count枚（出題順）"""
+    card_ids = session.upcoming_card_ids(count)
+    if not card_ids:
+        return []
+    cards = study_cards_queryset(deck, session.user_id).in_bulk(card_ids)
+    return [cards[pk] for pk in card_ids if pk in cards]
+
+
+def render_study_card(request, deck, card, session, template_name, show_answer=False):
+    """
+    カードの学習画面（全体またはHTMX用の断片）を描画
+
+    回答時間の計測のため、表示開始時刻を署名つきのトークンとしてフォームに
+    埋め込む（セッションには書き込まないため、カードの表示は読み取りだけになる）。
+    次に出題するカード（STUDY_PREFETCH_CARDS枚まで）の画像は、Linkヘッダーと
+    <link rel="preload">でブラウザに先読みさせる（カードの内容は埋め込まない）。
+    """
+    current_index = session.position or 1
+    total_cards = session.total_cards
+
+    # FSRSサービスで次回復習間隔を取得（ユーザーごと）
+    service = FSRSService.for_user(request.user)
+    intervals = service.get_next_review_intervals(card, request.user)
 
     context = {
         "deck": deck,
@@ -105,18 +269,73 @@ def study_card(request, deck_pk, card_pk):
         "current_index": current_index,
         "total_cards": total_cards,
         "intervals": intervals,
-        "show_answer": request.GET.get("show") == "answer",
+        "show_answer": show_answer,
+        "answer_url": study_url("answer", deck, card.pk),
+        "answer_token": make_answer_token(card),
+        "preload_images": [
+            image.url
+            for upcoming in get_upcoming_cards(deck, session, settings.STUDY_PREFETCH_CARDS)
+            for image in (upcoming.front_image, upcoming.back_image)
+            if image
+        ],
     }
 
-    return render(request, "study/study_card.html", context)
+    response = render(request, template_name, context)
+    if context["preload_images"]:
+        response["Link"] = ", ".join(
+            f"<{url}>; rel=preload; as=image" for url in context["preload_images"]
+        )
+    return response
+
+
+def _get_study_deck(request, deck_pk):
+    """URLのデッキ（deck_pkがNoneの場合は全デッキの学習としてNone）"""
+    if deck_pk is None:
+        return None
+    return get_object_or_404(Deck, pk=deck_pk, user=request.user)
+
+
+@login_required
+@traced("study.study_session")
+def study_session(request, deck_pk=None):
+    """学習セッション開始（deck_pkがない場合は全デッキ）"""
+    deck = _get_study_deck(request, deck_pk)
+
+    # 出題キューを確定してセッションを開始（ユーザーごと）
+    session = start_study_session(deck, request.user)
+
+    if session.is_finished:
+        # 学習するカードがない場合
+        session.delete()
+        return render(request, "study/no_cards.html", {"deck": deck})
+
+    # 最初のカードにリダイレクト
+    return redirect(study_url("card", deck, session.current_card_id))
+
+
+@login_required
+@traced("study.study_card")
+def study_card(request, card_pk, deck_pk=None):
+    """カード学習画面"""
+    deck = _get_study_deck(request, deck_pk)
+    card = get_object_or_404(study_cards_queryset(deck, request.user), pk=card_pk)
+
+    # 進捗はセッションのカーソルから求める（キューの再構築はしない）
+    session = get_or_start_study_session(deck, request.user)
+
+    return render_study_card(
+        request, deck, card, session, "study/study_card.html",
+        show_answer=request.GET.get("show") == "answer",
+    )
 
 
 @login_required
 @require_POST
-def answer_card(request, deck_pk, card_pk):
-    """カード回答処理"""
-    deck = get_object_or_404(Deck, pk=deck_pk, user=request.user)
-    card = get_object_or_404(Card, pk=card_pk, deck=deck)
+@traced("study.answer_card")
+def answer_card(request, card_pk, deck_pk=None):
+    """カード回答処理（デッキ単位・全デッキで共通）"""
+    deck = _get_study_deck(request, deck_pk)
+    card = get_object_or_404(study_cards_queryset(deck, request.user), pk=card_pk)
 
     # 評価を取得
     rating_str = request.POST.get("rating")
@@ -125,59 +344,66 @@ def answer_card(request, deck_pk, card_pk):
         if rating not in [1, 2, 3, 4]:
             raise ValueError("Invalid rating")
     except (TypeError, ValueError):
-        return redirect("study:card", deck_pk=deck.pk, card_pk=card.pk)
-
-    # 回答時間を計算（ミリ秒）
-    duration = 0
-    card_start_time = request.session.get("card_start_time")
-    if card_start_time:
-        from datetime import datetime
-        start = datetime.fromisoformat(card_start_time)
-        now = timezone.now()
-        if timezone.is_naive(start):
-            start = timezone.make_aware(start)
-        duration = int((now - start).total_seconds() * 1000)
+        if request.htmx:
+            # 同じカードを答えを表示した状態で描画し直す
+            session = get_or_start_study_session(deck, request.user)
+            return render_study_card(
+                request, deck, card, session, "study/_card.html", show_answer=True
+            )
+        return redirect(study_url("card", deck, card.pk))
+
+    # 回答時間（ミリ秒）はフォームのトークンの表示開始時刻から求める
+    duration = answer_duration(request.POST.get("answer_token"), card)
 
     # FSRSで復習を記録（ユーザーごと）
-    service = FSRSService()
-    service.review_card(card, request.user, rating, duration=duration)
+    service = FSRSService.for_user(request.user)
+    card_state = service.review_card(card, request.user, rating, duration=duration)
 
-    # 次のカードを取得（ユーザーごと）
-    cards = get_study_cards(deck, request.user)
+    # 次のカードをセッションのキューから取得（ユーザーごと）
+    session, next_card_id = advance_study_session(deck, request.user, card, card_state)
 
-    if not cards:
+    if next_card_id is None:
         # 全カード学習完了
-        # セッション情報をクリア
-        if "study_start_time" in request.session:
-            del request.session["study_start_time"]
-        if "card_start_time" in request.session:
-            del request.session["card_start_time"]
-        return redirect("study:complete", deck_pk=deck.pk)
+        if request.htmx:
+            return HttpResponseClientRedirect(study_url("complete", deck))
+        return redirect(study_url("complete", deck))
+
+    if request.htmx:
+        # 次のカードの断片を1回の応答で返す（URLは次のカードに更新）
+        next_card = get_object_or_404(study_cards_queryset(deck, request.user), pk=next_card_id)
+        response = render_study_card(request, deck, next_card, session, "study/_card.html")
+        return push_url(response, study_url("card", deck, next_card.pk))
 
     # 次のカードへ
-    return redirect("study:card", deck_pk=deck.pk, card_pk=cards[0].pk)
+    return redirect(study_url("card", deck, next_card_id))
 
 
 @login_required
-def study_complete(request, deck_pk):
-    """学習完了画面"""
-    deck = get_object_or_404(Deck, pk=deck_pk, user=request.user)
-
-    # 今日の学習統計（ユーザーごと）
-    today = timezone.now().date()
+@traced("study.study_complete")
+def study_complete(request, deck_pk=None):
+    """学習完了画面（deck_pkがない場合は全デッキの統計）"""
+    deck = _get_study_deck(request, deck_pk)
+
+    # 今日（ユーザーのタイムゾーン）の学習統計（ユーザーごと）
+    # review_timeを関数で変換せず範囲で絞り込み、インデックスを使えるようにする
+    profile = quota.get_profile(request.user)
+    tz = quota.user_timezone(profile)
+    today = quota.local_date(profile)
     today_reviews = ReviewLog.objects.filter(
-        card__deck=deck,
         user=request.user,
-        review_time__date=today
+        review_time__gte=local_day_start(today, tz),
+        review_time__lt=local_day_start(today + timedelta(days=1), tz),
+    )
+    if deck is not None:
+        today_reviews = today_reviews.filter(card__deck=deck)
+
+    stats = today_reviews.aggregate(
+        total_reviews=Count("pk"),
+        again_count=Count("pk", filter=Q(rating=ReviewLog.Rating.AGAIN)),
+        hard_count=Count("pk", filter=Q(rating=ReviewLog.Rating.HARD)),
+        good_count=Count("pk", filter=Q(rating=ReviewLog.Rating.GOOD)),
+        easy_count=Count("pk", filter=Q(rating=ReviewLog.Rating.EASY)),
     )
-
-    stats = {
-        "total_reviews": today_reviews.count(),
-        "again_count": today_reviews.filter(rating=ReviewLog.Rating.AGAIN).count(),
-        "hard_count": today_reviews.filter(rating=ReviewLog.Rating.HARD).count(),
-        "good_count": today_reviews.filter(rating=ReviewLog.Rating.GOOD).count(),
-        "easy_count": today_reviews.filter(rating=ReviewLog.Rating.EASY).count(),
-    }
 
     context = {
         "deck": deck,
@@ -43,9 +43,15 @@ INSTALLED_APPS = [
     "apps.decks",
     "apps.cards",
     "apps.study",
+    "apps.monitoring",
 ]
 
 MIDDLEWARE = [
+    # 性能監視（設定で有効にした場合のみ動作、他のミドルウェアのクエリも含めて計測）
+    "apps.monitoring.middleware.TracingMiddleware",
+    "apps.monitoring.middleware.MetricsMiddleware",
+    "apps.monitoring.middleware.QueryInstrumentationMiddleware",
+    "apps.monitoring.middleware.RequestProfilerMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -142,6 +148,25 @@ LOGIN_REDIRECT_URL = "accounts:profile"
 LOGOUT_REDIRECT_URL = "accounts:login"
 
 
+# Cache / Sessions
+# REDIS_URLを指定するとプロセス間で共有するキャッシュを使い、セッションは
+# キャッシュから読む（cached_db）。ローカルメモリのキャッシュはプロセスごとのため、
+# その場合の既定はDBのセッションとする（学習画面ではセッションに書き込まない）。
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+SESSION_ENGINE = os.environ.get(
+    "SESSION_ENGINE",
+    "django.contrib.sessions.backends.cached_db" if REDIS_URL
+    else "django.contrib.sessions.backends.db",
+)
+
+
 # Messages framework
 from django.contrib.messages import constants as messages
 
@@ -151,4 +176,63 @@ MESSAGE_TAGS = {
     messages.SUCCESS: "success",
     messages.WARNING: "warning",
     messages.ERROR: "error",
-}
\ No newline at end of file
+}
+
+# 学習画面で画像を先読みする次のカードの枚数
+STUDY_PREFETCH_CARDS = int(os.environ.get("STUDY_PREFETCH_CARDS", "3"))
+# 全デッキの学習で1回のセッションに出題するカードの上限
+STUDY_GLOBAL_QUEUE_LIMIT = int(os.environ.get("STUDY_GLOBAL_QUEUE_LIMIT", "200"))
+# 回答時間の計測用トークンの有効期間（秒、これより長い回答は時間0として記録する）
+STUDY_ANSWER_TOKEN_MAX_AGE = int(os.environ.get("STUDY_ANSWER_TOKEN_MAX_AGE", "3600"))
+
+
+# 性能監視
+# リクエストごとのクエリ件数・DB時間をServer-Timingヘッダーとログに出力する
+QUERY_INSTRUMENTATION = os.environ.get("QUERY_INSTRUMENTATION", "False") == "True"
+# 同じ形のクエリがこの回数を超えたらN+1として警告する
+QUERY_N_PLUS_ONE_THRESHOLD = int(os.environ.get("QUERY_N_PLUS_ONE_THRESHOLD", "5"))
+
+# 遅いリクエストのプロファイル（cProfile）を保存する
+REQUEST_PROFILING = os.environ.get("REQUEST_PROFILING", "False") == "True"
+# この応答時間（ミリ秒）を超えたリクエストを保存する
+REQUEST_PROFILING_THRESHOLD_MS = float(os.environ.get("REQUEST_PROFILING_THRESHOLD_MS", "500"))
+# 閾値に関わらず保存するリクエストの割合（0〜1）
+REQUEST_PROFILING_SAMPLE_RATE = float(os.environ.get("REQUEST_PROFILING_SAMPLE_RATE", "0.01"))
+# 計測するビュー名の接頭辞
+REQUEST_PROFILING_VIEWS = ["study:"]
+REQUEST_PROFILING_DIR = Path(os.environ.get("REQUEST_PROFILING_DIR", BASE_DIR / "profiles"))
+# 保存するプロファイルの最大数（超えたら古いものから削除）
+REQUEST_PROFILING_MAX_FILES = int(os.environ.get("REQUEST_PROFILING_MAX_FILES", "100"))
+
+# /metrics でPrometheus形式のメトリクスを公開する
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "False") == "True"
+# /metrics の取得に必要なBearerトークン（未設定の場合はスタッフのログインだけ）
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN") or None
+# 複数プロセスで動かす場合の集計用ディレクトリ（起動前に空にしておく）
+METRICS_MULTIPROCESS_DIR = os.environ.get("METRICS_MULTIPROCESS_DIR") or None
+# 集計結果を共有ディレクトリに書き出す最短間隔（秒）
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "1.0"))
+
+# ビュー・サービス・SQLの処理時間をスパンとして記録する
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "False") == "True"
+# スパンの出力先（"jsonl": TRACING_FILEに追記 / "otlp": TRACING_OTLP_ENDPOINTに送信）
+TRACING_EXPORTER = os.environ.get("TRACING_EXPORTER", "jsonl")
+TRACING_FILE = Path(os.environ.get("TRACING_FILE", BASE_DIR / "traces.jsonl"))
+TRACING_OTLP_ENDPOINT = os.environ.get("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+        },
+    },
+    "loggers": {
+        "apps.monitoring": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
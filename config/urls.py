@@ -23,6 +23,8 @@ urlpatterns = [
     path("decks/", include("apps.decks.urls")),
     path("cards/", include("apps.cards.urls")),
     path("study/", include("apps.study.urls")),
+    path("api/v1/study/", include("apps.study.api_urls")),
+    path("metrics", include("apps.monitoring.urls")),
 ]
 
 # 開発環境でのメディアファイル配信